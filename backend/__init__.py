@@ -6,8 +6,10 @@ startup, ensures core collections exist, and manages the platform DB lifecycle.
 """
 
 import asyncio
+import json
 import logging
 import secrets
+import time
 from contextlib import asynccontextmanager
 from typing import Iterable, Awaitable, Callable, Optional
 from datetime import datetime, timezone
@@ -18,48 +20,142 @@ if "" in __import__("sys").path:
     __import__("sys").path.append("")
 
 from fastapi import FastAPI, APIRouter, HTTPException, status, Depends, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.platform.config import PlatformConfig
 from backend.platform.db_connection import PlatformDatabase, platform_db
-from backend.platform import utils
+from backend.platform import indexes, metrics, mongo_clients, mongo_commands, profiling, utils
+from backend.platform.loop_monitor import LoopMonitor
+from backend.platform.sessions import SessionStore
 from backend.services import analytics, operations, optimizations
 
 Initializer = Callable[[], Awaitable[None]]
 
 REQUIRED_COLLECTIONS = ["users", "projects", "sessions"]
+PROJECT_LISTING_INDEX = [("username", 1), ("created", 1), ("project_id", 1)]
+indexes.declare(
+    "platform",
+    {
+        "users": [([("username", 1)], {"name": "username", "unique": True})],
+        "sessions": [([("token", 1)], {"name": "token", "unique": True})],
+        "projects": [
+            ([("project_id", 1)], {"name": "project_id", "unique": True}),
+            # Keyset order of project listings (see utils.listing_filter / LISTING_SORT).
+            (PROJECT_LISTING_INDEX, {"name": "username_created_project"}),
+        ],
+    },
+    probes=[
+        ("users", {"username": ""}),
+        ("sessions", {"token": ""}),
+        ("projects", {"project_id": ""}),
+        ("projects", {"username": ""}),
+    ],
+)
+LISTING_STREAM_BATCH = 100
 logger = logging.getLogger("landos.platform")
 
 
 async def ensure_platform_collections(db) -> None:
     """
-    Ensure core collections exist on the platform database.
+    Ensure core collections and their declared indexes exist on the platform database.
     """
     existing = set(await db.list_collection_names())
     for name in REQUIRED_COLLECTIONS:
         if name not in existing:
             await db.create_collection(name)
     logger.info("Platform collections ready: %s", REQUIRED_COLLECTIONS)
+    await indexes.ensure(db, "platform")
+    await indexes.verify(db, "platform")
+
+
+def _step_name(step: Initializer) -> str:
+    module = getattr(step, "__module__", None) or ""
+    for prefix in ("backend.services.", "backend.platform.", "backend."):
+        if module.startswith(prefix):
+            module = module[len(prefix):]
+            break
+    name = getattr(step, "__qualname__", None) or getattr(step, "__name__", None) or str(step)
+    return f"{module}.{name}" if module else name
+
+
+async def _timed(steps: dict, name: str, step: Initializer, background: bool = False) -> None:
+    """Run a startup step, recording its status and duration in steps[name]."""
+    entry = steps[name] = {"status": "running", "ms": None, "background": background}
+    start = time.perf_counter()
+    try:
+        await step()
+        entry["status"] = "ok"
+    except asyncio.CancelledError:
+        entry["status"] = "cancelled"
+        raise
+    except Exception as exc:
+        entry["status"] = "failed"
+        entry["error"] = repr(exc)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        entry["ms"] = round(elapsed * 1000, 1)
+        metrics.STARTUP_STEP_DURATION.labels(name).set(elapsed)
+        logger.info("Initializer %s %s in %.1f ms", name, entry["status"], entry["ms"])
 
 
 def _create_lifespan(
     db: PlatformDatabase,
     initializers: Iterable[Initializer],
+    finalizers: Iterable[Initializer] = (),
+    background: Iterable[Initializer] = (),
 ):
+    """
+    Startup runs the initializers concurrently and then accepts traffic while
+    the background initializers (slow dataset loads) finish. Step timings are
+    kept in app.state.startup; engines_ready turns True once the background
+    steps have all succeeded (see /health/ready).
+    """
+    background = list(background)
+
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         # Startup
+        steps = app.state.startup = {}
+        app.state.engines_ready = False
+        app.state.startup_tasks = []
         db.connect()
         logger.info("Connected platform DB")
-        await ensure_platform_collections(db.get_db())
-        logger.info("Ensured platform collections: %s", REQUIRED_COLLECTIONS)
-        for init in initializers:
-            logger.info("Running initializer %s", getattr(init, "__name__", str(init)))
-            await init()
-        app.state.engines_ready = True
+        await _timed(steps, "platform_collections", lambda: ensure_platform_collections(db.get_db()))
+        results = await asyncio.gather(
+            *(_timed(steps, _step_name(init), init) for init in initializers), return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+
+        async def run_background():
+            outcomes = await asyncio.gather(
+                *(_timed(steps, _step_name(init), init, background=True) for init in background),
+                return_exceptions=True,
+            )
+            app.state.engines_ready = not any(isinstance(outcome, BaseException) for outcome in outcomes)
+            if not app.state.engines_ready:
+                logger.error("Background initialization failed; see /health/ready")
+
+        for init in background:
+            steps[_step_name(init)] = {"status": "pending", "ms": None, "background": True}
+        if background:
+            app.state.startup_tasks.append(asyncio.get_running_loop().create_task(run_background()))
+        else:
+            app.state.engines_ready = True
         yield
         # Shutdown
+        for task in app.state.startup_tasks:
+            task.cancel()
+        await asyncio.gather(*app.state.startup_tasks, return_exceptions=True)
+        for fin in finalizers:
+            logger.info("Running finalizer %s", getattr(fin, "__name__", str(fin)))
+            try:
+                await fin()
+            except Exception:
+                logger.exception("Finalizer %s failed", getattr(fin, "__name__", str(fin)))
         db.close()
         logger.info("Closed platform DB")
 
@@ -75,9 +171,12 @@ def create_app(
     db: Optional[PlatformDatabase] = None,
     engine_initializers: Optional[Iterable[Initializer]] = None,
     engine_routers: Optional[Iterable[APIRouter]] = None,
+    engine_finalizers: Optional[Iterable[Initializer]] = None,
+    engine_background_initializers: Optional[Iterable[Initializer]] = None,
 ) -> FastAPI:
     """
-    Build the FastAPI app with provided configuration, DB, initializers, and routers.
+    Build the FastAPI app with provided configuration, DB, initializers, finalizers, and routers.
+    Background initializers run after startup; the app serves traffic meanwhile.
     """
     cfg = config or PlatformConfig.from_env()
     database = db or platform_db
@@ -91,13 +190,27 @@ def create_app(
         operations.router,
         optimizations.router,
     ]
+    default_finalizers = [
+        analytics.shutdown,
+    ]
     initializers = list(engine_initializers) if engine_initializers is not None else default_initializers
+    if engine_background_initializers is not None:
+        background = list(engine_background_initializers)
+    else:
+        # The reference datasets belong to the default analytics initializer.
+        background = [analytics.load_datasets] if engine_initializers is None else []
+    finalizers = list(engine_finalizers) if engine_finalizers is not None else default_finalizers
+    sessions = SessionStore(database, cfg)
+    loop_lag = metrics.LoopLagSampler(cfg.loop_lag_interval)
+    loop_monitor = LoopMonitor(cfg.loop_block_threshold)
+    initializers = [sessions.start, loop_lag.start, loop_monitor.start, *initializers]
+    finalizers = [*finalizers, loop_monitor.stop, loop_lag.stop, sessions.stop]
     routers = list(engine_routers) if engine_routers is not None else default_routers
 
     app = FastAPI(
         title="LandOS Platform API",
         version="0.1.0",
-        lifespan=_create_lifespan(database, initializers),
+        lifespan=_create_lifespan(database, initializers, finalizers, background),
     )
     logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
@@ -109,14 +222,39 @@ def create_app(
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(metrics.MetricsMiddleware)
 
     app.state.config = cfg
     app.state.db = database
+    app.state.sessions = sessions
+    app.state.loop_monitor = loop_monitor
 
     @app.get("/health")
     async def health():
         return {"status": "ok"}
 
+    @app.get("/health/ready")
+    async def ready():
+        """503 until startup, including the background dataset loads, has succeeded."""
+        body = {
+            "ready": getattr(app.state, "engines_ready", False),
+            "steps": getattr(app.state, "startup", {}),
+        }
+        return JSONResponse(body, status_code=status.HTTP_200_OK if body["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @app.get("/health/mongo")
+    async def mongo_pools():
+        return {"pools": mongo_clients.stats()}
+
+    @app.get("/health/loop")
+    async def loop_stalls():
+        return loop_monitor.stats()
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        body, content_type = metrics.render()
+        return Response(content=body, media_type=content_type)
+
     platform_router = APIRouter(prefix="/api/platform", tags=["platform"])
 
     def _db():
@@ -129,11 +267,30 @@ def create_app(
         if not authorization or not authorization.lower().startswith("bearer "):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
         token = authorization.split(" ", 1)[1]
-        session = await _db().sessions.find_one({"token": token})
+        session = await sessions.get(token)
         if not session:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
         return session
 
+    async def _is_admin(username: str) -> bool:
+        # Admins are users with admin: true on their user document.
+        user = await _db().users.find_one({"username": username}, {"admin": 1})
+        return bool((user or {}).get("admin"))
+
+    async def _require_admin(session=Depends(_require_token)):
+        if not await _is_admin(session["username"]):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+        return session
+
+    async def _admin_user(authorization: str | None) -> str | None:
+        """Username of the admin owning this Authorization header, else None (no errors raised)."""
+        if not authorization or not authorization.lower().startswith("bearer "):
+            return None
+        session = await sessions.get(authorization.split(" ", 1)[1])
+        if session and await _is_admin(session["username"]):
+            return session["username"]
+        return None
+
     @platform_router.post("/signup", status_code=status.HTTP_201_CREATED)
     async def signup(payload: dict):
         try:
@@ -170,10 +327,9 @@ def create_app(
         if stored_pw not in (candidate_hash, cleaned["password"]):
             logger.warning("Login failed for invalid password user '%s'", cleaned["username"])
             return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"ok": False, "error": "Invalid credentials"})
-        token = secrets.token_hex(16)
-        await _db().sessions.insert_one({"username": cleaned["username"], "token": token})
+        session = await sessions.create(cleaned["username"])
         logger.info("Login success for user '%s'", cleaned["username"])
-        return {"ok": True, "token": token}
+        return {"ok": True, "token": session["token"], "expires_at": session["expires_at"].isoformat() + "Z"}
 
     @platform_router.options("/login")
     async def login_options():
@@ -181,16 +337,86 @@ def create_app(
 
     @platform_router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
     async def logout(session=Depends(_require_token)):
-        await _db().sessions.delete_one({"token": session["token"]})
+        await sessions.revoke(session["token"])
         logger.info("Logout for user '%s'", session["username"])
         return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content=None)
 
+    async def _project_cards(projects: list, requested: set) -> list:
+        found = {}
+        if projects and requested & utils.SUMMARY_FIELDS:
+            try:
+                found = await analytics.summaries.load_summaries(p["project_id"] for p in projects)
+            except Exception:
+                logger.exception("Project summaries unavailable")
+        cards = []
+        for project in projects:
+            card = {k: v for k, v in project.items() if k in requested or k == "project_id"}
+            summary = found.get(project["project_id"])
+            if "summary" in requested:
+                card["summary"] = summary
+            if "bbox" in requested:
+                card["bbox"] = (summary or {}).get("bbox")
+            cards.append(card)
+        return cards
+
+    async def _list_projects(username: str, limit=None, cursor=None, fields=None, stream: bool = False):
+        """
+        List a user's projects ordered by (created, project_id). With limit or
+        cursor the response is a page {"projects", "next_cursor"}; stream=True
+        sends NDJSON rows as the cursor yields them.
+        """
+        try:
+            projection, requested = utils.parse_listing_fields(fields)
+            limit = utils.validate_listing_limit(limit)
+            query = utils.listing_filter(username, cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        found = _db().projects.find(query, projection).sort(utils.LISTING_SORT)
+
+        if stream:
+            if limit:
+                found = found.limit(limit)
+
+            async def rows():
+                batch, sent = [], 0
+                async for project in found:
+                    batch.append(project)
+                    if len(batch) >= LISTING_STREAM_BATCH:
+                        for card in await _project_cards(batch, requested):
+                            yield json.dumps(card, default=str) + "\n"
+                        sent += len(batch)
+                        batch = []
+                for card in await _project_cards(batch, requested):
+                    yield json.dumps(card, default=str) + "\n"
+                logger.info("Streamed %d projects for user '%s'", sent + len(batch), username)
+
+            return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+        if limit is None and cursor is None:
+            projects = [project async for project in found]
+            cards = await _project_cards(projects, requested)
+            logger.info("Listed %d projects for user '%s'", len(cards), username)
+            return cards
+        projects = [project async for project in found.limit(limit + 1 if limit else 0)]
+        more = limit is not None and len(projects) > limit
+        projects = projects[:limit] if limit else projects
+        cards = await _project_cards(projects, requested)
+        logger.info("Listed %d projects for user '%s' (page)", len(cards), username)
+        return {"projects": cards, "next_cursor": utils.encode_cursor(projects[-1]) if more else None}
+
+    def _wants_ndjson(format: str | None, accept: str | None) -> bool:
+        return format == "ndjson" or "application/x-ndjson" in (accept or "")
+
     @platform_router.get("/projects")
-    async def list_projects_get(session=Depends(_require_token)):
-        username = session["username"]
-        projects = await _db().projects.find({"username": username}, {"_id": 0}).to_list(None)
-        logger.info("Listed %d projects for user '%s'", len(projects), username)
-        return projects
+    async def list_projects_get(
+        session=Depends(_require_token),
+        limit: int | None = None,
+        cursor: str | None = None,
+        fields: str | None = None,
+        format: str | None = None,
+        accept: str | None = Header(None),
+    ):
+        return await _list_projects(session["username"], limit, cursor, fields, _wants_ndjson(format, accept))
 
     async def _trigger_layer_etl(layer: str, project_id: str, project: dict | None):
         if not project:
@@ -198,13 +424,21 @@ def create_app(
         await analytics.terrain.run_country_layer(project.get("country"), layer, {"project_id": project_id, "geometry": project.get("geometry")})
 
     @platform_router.get("/projects/{project_id}/grid")
-    async def get_grid(project_id: str, layer: str | None = None, refresh: bool | None = False):
+    async def get_grid(
+        project_id: str,
+        layer: str | None = None,
+        refresh: bool | None = False,
+        level: int | None = None,
+        max_cells: int | None = None,
+    ):
         """
         Return grid layers for a project. If layer is provided, filter to that layer.
-        Currently supports 'dem' via analytics terrain collection.
+        level / max_cells select a coarser overview from the layer's pyramid.
         """
-        # Fetch terrain from analytics DB
-        terrain = await analytics.db.get_db().terrain.find_one({"project_id": project_id})
+        # Fetch terrain from analytics DB; overview requests leave the full grids in Mongo
+        overview = level is not None or max_cells is not None
+        projection = analytics.grid.FULL_GRID_EXCLUDE if overview else None
+        terrain = await analytics.db.get_db().terrain.find_one({"project_id": project_id}, projection)
         if not terrain:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grid not found")
         logger.info("Grid request project=%s layer=%s", project_id, layer or "all")
@@ -218,7 +452,7 @@ def create_app(
                 await _trigger_layer_etl("soil", project_id, project)
             if (layer in (None, "land_cover")) and (not land_cover or (etl_layers.get("land_cover", {}).get("status") == "failed")):
                 await _trigger_layer_etl("land_cover", project_id, project)
-            terrain = await analytics.db.get_db().terrain.find_one({"project_id": project_id})
+            terrain = await analytics.db.get_db().terrain.find_one({"project_id": project_id}, projection)
             dem = terrain.get("elevation_data") if terrain else None
             soil = terrain.get("soil_data") if terrain else None
             land_cover = terrain.get("land_cover") if terrain else None
@@ -231,11 +465,59 @@ def create_app(
         if land_cover:
             layers["land_cover"] = land_cover
         if layer:
-            filtered = layers.get(layer)
-            if not filtered:
+            layers = {layer: layers[layer]} if layers.get(layer) else {}
+            if not layers:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested layer not found")
-            return {"project_id": project_id, "layer": layer, "data": filtered, "etl_layers": etl_layers}
-        return {"project_id": project_id, "layers": layers, "etl_layers": etl_layers}
+        coverage_mask = terrain.get("coverage_mask") if terrain else None
+        if overview:
+            try:
+                layers, coverage_mask = await analytics.grid.layer_views(
+                    analytics.db.get_db(), project_id, terrain, layers,
+                    level=level, max_cells=max_cells, mask_layer=layer or "dem",
+                )
+            except ValueError as exc:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        if layer:
+            return {"project_id": project_id, "layer": layer, "data": layers[layer], "etl_layers": etl_layers, "coverage_mask": coverage_mask}
+        return {"project_id": project_id, "layers": layers, "etl_layers": etl_layers, "coverage_mask": coverage_mask}
+
+    @platform_router.get("/projects/{project_id}/tiles/{layer}/{z}/{x}/{y}")
+    async def get_tile(
+        project_id: str,
+        layer: str,
+        z: int,
+        x: int,
+        y: int,
+        format: str = "bin",
+        if_none_match: str | None = Header(None),
+    ):
+        """
+        Return one XYZ tile of a project layer as a raw array ("bin") or colorized PNG.
+        """
+        cache_control = "private, max-age=300"
+        try:
+            if if_none_match:
+                # Answer revalidations from the layer version alone, before any rendering.
+                etag = f'"{await analytics.tiles.current_version(project_id, layer)}"'
+                if if_none_match == etag:
+                    return Response(
+                        status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": etag, "Cache-Control": cache_control},
+                    )
+            tile = await analytics.render_tile(project_id, layer, z, x, y, fmt=format)
+        except LookupError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        headers = {
+            "ETag": f'"{tile["version"]}"',
+            "Cache-Control": cache_control,
+            "X-Tile-Level": str(tile["level"]),
+        }
+        if format == "bin":
+            headers["X-Tile-Dtype"] = tile["dtype"]
+            headers["X-Tile-Shape"] = f"{analytics.tiles.TILE_SIZE},{analytics.tiles.TILE_SIZE}"
+        return Response(content=tile["content"], media_type=tile["media_type"], headers=headers)
 
     @platform_router.post("/projects")
     async def create_or_list_projects(payload: dict):
@@ -244,9 +526,13 @@ def create_app(
             username = payload.get("username")
             if not username:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="username required")
-            projects = await _db().projects.find({"username": username}, {"_id": 0}).to_list(None)
-            logger.info("Listed %d projects for user '%s' (POST)", len(projects), username)
-            return projects
+            return await _list_projects(
+                username,
+                payload.get("limit"),
+                payload.get("cursor"),
+                payload.get("fields"),
+                payload.get("format") == "ndjson",
+            )
 
         try:
             cleaned = utils.validate_project_create(payload)
@@ -329,13 +615,49 @@ def create_app(
         # Clean up terrain/grid in analytics
         try:
             await analytics.db.get_db().terrain.delete_one({"project_id": project_id})
+            await analytics.db.get_db().layer_versions.delete_many({"project_id": project_id})
+            await analytics.db.get_db().timeseries.delete_many({"project_id": project_id})
+            await analytics.db.get_db().timeseries_rollups.delete_many({"project_id": project_id})
+            await analytics.db.get_db().observation_layers.delete_many({"project_id": project_id})
+            await analytics.db.get_db().observation_points.delete_many({"project_id": project_id})
+            await analytics.db.get_db().overviews.delete_many({"project_id": project_id})
+            await analytics.db.get_db().project_summaries.delete_many({"project_id": project_id})
             logger.info("Deleted terrain for project %s", project_id)
         except Exception:
             logger.exception("Failed to delete terrain for project %s", project_id)
-        from fastapi import Response
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+    @platform_router.get("/admin/mongo/commands")
+    async def mongo_commands_debug(reset: bool = False, session=Depends(_require_admin)):
+        """Mongo command aggregates of this worker and its recent slow commands; reset clears them after reading."""
+        snapshot = mongo_commands.monitor.snapshot()
+        if reset:
+            mongo_commands.monitor.reset()
+        return snapshot
+
+    @platform_router.get("/admin/profiles")
+    async def list_profiles(limit: int = 20, session=Depends(_require_admin)):
+        """Most recent stored request profiles, without their stacks."""
+        found = _db()[profiling.PROFILE_COLLECTION].find({}, {"_id": 0, "stacks": 0, "memory.top": 0})
+        return [doc async for doc in found.sort("created_at", -1).limit(max(1, min(limit, 200)))]
+
+    @platform_router.get("/admin/profiles/{profile_id}")
+    async def get_profile(profile_id: str, format: str = "json", session=Depends(_require_admin)):
+        """A stored profile; format=folded returns the stacks for flamegraph.pl / speedscope."""
+        doc = await _db()[profiling.PROFILE_COLLECTION].find_one({"profile_id": profile_id}, {"_id": 0})
+        if not doc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="profile not found")
+        if format == "folded":
+            return Response(content=profiling.folded(doc), media_type="text/plain")
+        return doc
+
     for router in routers + [platform_router]:
         app.include_router(router)
 
+    if cfg.profiling:
+        async def _store_profile(doc: dict) -> None:
+            await _db()[profiling.PROFILE_COLLECTION].insert_one(doc)
+
+        app.add_middleware(profiling.ProfilingMiddleware, admin_user=_admin_user, store=_store_profile)
+
     return app
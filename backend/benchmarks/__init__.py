@@ -0,0 +1,114 @@
+"""
+Offline benchmarks.
+
+Each suite is a module runnable with `python -m backend.benchmarks.<suite>`
+from the repository root. Results are written as JSON and can be compared
+against a stored baseline, so a regression shows up as numbers instead of a
+feeling. Baselines are machine-specific: record one on the machine that runs
+the comparison (--save-baseline) rather than sharing them.
+"""
+
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BENCH_DIR / "results"
+BASELINE_DIR = BENCH_DIR / "baselines"
+# Median slowdown tolerated before a case counts as a regression.
+DEFAULT_TOLERANCE = 0.2
+
+
+def quiet_logs() -> None:
+    """Keep per-call INFO logging of the measured code out of the timings."""
+    logging.basicConfig(level=logging.WARNING)
+    for name in ("landos.analytics", "landos.platform", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, budget: float = 2.0) -> dict:
+    """
+    Time fn up to repeat times (at least once), stopping early once budget
+    seconds are spent. Times are seconds.
+    """
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if time.perf_counter() - started > budget:
+            break
+    return {
+        "runs": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+    }
+
+
+def percentiles(values: Iterable[float], points=(50, 95, 99)) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles, keyed p50/p95/p99 (None when there are no values)."""
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        if not ordered:
+            result[f"p{point}"] = None
+            continue
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f"p{point}"] = ordered[rank - 1]
+    return result
+
+
+def environment() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpus": os.cpu_count(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def save(path: Path, suite: str, results: dict) -> dict:
+    payload = {"suite": suite, "environment": environment(), "results": results}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True))
+    return payload
+
+
+def load(path: Path) -> Optional[dict]:
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def compare(results: dict, baseline: dict, key: str = "median", tolerance: float = DEFAULT_TOLERANCE,
+            higher_is_better: bool = False) -> dict:
+    """
+    Ratio current/baseline of key per case present in both. A case regresses
+    when it got worse by more than tolerance.
+    """
+    report = {}
+    for name, current in results.items():
+        before = (baseline.get("results") or {}).get(name)
+        if not before or not before.get(key) or current.get(key) is None:
+            continue
+        ratio = current[key] / before[key]
+        worse = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+        report[name] = {"baseline": before[key], "current": current[key], "ratio": round(ratio, 3), "regressed": worse}
+    return report
+
+
+def print_table(results: dict, comparison: Optional[dict] = None, unit: str = "ms", scale: float = 1000.0) -> None:
+    comparison = comparison or {}
+    width = max((len(name) for name in results), default=10)
+    for name, stats in results.items():
+        line = f"{name:<{width}}  median {stats['median'] * scale:10.2f} {unit}  min {stats['min'] * scale:10.2f} {unit}"
+        if name in comparison:
+            delta = comparison[name]
+            line += f"  x{delta['ratio']:.2f}{'  REGRESSED' if delta['regressed'] else ''}"
+        print(line)
@@ -0,0 +1,244 @@
+"""
+End-to-end ETL throughput benchmark, offline.
+
+Drives concurrent project creations (POST /api/platform/projects, which runs
+the full DEM + country ETL inline) through create_app against a local Mongo,
+with remote dataset calls answered from recorded cassettes (see
+backend/conftest.py; record them by running the integration tests with
+VHS_MODE=record).
+
+    python -m backend.benchmarks.etl_throughput --projects 20 --concurrency 5 --latency 0.5
+
+Every replayed call waits --latency seconds (plus up to --jitter) to stand in
+for the remote service. By default the on-disk DEM and CDL file caches stay
+in use; --cold-caches points them at an empty directory so the OpenTopography
+and CDL responses must come from the cassettes as well.
+
+Reports projects per minute, p50/p95/p99 end-to-end creation latency, peak RSS
+and per-stage ETL timings (from etl_layers.<layer>.timings). The benchmark
+databases are dropped before and after the run.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import importlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import pytest
+from httpx import ASGITransport, AsyncClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from backend import benchmarks, create_app
+from backend.conftest import CASSETTE_DIR, Cassette
+from backend.platform.config import PlatformConfig
+from backend.platform.db_connection import PlatformDatabase
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.terrain.usa import land_cover
+
+SUITE = "etl_throughput"
+SAMPLE = Path(__file__).resolve().parents[1] / "tests" / "samples" / "valid_small.json"
+BENCH_USER = "bench"
+
+
+class ReplayCassette(Cassette):
+    """
+    Replay-only cassette for load: any number of requests may match the same
+    recording (concurrent projects ask for the same URLs), and each replay
+    waits an injected latency first.
+    """
+
+    def __init__(self, paths, latency: float, jitter: float, monkeypatch):
+        super().__init__(paths[0], mode="replay", monkeypatch=monkeypatch)
+        self.paths = paths
+        self.latency = latency
+        self.jitter = jitter
+        self.replayed = Counter()
+
+    def install(self):
+        """Patch httpx for the rest of the process (uvicorn workers serving a load test)."""
+        self._load()
+
+        async def request(client, method, url, *args, **kwargs):
+            return await self._patched_request(client, method, url, *args, **kwargs)
+
+        self.monkeypatch.setattr(httpx.AsyncClient, "request", request)
+        return self
+
+    def _load(self):
+        playback = []
+        for path in self.paths:
+            self.path = path
+            super()._load()
+            playback.extend(self._playback)
+        self._playback = playback
+
+    def _pop_next(self, method: str, url: str):
+        for rec in self._playback:
+            req = rec.get("request") or {}
+            if req.get("method") == method and req.get("url") == str(url):
+                return rec
+        return None
+
+    async def _patched_request(self, client, method: str, url: str, *args, **kwargs):
+        if self._is_local(str(url)):
+            return await self._orig_request(client, method, url, *args, **kwargs)
+        record = self._pop_next(method, url)
+        if record is None:
+            raise RuntimeError(f"No VHS recording for {method} {url}")
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        self.replayed[f"{method} {str(url).split('?')[0]}"] += 1
+        return self._response_from_record(record)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+async def _create(client, semaphore, geometry: dict, index: int) -> dict:
+    async with semaphore:
+        started = time.perf_counter()
+        resp = await client.post(
+            "/api/platform/projects",
+            json={"username": BENCH_USER, "name": f"bench-{index}", "geometry": geometry},
+        )
+        return {
+            "latency": time.perf_counter() - started,
+            "status": resp.status_code,
+            "project_id": resp.json().get("project_id") if resp.status_code == 201 else None,
+        }
+
+
+async def _stage_timings(analytics_db, project_ids) -> dict:
+    """p50/p95 of each layer stage over the created projects (milliseconds)."""
+    samples: dict = {}
+    statuses = Counter()
+    cursor = analytics_db.terrain.find({"project_id": {"$in": project_ids}}, {"etl_layers": 1})
+    async for doc in cursor:
+        for layer, entry in (doc.get("etl_layers") or {}).items():
+            statuses[f"{layer}:{entry.get('status')}"] += 1
+            timings = entry.get("timings") or {}
+            if timings:
+                samples.setdefault(f"{layer}.total", []).append(timings["total_ms"])
+            for stage, stats in (timings.get("stages") or {}).items():
+                samples.setdefault(f"{layer}.{stage}", []).append(stats["ms"])
+    stages = {name: benchmarks.percentiles(values, (50, 95)) for name, values in sorted(samples.items())}
+    return {"layer_status": dict(statuses), "stages_ms": stages}
+
+
+def bench_config(args) -> PlatformConfig:
+    """Point both engines at the benchmark databases (before the app connects)."""
+    # The shared analytics_db read ANALYTICS_MONGO_URL / ANALYTICS_DB_NAME at import.
+    analytics_db.mongo_url = args.mongo_url
+    analytics_db.db_name = args.analytics_db
+    return dataclasses.replace(PlatformConfig.from_env(), mongo_url=args.mongo_url, mongo_db=args.platform_db)
+
+
+async def run(args) -> dict:
+    config = bench_config(args)
+    mongo = AsyncIOMotorClient(args.mongo_url)
+    await mongo.drop_database(args.platform_db)
+    await mongo.drop_database(args.analytics_db)
+
+    geometry = json.loads(Path(args.geometry).read_text())
+    paths = [CASSETTE_DIR / f"{name}.json" for name in args.cassettes.split(",") if name]
+    database = PlatformDatabase(config)
+    app = create_app(config=config, db=database)
+    try:
+        with tempfile.TemporaryDirectory(prefix="landos-bench-") as scratch, pytest.MonkeyPatch.context() as monkeypatch:
+            if args.cold_caches:
+                monkeypatch.setattr(importlib.import_module("backend.services.analytics.api.trigger_etl"),
+                                    "CACHE_DIR", Path(scratch))
+                monkeypatch.setattr(land_cover, "LAND_COVER_CACHE", Path(scratch))
+            async with ReplayCassette(paths, args.latency, args.jitter, monkeypatch) as cassette:
+                async with app.router.lifespan_context(app):
+                    await database.get_db().users.insert_one({"username": BENCH_USER, "projects": []})
+                    semaphore = asyncio.Semaphore(args.concurrency)
+                    transport = ASGITransport(app=app)
+                    async with AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                        started = time.perf_counter()
+                        runs = await asyncio.gather(
+                            *(_create(client, semaphore, geometry, i) for i in range(args.projects))
+                        )
+                        elapsed = time.perf_counter() - started
+                    project_ids = [r["project_id"] for r in runs if r["project_id"]]
+                    failed = await database.get_db().projects.count_documents(
+                        {"project_id": {"$in": project_ids}, "status": {"$ne": "ready"}}
+                    )
+                    stages = await _stage_timings(mongo[args.analytics_db], project_ids)
+    finally:
+        if not args.keep:
+            await mongo.drop_database(args.platform_db)
+            await mongo.drop_database(args.analytics_db)
+        mongo.close()
+
+    latencies = [r["latency"] for r in runs]
+    return {
+        "create_project": {
+            "projects": args.projects,
+            "concurrency": args.concurrency,
+            "injected_latency": args.latency,
+            "projects_per_minute": round(len(project_ids) / elapsed * 60, 2),
+            "http_errors": sum(1 for r in runs if r["status"] != 201),
+            "etl_failed": failed,
+            **{key: round(value, 3) for key, value in benchmarks.percentiles(latencies).items()},
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        },
+        **stages,
+        "replayed": dict(cassette.replayed),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every replayed call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--cassettes", default="platform_grid_etl", help="comma-separated cassette names")
+    parser.add_argument("--geometry", default=str(SAMPLE), help="GeoJSON polygon used for every project")
+    parser.add_argument("--cold-caches", action="store_true", help="bypass the DEM / CDL file caches")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--platform-db", default="bench_platform")
+    parser.add_argument("--analytics-db", default="bench_analytics")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark databases afterwards")
+    parser.add_argument("--out", default=str(benchmarks.RESULTS_DIR / f"{SUITE}.json"))
+    parser.add_argument("--baseline", default=str(benchmarks.BASELINE_DIR / f"{SUITE}.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=benchmarks.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    benchmarks.quiet_logs()
+    results = asyncio.run(run(args))
+    benchmarks.save(Path(args.out), SUITE, results)
+    print(json.dumps(results, indent=2))
+
+    baseline = benchmarks.load(Path(args.baseline))
+    regressed = False
+    if baseline:
+        current = {"create_project": results["create_project"]}
+        for key, higher_is_better in (("projects_per_minute", True), ("p95", False)):
+            delta = benchmarks.compare(
+                current, baseline, key=key, tolerance=args.tolerance, higher_is_better=higher_is_better
+            ).get("create_project")
+            if delta:
+                print(f"{key}: x{delta['ratio']:.2f}{'  REGRESSED' if delta['regressed'] else ''}")
+                regressed = regressed or delta["regressed"]
+    if args.save_baseline:
+        benchmarks.save(Path(args.baseline), SUITE, results)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
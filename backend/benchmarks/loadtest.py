@@ -0,0 +1,352 @@
+"""
+Scripted API load test of the platform endpoints.
+
+Runs a weighted mix of operations against the app for --duration seconds and
+reports latency percentiles and throughput per endpoint:
+
+    signup       POST /signup then POST /login for a new user
+    login        POST /login for an existing user
+    list         GET /projects (bearer token)
+    grid         GET /projects/{id}/grid
+    grid_layer   GET /projects/{id}/grid?layer=<--layer>
+    create       POST /projects (runs the full ETL, remote calls replayed)
+
+Targets:
+
+    python -m backend.benchmarks.loadtest                             # in-process, httpx ASGI transport
+    python -m backend.benchmarks.loadtest --serve --workers 4         # spawns uvicorn on localhost
+    python -m backend.benchmarks.loadtest --url http://127.0.0.1:8000  # an already running server
+
+--rate sets open-loop arrivals per second (Poisson; requests are not held
+back by slow responses). With --rate 0 every one of --users loops through
+operations back to back instead. Remote dataset calls are answered from the
+cassettes with --latency added (see etl_throughput.ReplayCassette); a server
+started with --url must do that itself, e.g. with
+`uvicorn backend.benchmarks.loadtest:replay_app --factory`.
+
+Users and --seed-projects projects are created before the measured phase;
+the benchmark databases are dropped before and after the run.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from backend import benchmarks, create_app
+from backend.benchmarks.etl_throughput import SAMPLE, ReplayCassette, bench_config, peak_rss_mb
+from backend.conftest import CASSETTE_DIR
+from backend.platform.db_connection import PlatformDatabase
+
+SUITE = "loadtest"
+API = "/api/platform"
+DEFAULT_MIX = "login=5,list=35,grid=20,grid_layer=35,create=5"
+DEFAULT_CASSETTES = "platform_grid_etl"
+PASSWORD = "bench-password"
+OPERATIONS = ("signup", "login", "list", "grid", "grid_layer", "create")
+
+
+def parse_mix(text: str) -> dict:
+    """"name=weight,..." -> {name: weight}; unknown operations and non-positive totals are rejected."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if sum(mix.values()) <= 0:
+        raise ValueError("operation mix has no positive weight")
+    return mix
+
+
+class Workload:
+    """Shared state of one run: known users / projects and the per-endpoint samples."""
+
+    def __init__(self, client, geometry: dict, layer: str, seed: int = 0):
+        self.client = client
+        self.geometry = geometry
+        self.layer = layer
+        self.rng = random.Random(seed)
+        self.users: list = []
+        self.projects: list = []
+        self.samples = defaultdict(list)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._names = itertools.count()
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+            status = resp.status_code
+        except Exception:
+            resp, status = None, 599
+        finally:
+            self.in_flight -= 1
+        self.samples[endpoint].append((time.perf_counter() - started, status))
+        return resp if status < 400 else None
+
+    async def login(self, user: dict) -> None:
+        resp = await self.call("login", "POST", f"{API}/login", json={"username": user["username"], "password": PASSWORD})
+        if resp is not None:
+            user["token"] = resp.json()["token"]
+
+    async def signup(self) -> None:
+        user = {"username": f"load-{os.getpid()}-{next(self._names)}", "token": None}
+        if await self.call("signup", "POST", f"{API}/signup", json={"username": user["username"], "password": PASSWORD}):
+            await self.login(user)
+            self.users.append(user)
+
+    async def create(self, user: dict) -> None:
+        resp = await self.call(
+            "create_project", "POST", f"{API}/projects",
+            json={"username": user["username"], "name": f"load-{next(self._names)}", "geometry": self.geometry},
+        )
+        if resp is not None:
+            self.projects.append(resp.json()["project_id"])
+
+    async def run(self, operation: str) -> None:
+        user = self.rng.choice(self.users) if self.users else None
+        project = self.rng.choice(self.projects) if self.projects else None
+        if operation == "signup" or user is None:
+            await self.signup()
+        elif operation == "login":
+            await self.login(user)
+        elif operation == "list":
+            await self.call("list_projects", "GET", f"{API}/projects",
+                            headers={"Authorization": f"Bearer {user['token']}"})
+        elif operation == "create" or project is None:
+            await self.create(user)
+        elif operation == "grid":
+            await self.call("grid", "GET", f"{API}/projects/{project}/grid")
+        elif operation == "grid_layer":
+            await self.call("grid_layer", "GET", f"{API}/projects/{project}/grid", params={"layer": self.layer})
+
+
+async def drive(workload: Workload, mix: dict, duration: float, rate: float, users: int) -> float:
+    """Run the mix for duration seconds; returns the elapsed time including stragglers."""
+    names, weights = list(mix), list(mix.values())
+
+    def pick() -> str:
+        return workload.rng.choices(names, weights)[0]
+
+    started = time.perf_counter()
+    deadline = started + duration
+    if rate > 0:
+        tasks = []
+        arrival = started
+        while True:
+            arrival += workload.rng.expovariate(rate)
+            if arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(workload.run(pick())))
+        await asyncio.gather(*tasks)
+    else:
+        async def loop():
+            while time.perf_counter() < deadline:
+                await workload.run(pick())
+
+        await asyncio.gather(*(loop() for _ in range(users)))
+    return time.perf_counter() - started
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    """Per endpoint: requests, errors, throughput (req/s) and latency p50/p95/p99 (seconds)."""
+    report = {}
+    for endpoint, rows in sorted(samples.items()):
+        latencies = [latency for latency, _ in rows]
+        report[endpoint] = {
+            "requests": len(rows),
+            "errors": sum(1 for _, status in rows if status >= 400),
+            "rps": round(len(rows) / elapsed, 2) if elapsed else None,
+            **{k: v if v is None else round(v, 4) for k, v in benchmarks.percentiles(latencies).items()},
+        }
+    return report
+
+
+async def prepare(workload: Workload, users: int, seed_projects: int) -> None:
+    """Create the users and seed projects; their requests are not part of the report."""
+    for _ in range(users):
+        await workload.signup()
+    if not workload.users:
+        raise RuntimeError("could not create any benchmark user")
+    for index in range(seed_projects):
+        await workload.create(workload.users[index % len(workload.users)])
+    workload.samples.clear()
+    workload.max_in_flight = 0
+
+
+async def measure(client, args, mix: dict) -> dict:
+    workload = Workload(client, json.loads(Path(args.geometry).read_text()), args.layer, args.seed)
+    await prepare(workload, args.users, args.seed_projects)
+    elapsed = await drive(workload, mix, args.duration, args.rate, args.users)
+    return {
+        "endpoints": summarize(workload.samples, elapsed),
+        "run": {
+            "target": args.url or ("uvicorn" if args.serve else "asgi"),
+            "workers": args.workers if args.serve else None,
+            "users": args.users,
+            "rate": args.rate,
+            "duration": args.duration,
+            "elapsed": round(elapsed, 2),
+            "mix": mix,
+            "max_in_flight": workload.max_in_flight,
+            "client_peak_rss_mb": round(peak_rss_mb(), 1),
+        },
+    }
+
+
+def replay_app():
+    """
+    uvicorn --factory entry point: the platform app with remote dataset calls
+    answered from cassettes (BENCH_CASSETTES, BENCH_LATENCY, BENCH_JITTER).
+    """
+    paths = [CASSETTE_DIR / f"{name}.json" for name in os.getenv("BENCH_CASSETTES", DEFAULT_CASSETTES).split(",") if name]
+    latency, jitter = float(os.getenv("BENCH_LATENCY", "0")), float(os.getenv("BENCH_JITTER", "0"))
+    ReplayCassette(paths, latency, jitter, pytest.MonkeyPatch()).install()
+    return create_app()
+
+
+async def _wait_healthy(client, process, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not become healthy in time")
+
+
+def _serve(args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PLATFORM_MONGO_URL": args.mongo_url,
+        "PLATFORM_DB_NAME": args.platform_db,
+        "ANALYTICS_MONGO_URL": args.mongo_url,
+        "ANALYTICS_DB_NAME": args.analytics_db,
+        "BENCH_CASSETTES": args.cassettes,
+        "BENCH_LATENCY": str(args.latency),
+        "BENCH_JITTER": str(args.jitter),
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "backend.benchmarks.loadtest:replay_app", "--factory",
+        "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=benchmarks.BENCH_DIR.parents[1], env=env)
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    mongo = AsyncIOMotorClient(args.mongo_url)
+    await mongo.drop_database(args.platform_db)
+    await mongo.drop_database(args.analytics_db)
+    try:
+        if args.url or args.serve:
+            base_url = args.url or f"http://127.0.0.1:{args.port}"
+            process = _serve(args) if args.serve else None
+            try:
+                async with AsyncClient(base_url=base_url, timeout=None) as client:
+                    if process:
+                        await _wait_healthy(client, process)
+                    return await measure(client, args, mix)
+            finally:
+                if process:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+        config = bench_config(args)
+        database = PlatformDatabase(config)
+        app = create_app(config=config, db=database)
+        paths = [CASSETTE_DIR / f"{name}.json" for name in args.cassettes.split(",") if name]
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            async with ReplayCassette(paths, args.latency, args.jitter, monkeypatch):
+                async with app.router.lifespan_context(app):
+                    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+                        return await measure(client, args, mix)
+    finally:
+        if not args.keep:
+            await mongo.drop_database(args.platform_db)
+            await mongo.drop_database(args.analytics_db)
+        mongo.close()
+
+
+def print_report(endpoints: dict, comparison: dict) -> None:
+    width = max((len(name) for name in endpoints), default=10)
+    for name, stats in endpoints.items():
+        line = f"{name:<{width}}  {stats['requests']:6d} req  {stats['errors']:4d} err  {stats['rps']:8.2f} req/s"
+        for key in ("p50", "p95", "p99"):
+            line += f"  {key} {stats[key] * 1000:9.1f} ms"
+        if name in comparison:
+            delta = comparison[name]
+            line += f"  p95 x{delta['ratio']:.2f}{'  REGRESSED' if delta['regressed'] else ''}"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="base URL of an already running server")
+    target.add_argument("--serve", action="store_true", help="start uvicorn on localhost for the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --serve")
+    parser.add_argument("--port", type=int, default=8765, help="uvicorn port with --serve")
+    parser.add_argument("--users", type=int, default=10, help="users created up front (concurrent loops with --rate 0)")
+    parser.add_argument("--rate", type=float, default=20.0, help="arrivals per second; 0 runs closed-loop users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights, name=weight,... ({', '.join(OPERATIONS)})")
+    parser.add_argument("--layer", default="dem", help="layer requested by grid_layer")
+    parser.add_argument("--seed-projects", type=int, default=3, help="projects created before the measured phase")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for arrivals and operation choice")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every replayed call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--cassettes", default=DEFAULT_CASSETTES, help="comma-separated cassette names")
+    parser.add_argument("--geometry", default=str(SAMPLE), help="GeoJSON polygon for created projects")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--platform-db", default="bench_platform")
+    parser.add_argument("--analytics-db", default="bench_analytics")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark databases afterwards")
+    parser.add_argument("--out", default=str(benchmarks.RESULTS_DIR / f"{SUITE}.json"))
+    parser.add_argument("--baseline", default=str(benchmarks.BASELINE_DIR / f"{SUITE}.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=benchmarks.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    try:
+        parse_mix(args.mix)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    benchmarks.quiet_logs()
+    results = asyncio.run(run(args))
+    benchmarks.save(Path(args.out), SUITE, results)
+    print(json.dumps(results["run"], indent=2))
+
+    baseline = benchmarks.load(Path(args.baseline))
+    comparison = {}
+    if baseline:
+        previous = {"results": (baseline.get("results") or {}).get("endpoints") or {}}
+        comparison = benchmarks.compare(results["endpoints"], previous, key="p95", tolerance=args.tolerance)
+    print_report(results["endpoints"], comparison)
+    if args.save_baseline:
+        benchmarks.save(Path(args.baseline), SUITE, results)
+    return 1 if any(delta["regressed"] for delta in comparison.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Micro-benchmarks of the analytics hot paths on synthetic data.
+
+    python -m backend.benchmarks.micro                      # all cases, 100/1000/5000 grids
+    python -m backend.benchmarks.micro --sizes 100,1000 --only tiff,resample
+    python -m backend.benchmarks.micro --save-baseline      # record this machine's baseline
+
+Raster cases run per grid size (N x N cells). Results go to
+benchmarks/results/micro.json and are compared with
+benchmarks/baselines/micro.json when it exists; the exit status is 1 when a
+case regressed by more than --tolerance.
+"""
+
+import argparse
+import functools
+import importlib
+import math
+import sys
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+import rasterio
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+from shapely.geometry import MultiPolygon, Polygon, box, mapping, shape
+
+from backend import benchmarks
+from backend.services.analytics.api import calc_area, validate_geometry
+from backend.services.analytics.terrain.usa import land_cover, soil
+
+# The api package re-exports trigger_etl() under the module's name.
+dem_etl = importlib.import_module("backend.services.analytics.api.trigger_etl")
+
+SUITE = "micro"
+DEFAULT_SIZES = (100, 1000, 5000)
+# Synthetic project area: about 90 m cells south-west of Dallas.
+ORIGIN = (-98.0, 33.0)
+CELL = 1 / 1200
+
+Case = Tuple[str, Callable[[], Callable[[], object]]]
+
+
+def synthetic_dem(rows: int, cols: int, seed: int = 0) -> np.ndarray:
+    """Smooth hills plus noise, in metres."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:rows, 0:cols]
+    hills = 200 + 40 * np.sin(x / max(cols, 1) * 6) * np.cos(y / max(rows, 1) * 4)
+    return (hills + rng.normal(0, 2, (rows, cols))).astype("float32")
+
+
+def geotiff_bytes(data: np.ndarray) -> bytes:
+    rows, cols = data.shape
+    profile = {
+        "driver": "GTiff", "height": rows, "width": cols, "count": 1, "dtype": data.dtype.name,
+        "crs": "EPSG:4326", "transform": from_origin(ORIGIN[0], ORIGIN[1], CELL, CELL), "nodata": -9999,
+    }
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dataset:
+            dataset.write(data, 1)
+        return memfile.read()
+
+
+def grid_bounds(rows: int, cols: int) -> tuple:
+    return ORIGIN[0], ORIGIN[1] - rows * CELL, ORIGIN[0] + cols * CELL, ORIGIN[1]
+
+
+def wavy_polygon(cx: float, cy: float, radius: float, vertices: int, seed: int) -> Polygon:
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * math.pi, vertices, endpoint=False)
+    radii = radius * (1 + 0.3 * rng.random(vertices))
+    return Polygon(zip(cx + radii * np.cos(angles), cy + radii * np.sin(angles)))
+
+
+def complex_multipolygon(parts: int, vertices: int) -> dict:
+    side = math.ceil(math.sqrt(parts))
+    polygons = [
+        wavy_polygon(ORIGIN[0] + (i % side) * 0.02, ORIGIN[1] - (i // side) * 0.02, 0.008, vertices, i)
+        for i in range(parts)
+    ]
+    return mapping(MultiPolygon(polygons))
+
+
+def soil_shapes(rows: int, cols: int, polygons: int) -> list:
+    """Map-unit-like polygons tiling the grid (jittered boxes), indexed 1..n."""
+    left, bottom, right, top = grid_bounds(rows, cols)
+    side = math.ceil(math.sqrt(polygons))
+    width, height = (right - left) / side, (top - bottom) / side
+    shapes = []
+    for i in range(polygons):
+        x0, y0 = left + (i % side) * width, bottom + (i // side) * height
+        cell = box(x0, y0, x0 + width, y0 + height)
+        shapes.append((wavy_polygon(cell.centroid.x, cell.centroid.y, min(width, height) * 0.6, 64, i), i % 40 + 1))
+    return shapes
+
+
+def grid_payload(rows: int, cols: int) -> dict:
+    """A get_grid response with DEM and a categorical layer, as the route returns it."""
+    dem = synthetic_dem(rows, cols)
+    classes = (np.arange(rows * cols).reshape(rows, cols) // max(cols // 8, 1) % 12).astype(int)
+    return {
+        "project_id": "bench",
+        "layers": {
+            "dem": {"heightmap": dem.tolist(), "min_elevation": float(dem.min()), "max_elevation": float(dem.max())},
+            "land_cover": {"grid": classes.tolist(), "index_map": {str(c): f"class {c}" for c in range(12)}},
+        },
+        "etl_layers": {"dem": {"status": "ok"}, "land_cover": {"status": "ok"}},
+        "coverage_mask": None,
+    }
+
+
+def raster_cases(size: int) -> Iterator[Case]:
+    def process_tiff(crop: bool):
+        # Non-square source so _process_tiff has to pad; the crop case trims to an inner polygon bbox.
+        tiff = geotiff_bytes(synthetic_dem(size, max(1, int(size * 0.8))))
+        left, bottom, right, top = grid_bounds(size, size)
+        inset = (right - left) * 0.2
+        bounds = (left + inset, bottom + inset, right - inset, top - inset) if crop else None
+        return lambda: dem_etl._process_tiff(tiff, geom_bounds=bounds)
+
+    def resample():
+        source = (np.arange((size // 3 or 1) ** 2).reshape(size // 3 or 1, -1) % 255).tolist()
+        return lambda: land_cover._resample_grid(source, size, size)
+
+    def rasterize(polygons: int):
+        shapes = soil_shapes(size, size, polygons)
+        transform = from_origin(ORIGIN[0], ORIGIN[1], CELL, CELL)
+        return lambda: soil._rasterize_units(shapes, size, size, transform)
+
+    def grid_json():
+        payload = grid_payload(size, size)
+        return lambda: JSONResponse(content=jsonable_encoder(payload)).body
+
+    yield f"process_tiff_pad[{size}]", lambda: process_tiff(False)
+    yield f"process_tiff_crop[{size}]", lambda: process_tiff(True)
+    yield f"resample_grid[{size}]", resample
+    for polygons in (50, 500):
+        yield f"soil_rasterize[{size},{polygons}p]", lambda polygons=polygons: rasterize(polygons)
+    yield f"grid_json[{size}]", grid_json
+
+
+GEOMETRY_TARGETS = {
+    "square_bbox": lambda geometry: dem_etl._square_bbox(shape(geometry)),
+    "calculate_area_hectares": calc_area.calculate_area_hectares,
+    "validate_geometry": validate_geometry,
+}
+
+
+def geometry_cases() -> Iterator[Case]:
+    def setup(target, parts: int, vertices: int):
+        geometry = complex_multipolygon(parts, vertices)
+        return lambda: target(geometry)
+
+    for parts, vertices in ((1, 1000), (50, 200), (200, 500)):
+        for name, target in GEOMETRY_TARGETS.items():
+            yield f"{name}[{parts}x{vertices}]", functools.partial(setup, target, parts, vertices)
+
+
+def cases(sizes) -> Iterator[Case]:
+    """(name, setup) pairs; setup builds the inputs and returns the callable to time."""
+    yield from geometry_cases()
+    for size in sizes:
+        yield from raster_cases(size)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="grid sizes (N for N x N)")
+    parser.add_argument("--only", default="", help="comma-separated substrings of case names to run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (fewer when --budget runs out)")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per case before stopping repeats")
+    parser.add_argument("--out", default=str(benchmarks.RESULTS_DIR / f"{SUITE}.json"))
+    parser.add_argument("--baseline", default=str(benchmarks.BASELINE_DIR / f"{SUITE}.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=benchmarks.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    benchmarks.quiet_logs()
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    only = [part for part in args.only.split(",") if part]
+    results = {}
+    with rasterio.Env():
+        for name, setup in cases(sizes):
+            if only and not any(part in name for part in only):
+                continue
+            results[name] = benchmarks.measure(setup(), repeat=args.repeat, budget=args.budget)
+            print(f"{name}: {results[name]['median'] * 1000:.2f} ms", file=sys.stderr)
+
+    benchmarks.save(Path(args.out), SUITE, results)
+    baseline = benchmarks.load(Path(args.baseline))
+    comparison = benchmarks.compare(results, baseline, tolerance=args.tolerance) if baseline else {}
+    benchmarks.print_table(results, comparison)
+    if args.save_baseline:
+        benchmarks.save(Path(args.baseline), SUITE, results)
+    return 1 if any(delta["regressed"] for delta in comparison.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Startup-time benchmark of the API process.
+
+Each run is a fresh interpreter (as a worker restart is), timing:
+
+- import: `import backend` (the app module uvicorn loads)
+- create_app: building the FastAPI app
+- lifespan: startup (DB connect, collections/indexes, engine initializers),
+  ready (until the background dataset loads are done, counted from the
+  start of startup) and shutdown, against --mongo-url (skipped with --import-only)
+
+It also lists heavy modules that were imported eagerly although they should
+load on first ETL use (LAZY_MODULES); any such module fails the run.
+
+Deferring those only trims the import (about 0.91 s to 0.87 s on a dev
+machine). Most of what remains is not deferrable: FastAPI / pydantic route
+and model setup (~0.4 s), motor / pymongo (~0.2 s) and numpy (~0.1 s), which
+the analytics modules use at import. shapely and httpx are still imported
+eagerly too; on top of numpy and anyio each adds only ~20-50 ms, and project
+creation (geometry validation) and the ETL fetchers load them on the first
+request anyway.
+
+    python -m backend.benchmarks.startup --runs 5
+    python -m backend.benchmarks.startup --import-only
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from backend import benchmarks
+
+SUITE = "startup"
+# Geo / raster stacks and country ETL modules that importing the API must not load.
+LAZY_MODULES = (
+    "rasterio",
+    "pyproj",
+    "shapefile",
+    "scipy",
+    "backend.services.analytics.terrain.usa",
+)
+
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import backend
+imported = time.perf_counter()
+eager = [name for name in {lazy!r} if name in sys.modules]
+result = {{"import": imported - started, "eager": eager}}
+if {lifespan!r}:
+    import asyncio, dataclasses
+    from backend import create_app
+    from backend.platform.config import PlatformConfig
+    from backend.platform.db_connection import PlatformDatabase
+
+    async def boot():
+        config = dataclasses.replace(PlatformConfig.from_env(), mongo_url={mongo_url!r}, mongo_db={db!r})
+        t0 = time.perf_counter()
+        app = create_app(config=config, db=PlatformDatabase(config))
+        t1 = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            t2 = time.perf_counter()
+            await asyncio.gather(*app.state.startup_tasks)
+            t3 = time.perf_counter()
+        t4 = time.perf_counter()
+        return {{"create_app": t1 - t0, "lifespan_startup": t2 - t1, "ready": t3 - t1, "lifespan_shutdown": t4 - t3}}
+
+    result.update(asyncio.run(boot()))
+print(json.dumps(result))
+"""
+
+
+def probe(args) -> dict:
+    code = PROBE.format(lazy=LAZY_MODULES, lifespan=not args.import_only, mongo_url=args.mongo_url, db=args.platform_db)
+    env = {**os.environ, "ANALYTICS_MONGO_URL": args.mongo_url, "ANALYTICS_DB_NAME": args.analytics_db}
+    done = subprocess.run(
+        [sys.executable, "-c", code], cwd=benchmarks.BENCH_DIR.parents[1], env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--import-only", action="store_true", help="skip create_app and the lifespan (no Mongo needed)")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--platform-db", default="bench_platform")
+    parser.add_argument("--analytics-db", default="bench_analytics")
+    parser.add_argument("--out", default=str(benchmarks.RESULTS_DIR / f"{SUITE}.json"))
+    parser.add_argument("--baseline", default=str(benchmarks.BASELINE_DIR / f"{SUITE}.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=benchmarks.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    runs = [probe(args) for _ in range(args.runs)]
+    eager = sorted({name for run in runs for name in run.pop("eager")})
+    results = {}
+    for phase in runs[0]:
+        times = [run[phase] for run in runs]
+        results[phase] = {"runs": len(times), "min": min(times), "median": statistics.median(times),
+                          "mean": statistics.fmean(times)}
+
+    benchmarks.save(Path(args.out), SUITE, {**results, "eager_modules": eager})
+    baseline = benchmarks.load(Path(args.baseline))
+    comparison = benchmarks.compare(results, baseline, tolerance=args.tolerance) if baseline else {}
+    benchmarks.print_table(results, comparison)
+    if eager:
+        print(f"eagerly imported: {', '.join(eager)}")
+    if args.save_baseline:
+        benchmarks.save(Path(args.baseline), SUITE, results)
+    return 1 if eager or any(delta["regressed"] for delta in comparison.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
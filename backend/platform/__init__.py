@@ -1,13 +1,20 @@
 """
 Platform package initializer.
 
-When imported as ``backend.platform`` it exposes platform utilities.
+When imported as ``backend.platform`` it exposes platform utilities (loaded on
+first access: utils imports the analytics engine, which light imports such as
+backend.platform.config should not pay for).
 When accidentally imported as top-level ``platform`` (e.g., stdlib lookup),
 it defers to the stdlib platform module to avoid shadowing issues.
 """
 
 if __name__ == "backend.platform":
-    from backend.platform import utils  # re-export for convenience
+    def __getattr__(name):
+        if name == "utils":
+            import importlib
+            return importlib.import_module("backend.platform.utils")
+        raise AttributeError(f"module 'backend.platform' has no attribute '{name}'")
+
     __all__ = ["utils"]
 else:
     import importlib.util as _util
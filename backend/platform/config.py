@@ -15,6 +15,19 @@ class PlatformConfig:
     mongo_url: str
     mongo_db: str
     auth_secret: str
+    # Sessions expire server-side after session_ttl seconds; validated sessions are
+    # cached per worker for up to session_cache_ttl seconds (session_cache_size entries).
+    session_ttl: int = 7 * 24 * 3600
+    session_cache_ttl: float = 60.0
+    session_cache_size: int = 10000
+    # How often each worker polls for sessions revoked by other workers (seconds).
+    session_revocation_poll: float = 2.0
+    # Event-loop lag sampling period for /metrics (seconds); 0 disables it.
+    loop_lag_interval: float = 0.5
+    # Log and count the call site whenever the loop is blocked longer than this (seconds); 0 disables it.
+    loop_block_threshold: float = 0.0
+    # Let admins profile single requests with X-Profile: 1 / ?profile=1 (see platform.profiling).
+    profiling: bool = False
 
     @classmethod
     def from_env(cls) -> "PlatformConfig":
@@ -26,4 +39,13 @@ class PlatformConfig:
             mongo_url=mongo_url,
             mongo_db=mongo_db,
             auth_secret=auth_secret,
+            session_ttl=int(os.getenv("PLATFORM_SESSION_TTL", str(cls.session_ttl))),
+            session_cache_ttl=float(os.getenv("PLATFORM_SESSION_CACHE_TTL", str(cls.session_cache_ttl))),
+            session_cache_size=int(os.getenv("PLATFORM_SESSION_CACHE_SIZE", str(cls.session_cache_size))),
+            session_revocation_poll=float(
+                os.getenv("PLATFORM_SESSION_REVOCATION_POLL", str(cls.session_revocation_poll))
+            ),
+            loop_lag_interval=float(os.getenv("PLATFORM_LOOP_LAG_INTERVAL", str(cls.loop_lag_interval))),
+            loop_block_threshold=float(os.getenv("PLATFORM_LOOP_BLOCK_THRESHOLD", str(cls.loop_block_threshold))),
+            profiling=os.getenv("PLATFORM_PROFILING") == "1",
         )
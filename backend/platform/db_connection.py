@@ -7,6 +7,7 @@ directly throughout the codebase.
 
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from backend.platform import mongo_clients
 from backend.platform.config import PlatformConfig
 
 
@@ -16,23 +17,20 @@ class PlatformDatabase:
         self.client: AsyncIOMotorClient | None = None
 
     def connect(self) -> None:
-        """Initialize the Motor client for the configured Mongo URL."""
-        self.client = AsyncIOMotorClient(
-            self.config.mongo_url,
-            uuidRepresentation="standard",
-            serverSelectionTimeoutMS=2000,
-        )
+        """Take the shared Motor client for the configured Mongo URL."""
+        if self.client is None:
+            self.client = mongo_clients.acquire(self.config.mongo_url, "platform")
 
     def get_db(self):
         """Return the configured logical database."""
         if not self.client:
             raise RuntimeError("Database client is not connected")
-        return self.client[self.config.mongo_db]
+        return mongo_clients.database(self.client, self.config.mongo_db, "platform")
 
     def close(self) -> None:
         """Close the client if it was created; safe to call multiple times."""
         if self.client:
-            self.client.close()
+            mongo_clients.release(self.client)
             self.client = None
 
 
@@ -0,0 +1,154 @@
+"""
+Declarative index registry shared by the engines.
+
+Each engine declares the indexes of its collections (keys plus create_index
+options such as name, unique or expireAfterSeconds) and the hot lookups it
+runs on request paths. At startup ensure() creates the declared indexes of an
+engine concurrently, replacing an index whose keys match but whose options
+changed, and verify() reports declared indexes that are missing, indexes
+present on the server but not declared, indexes not used since the server
+started, and probe queries that are still planned as a collection scan.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger("landos.platform")
+
+IndexSpec = Tuple[list, dict]
+INDEX_NOT_FOUND = 27
+INDEX_OPTIONS_CONFLICT = 85
+
+# engine -> collection -> [(keys, options)]
+REGISTRY: Dict[str, Dict[str, List[IndexSpec]]] = {}
+# engine -> [(collection, filter)] run through explain() by verify()
+PROBES: Dict[str, List[Tuple[str, dict]]] = {}
+# engine -> last ensure/verify report
+REPORTS: Dict[str, dict] = {}
+
+
+def declare(engine: str, indexes: Dict[str, List[IndexSpec]], probes: Optional[List[Tuple[str, dict]]] = None) -> None:
+    """Register (or extend) an engine's index declarations and probe queries."""
+    collections = REGISTRY.setdefault(engine, {})
+    for collection, specs in indexes.items():
+        declared = collections.setdefault(collection, [])
+        for keys, options in specs:
+            if (keys, options) not in declared:
+                declared.append((keys, options))
+    known = PROBES.setdefault(engine, [])
+    known.extend(probe for probe in probes or [] if probe not in known)
+
+
+def index_name(keys: list, options: dict) -> str:
+    """Name Mongo gives the index (explicit name or the default key_dir_key_dir form)."""
+    return options.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+async def _ensure_one(db, collection: str, keys: list, options: dict) -> str:
+    coll = db[collection]
+    try:
+        await coll.create_index(keys, **options)
+        return "ok"
+    except OperationFailure as exc:
+        # Only same keys with different options (changed TTL, uniqueness, name) are replaced;
+        # anything else (duplicate keys under a unique index, a name used by other keys) is
+        # reported and the existing index is left alone.
+        if exc.code != INDEX_OPTIONS_CONFLICT:
+            raise
+    logger.info("Replacing index %s on %s", index_name(keys, options), collection)
+    try:
+        await coll.drop_index(keys)
+    except OperationFailure as exc:
+        # Another worker replacing the same index got there first.
+        if exc.code != INDEX_NOT_FOUND:
+            raise
+    await coll.create_index(keys, **options)
+    return "replaced"
+
+
+async def ensure(db, engine: str) -> dict:
+    """Create the engine's declared indexes concurrently; failures are reported, not raised."""
+    specs = [
+        (collection, keys, options)
+        for collection, declared in REGISTRY.get(engine, {}).items()
+        for keys, options in declared
+    ]
+    results = await asyncio.gather(
+        *(_ensure_one(db, collection, keys, options) for collection, keys, options in specs),
+        return_exceptions=True,
+    )
+    report = {"engine": engine, "ok": [], "replaced": [], "failed": {}}
+    for (collection, keys, options), result in zip(specs, results):
+        label = f"{collection}.{index_name(keys, options)}"
+        if isinstance(result, Exception):
+            report["failed"][label] = str(result)
+            logger.error("Index %s for %s could not be created: %s", label, engine, result)
+        else:
+            report[result].append(label)
+    REPORTS[engine] = report
+    logger.info("Indexes ensured for %s: %s ok, %s replaced, %s failed",
+                engine, len(report["ok"]), len(report["replaced"]), len(report["failed"]))
+    return report
+
+
+async def _collection_report(db, collection: str, declared: List[IndexSpec]) -> dict:
+    coll = db[collection]
+    present = {doc["name"] async for doc in coll.list_indexes()}
+    expected = {index_name(keys, options) for keys, options in declared}
+    unused = []
+    try:
+        async for stat in coll.aggregate([{"$indexStats": {}}]):
+            if stat["name"] != "_id_" and not stat.get("accesses", {}).get("ops"):
+                unused.append(stat["name"])
+    except OperationFailure:
+        pass
+    return {
+        "missing": sorted(expected - present),
+        "undeclared": sorted(present - expected - {"_id_"}),
+        "unused": sorted(unused),
+    }
+
+
+def _plan_stages(plan: dict) -> list:
+    stages = [plan.get("stage")]
+    for child in [plan.get("inputStage")] + list(plan.get("inputStages") or []):
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+async def _probe(db, collection: str, query: dict) -> dict:
+    explained = await db.command({"explain": {"find": collection, "filter": query}, "verbosity": "queryPlanner"})
+    stages = _plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+    return {"collection": collection, "filter": sorted(query), "stages": [s for s in stages if s]}
+
+
+async def verify(db, engine: str) -> dict:
+    """
+    Compare declared and present indexes and explain the engine's probe queries.
+    Best effort: a verification failure is logged and reported, never raised.
+    """
+    report = REPORTS.setdefault(engine, {"engine": engine})
+    collections = REGISTRY.get(engine, {})
+    try:
+        reports = await asyncio.gather(
+            *(_collection_report(db, name, declared) for name, declared in collections.items())
+        )
+        plans = await asyncio.gather(*(_probe(db, name, query) for name, query in PROBES.get(engine, [])))
+    except Exception as exc:
+        logger.warning("Index verification for %s skipped: %s", engine, exc)
+        report["verify_error"] = str(exc)
+        return report
+    report["collections"] = dict(zip(collections, reports))
+    report["collscans"] = [plan for plan in plans if "COLLSCAN" in plan["stages"]]
+    for name, found in report["collections"].items():
+        if found["missing"]:
+            logger.warning("Missing indexes on %s.%s: %s", engine, name, found["missing"])
+        if found["undeclared"]:
+            logger.info("Undeclared indexes on %s.%s: %s", engine, name, found["undeclared"])
+    for plan in report["collscans"]:
+        logger.warning("Query on %s.%s by %s is a collection scan", engine, plan["collection"], plan["filter"])
+    return report
@@ -0,0 +1,131 @@
+"""
+Event-loop block monitor (opt-in).
+
+DEM processing, rasterize and shapely calls run inline in coroutines, so one
+heavy request stalls every other request of the worker. The monitor names the
+code doing it: a heartbeat task stamps the time every tick, and a watchdog
+thread checks the stamp. When the heartbeat is more than threshold seconds
+late, whatever runs on the loop thread is blocking it; the watchdog captures
+that thread's stack, attributes the stall to the innermost frame in backend
+code (the call site) and logs it. Once the loop runs again the stall's length
+is added to the call site's totals.
+
+Enable it with PLATFORM_LOOP_BLOCK_THRESHOLD (seconds, 0 = off). Counts per
+call site are exported as landos_event_loop_blocks_total and served by
+/health/loop.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from backend.platform import metrics
+
+logger = logging.getLogger("landos.platform")
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+# Watchdog / heartbeat period relative to the threshold, and its bounds (seconds).
+TICK_FRACTION = 0.25
+MIN_TICK, MAX_TICK = 0.01, 0.25
+STACK_LIMIT = 30
+
+
+def call_site(stack: traceback.StackSummary) -> str:
+    """"path:function" of the innermost backend frame (other than this module), else of the innermost frame."""
+    here = Path(__file__).resolve()
+    for frame in reversed(stack):
+        path = Path(frame.filename).resolve()
+        if path != here and BACKEND_DIR in path.parents:
+            return f"{path.relative_to(BACKEND_DIR.parent)}:{frame.name}"
+    if not stack:
+        return "unknown"
+    return f"{Path(stack[-1].filename).name}:{stack[-1].name}"
+
+
+class LoopMonitor:
+    """Heartbeat on the event loop plus a watchdog thread capturing the stack of long stalls."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.tick = min(MAX_TICK, max(MIN_TICK, threshold * TICK_FRACTION))
+        self.sites: dict = {}
+        self.stalls = 0
+        self._lock = threading.Lock()
+        self._beat = 0.0
+        self._stall: Optional[dict] = None
+        self._loop_thread: Optional[int] = None
+        self._task = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                stall, self._stall = self._stall, None
+                self._beat = now
+            if stall is not None:
+                self._finish(stall, now - stall["since"])
+            await asyncio.sleep(self.tick)
+
+    def _watch(self):
+        while not self._stopping.wait(self.tick):
+            with self._lock:
+                late = time.monotonic() - self._beat - self.tick
+                if late <= self.threshold or self._stall is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = traceback.extract_stack(frame, limit=STACK_LIMIT) if frame is not None else traceback.StackSummary()
+                stall = {"site": call_site(stack), "stack": stack.format(), "since": self._beat + self.tick}
+                self._stall = stall
+                self.stalls += 1
+            metrics.LOOP_BLOCKS.labels(stall["site"]).inc()
+            logger.warning(
+                "Event loop blocked for over %.3fs at %s\n%s", late, stall["site"], "".join(stall["stack"]).rstrip()
+            )
+
+    def _finish(self, stall: dict, blocked: float) -> None:
+        entry = self.sites.setdefault(stall["site"], {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        entry["count"] += 1
+        entry["total_s"] = round(entry["total_s"] + blocked, 4)
+        entry["max_s"] = round(max(entry["max_s"], blocked), 4)
+        entry["stack"] = stall["stack"]
+        logger.info("Event loop unblocked after %.3fs (%s)", blocked, stall["site"])
+
+    def stats(self) -> dict:
+        """Stall counts and blocked time per call site, longest total first."""
+        sites = sorted(self.sites.items(), key=lambda item: item[1]["total_s"], reverse=True)
+        return {
+            "enabled": self._task is not None,
+            "threshold": self.threshold,
+            "stalls": self.stalls,
+            "sites": [{"site": site, **entry} for site, entry in sites],
+        }
+
+    async def start(self) -> None:
+        if self.threshold <= 0:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+        logger.info("Event-loop block monitor on (threshold %.3fs)", self.threshold)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._thread.join(timeout=1)
+        self._task = self._thread = None
@@ -0,0 +1,192 @@
+"""
+Prometheus metrics for the platform and its engines.
+
+Request latency is recorded per route template by MetricsMiddleware. Engine
+internals report through the helpers below: ETL runs per layer and outcome,
+remote fetch latency per source, cache lookups, Mongo pool checkouts and
+commands (see mongo_commands), event-loop lag and loop stalls per call site
+(see loop_monitor).
+
+Under several uvicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory shared by the workers (cleared before each start); /metrics
+then aggregates every worker's samples with the multiprocess collector.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+logger = logging.getLogger("landos.platform")
+
+# Seconds; covers cached API reads up to multi-minute ETL runs.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 4e6, 16e6, 64e6)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "landos_http_request_duration_seconds",
+    "HTTP request latency by route template and status (the _count series is the request count).",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "landos_http_requests_in_progress", "HTTP requests being served.", multiprocess_mode="livesum"
+)
+ETL_RUNS = Counter("landos_etl_runs_total", "ETL runs by layer and outcome.", ["layer", "outcome"])
+ETL_DURATION = Histogram("landos_etl_duration_seconds", "ETL run duration by layer.", ["layer"], buckets=LATENCY_BUCKETS)
+FETCH_LATENCY = Histogram(
+    "landos_remote_fetch_duration_seconds",
+    "Remote dataset fetch latency by source and outcome.",
+    ["source", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter("landos_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+MONGO_CHECKOUT_WAIT = Histogram(
+    "landos_mongo_checkout_wait_seconds", "Wait for a pooled Mongo connection.", ["pool"], buckets=WAIT_BUCKETS
+)
+MONGO_CHECKOUT_FAILURES = Counter("landos_mongo_checkout_failures_total", "Failed Mongo connection checkouts.", ["pool"])
+MONGO_CONNECTIONS_IN_USE = Gauge(
+    "landos_mongo_connections_in_use", "Checked-out Mongo connections.", ["pool"], multiprocess_mode="livesum"
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "landos_mongo_command_duration_seconds", "Mongo command latency by command and namespace.",
+    ["command", "namespace"], buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "landos_mongo_command_failures_total", "Failed Mongo commands by command and namespace.", ["command", "namespace"]
+)
+MONGO_REPLY_BYTES = Histogram(
+    "landos_mongo_reply_bytes", "BSON size of sampled Mongo replies.", ["command", "namespace"], buckets=BYTE_BUCKETS
+)
+LOOP_LAG = Histogram("landos_event_loop_lag_seconds", "Event-loop scheduling lag.", buckets=LAG_BUCKETS)
+LOOP_BLOCKS = Counter(
+    "landos_event_loop_blocks_total", "Event-loop stalls over the block threshold by call site.", ["site"]
+)
+STARTUP_STEP_DURATION = Gauge(
+    "landos_startup_step_seconds", "Duration of the last run of each startup step.", ["step"], multiprocess_mode="max"
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def track_fetch(source: str):
+    """Time a remote fetch; the outcome is "error" when the block raises."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        FETCH_LATENCY.labels(source, outcome).observe(time.perf_counter() - start)
+
+
+def etl_run(layer: str):
+    """
+    Count and time every call of a layer ETL coroutine. The outcome is the
+    "outcome" key of the returned dict (default "ok"), or "error" when it raises.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = result.get("outcome", "ok") if isinstance(result, dict) else "ok"
+                return result
+            finally:
+                ETL_RUNS.labels(layer, outcome).inc()
+                ETL_DURATION.labels(layer).observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class LoopLagSampler:
+    """Observes how late a periodic wakeup fires on the running loop."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per method, route template and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # Unmatched paths share one label so scanners cannot grow the series count.
+            REQUEST_LATENCY.labels(scope["method"], _route_template(scope), str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+def render() -> tuple:
+    """Exposition body and content type, aggregated across workers in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop a stopped worker's live gauges (call from the process manager's child_exit hook)."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
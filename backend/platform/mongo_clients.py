@@ -0,0 +1,192 @@
+"""
+Shared Motor client registry.
+
+Engines acquire their client here instead of building their own, so engines
+pointing at the same server with the same pool settings share one connection
+pool. Settings come from the environment: MONGO_<SETTING> applies to every
+engine and <ENGINE>_MONGO_<SETTING> overrides it for one engine (for example
+ANALYTICS_MONGO_MAX_POOL_SIZE).
+
+Pool settings (one pool per distinct URL + settings):
+- MAX_POOL_SIZE, MIN_POOL_SIZE, MAX_IDLE_TIME_MS, COMPRESSORS (comma-separated)
+Per-engine database settings (applied on the shared pool):
+- READ_PREFERENCE (primary, primaryPreferred, secondary, secondaryPreferred, nearest)
+- WRITE_CONCERN (w value: a number or "majority")
+
+Connection checkout waits are recorded per pool, exposed by stats() and
+exported as landos_mongo_* metrics. Every client also reports its commands to
+mongo_commands.monitor.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, WriteConcern
+from pymongo.monitoring import ConnectionPoolListener
+
+from backend.platform import metrics, mongo_commands
+
+logger = logging.getLogger("landos.platform")
+
+POOL_SETTINGS = {
+    "MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MIN_POOL_SIZE": ("minPoolSize", int),
+    "MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int),
+    "COMPRESSORS": ("compressors", str),
+}
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+# Options every client is built with.
+BASE_OPTIONS = {"uuidRepresentation": "standard", "serverSelectionTimeoutMS": 2000}
+
+
+def _setting(engine: str, name: str) -> Optional[str]:
+    return os.getenv(f"{engine.upper()}_MONGO_{name}", os.getenv(f"MONGO_{name}"))
+
+
+def pool_options(engine: str) -> dict:
+    """Pool options for an engine from MONGO_* / <ENGINE>_MONGO_* variables."""
+    options = {}
+    for name, (option, cast) in POOL_SETTINGS.items():
+        raw = _setting(engine, name)
+        if raw:
+            options[option] = cast(raw)
+    return options
+
+
+def database_options(engine: str) -> dict:
+    """Read preference / write concern overrides for an engine's database handle."""
+    options = {}
+    read_preference = _setting(engine, "READ_PREFERENCE")
+    if read_preference:
+        if read_preference not in READ_PREFERENCES:
+            raise ValueError(f"unknown read preference '{read_preference}'")
+        options["read_preference"] = READ_PREFERENCES[read_preference]
+    write_concern = _setting(engine, "WRITE_CONCERN")
+    if write_concern:
+        options["write_concern"] = WriteConcern(w=int(write_concern) if write_concern.isdigit() else write_concern)
+    return options
+
+
+class PoolStats(ConnectionPoolListener):
+    """Checkout counts and wait times of one pool (events arrive from driver threads)."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use = 0
+
+    def connection_checked_out(self, event):
+        wait = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        metrics.MONGO_CHECKOUT_WAIT.labels(self.label).observe(wait)
+        metrics.MONGO_CONNECTIONS_IN_USE.labels(self.label).inc()
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+        metrics.MONGO_CONNECTIONS_IN_USE.labels(self.label).dec()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failed += 1
+        metrics.MONGO_CHECKOUT_FAILURES.labels(self.label).inc()
+
+    # Remaining pool events are not needed.
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.failed,
+                "in_use": self.in_use,
+                "wait_ms_total": round(self.wait_total * 1000, 3),
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "wait_ms_mean": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+
+
+# (url, sorted pool options) -> {"client", "stats", "engines", "refs"}
+_pools: Dict[tuple, dict] = {}
+
+
+def _key(url: str, options: dict) -> tuple:
+    return url, tuple(sorted(options.items()))
+
+
+def acquire(url: str, engine: str) -> AsyncIOMotorClient:
+    """Shared client for url with the engine's pool settings (created on first use)."""
+    options = pool_options(engine)
+    key = _key(url, options)
+    pool = _pools.get(key)
+    if pool is None:
+        stats = PoolStats(_redact(url))
+        client = AsyncIOMotorClient(url, event_listeners=[stats, mongo_commands.monitor], **BASE_OPTIONS, **options)
+        pool = _pools[key] = {"client": client, "stats": stats, "engines": set(), "refs": 0}
+        logger.info("Mongo pool created for %s (%s) by %s", _redact(url), options or "defaults", engine)
+    pool["engines"].add(engine)
+    pool["refs"] += 1
+    return pool["client"]
+
+
+def release(client) -> None:
+    """Drop one reference to a shared client; it is closed when nobody holds it."""
+    for key, pool in list(_pools.items()):
+        if pool["client"] is client:
+            pool["refs"] -= 1
+            if pool["refs"] <= 0:
+                client.close()
+                del _pools[key]
+                logger.info("Mongo pool closed for %s", _redact(key[0]))
+            return
+
+
+def database(client, name: str, engine: str):
+    """Database handle with the engine's read preference and write concern."""
+    options = database_options(engine)
+    return client.get_database(name, **options) if options else client[name]
+
+
+def _redact(url: str) -> str:
+    parts = urlsplit(url)
+    host = parts.netloc.rsplit("@", 1)[-1]
+    return f"{parts.scheme}://{host}{parts.path}" if parts.scheme else url
+
+
+def stats() -> list:
+    """Per-pool checkout statistics (credentials stripped from URLs)."""
+    return [
+        {
+            "url": _redact(key[0]),
+            "options": dict(key[1]),
+            "engines": sorted(pool["engines"]),
+            "refs": pool["refs"],
+            **pool["stats"].snapshot(),
+        }
+        for key, pool in _pools.items()
+    ]
@@ -0,0 +1,171 @@
+"""
+Mongo command monitoring.
+
+One CommandListener (monitor) is registered on every client built by
+mongo_clients, so all engines report through it. Per command name and
+namespace (db.collection) it keeps count, failures and latency, exported as
+landos_mongo_command_duration_seconds and summarised by snapshot() for the
+admin debug route.
+
+Reply sizes need the reply re-encoded to BSON, which costs about as much as
+decoding it did, so they are measured for a sample of replies
+(MONGO_COMMAND_SIZE_SAMPLE, default 0.05) and for every slow command.
+
+Commands slower than MONGO_SLOW_COMMAND_MS (default 100) are logged with the
+shape of their filter: field names and operators with the values replaced by
+"?", e.g. {"geometry": {"$geoIntersects": {"$geometry": "?"}}}. The most recent
+ones are kept for the debug route.
+"""
+
+import logging
+import os
+import random
+import threading
+from collections import deque
+from typing import Dict
+
+import bson
+from pymongo.monitoring import CommandListener
+
+from backend.platform import metrics
+
+logger = logging.getLogger("landos.platform")
+
+SLOW_COMMAND_MS = float(os.getenv("MONGO_SLOW_COMMAND_MS", "100"))
+SIZE_SAMPLE = float(os.getenv("MONGO_COMMAND_SIZE_SAMPLE", "0.05"))
+RECENT_SLOW = 50
+# Handshake / session housekeeping, not application work.
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "killCursors"}
+# Where each command keeps its filter.
+FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query", "findAndModify": "query"}
+
+
+def _shape(value):
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], (dict, list, tuple)):
+        return [_shape(value[0])]
+    return "?"
+
+
+def filter_shape(command_name: str, command: dict):
+    """The query structure of a command without its values (None when it has no filter)."""
+    if command_name in FILTER_FIELDS:
+        return _shape(command.get(FILTER_FIELDS[command_name]) or {})
+    if command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or []
+        if not statements:
+            return None
+        shape = {"q": _shape(statements[0].get("q") or {}), "n": len(statements)}
+        update = statements[0].get("u")
+        if isinstance(update, dict):
+            # Operators and the fields they touch, e.g. {"$set": ["soil_data", "etl_layers.soil"]}.
+            shape["u"] = {op: sorted(fields) if isinstance(fields, dict) else "?" for op, fields in update.items()}
+        return shape
+    if command_name == "aggregate":
+        return [
+            {name: _shape(body)} if name == "$match" else name
+            for stage in command.get("pipeline") or [] for name, body in stage.items()
+        ]
+    if command_name == "insert":
+        return {"documents": len(command.get("documents") or [])}
+    return None
+
+
+def namespace(database: str, command_name: str, command: dict) -> str:
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return f"{database}.{target}" if isinstance(target, str) else database
+
+
+class CommandStats(CommandListener):
+    """Latency and reply sizes per (command, namespace); events arrive from driver threads."""
+
+    def __init__(self, slow_ms: float = SLOW_COMMAND_MS, size_sample: float = SIZE_SAMPLE):
+        self.slow_ms = slow_ms
+        self.size_sample = size_sample
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, tuple] = {}
+        self.totals: Dict[tuple, dict] = {}
+        self.slow = deque(maxlen=RECENT_SLOW)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        ns = namespace(event.database_name, event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (ns, event.command)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply, failed=False)
+
+    def failed(self, event):
+        self._finish(event, None, failed=True)
+
+    def _finish(self, event, reply, failed: bool) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        ns, command = pending
+        name = event.command_name
+        ms = event.duration_micros / 1000
+        slow = ms >= self.slow_ms
+        size = None
+        if reply is not None and (slow or random.random() < self.size_sample):
+            size = len(bson.encode(reply))
+        with self._lock:
+            entry = self.totals.setdefault(
+                (name, ns),
+                {"count": 0, "failures": 0, "slow": 0, "ms_total": 0.0, "ms_max": 0.0, "sized": 0, "reply_bytes_total": 0,
+                 "reply_bytes_max": 0},
+            )
+            entry["count"] += 1
+            entry["failures"] += failed
+            entry["slow"] += slow
+            entry["ms_total"] += ms
+            entry["ms_max"] = max(entry["ms_max"], ms)
+            if size is not None:
+                entry["sized"] += 1
+                entry["reply_bytes_total"] += size
+                entry["reply_bytes_max"] = max(entry["reply_bytes_max"], size)
+        metrics.MONGO_COMMAND_LATENCY.labels(name, ns).observe(ms / 1000)
+        if failed:
+            metrics.MONGO_COMMAND_FAILURES.labels(name, ns).inc()
+        if size is not None:
+            metrics.MONGO_REPLY_BYTES.labels(name, ns).observe(size)
+        if slow:
+            shape = filter_shape(name, command)
+            self.slow.append({"command": name, "namespace": ns, "ms": round(ms, 1), "reply_bytes": size,
+                              "filter": shape, "failed": failed})
+            logger.warning("Slow Mongo %s on %s: %.1f ms, reply %s bytes, filter %s", name, ns, ms, size, shape)
+
+    def snapshot(self) -> dict:
+        """Aggregates per (command, namespace), slowest total first, plus the recent slow commands."""
+        with self._lock:
+            rows = [
+                {
+                    "command": name,
+                    "namespace": ns,
+                    "count": entry["count"],
+                    "failures": entry["failures"],
+                    "slow": entry["slow"],
+                    "ms_total": round(entry["ms_total"], 1),
+                    "ms_mean": round(entry["ms_total"] / entry["count"], 2),
+                    "ms_max": round(entry["ms_max"], 1),
+                    "reply_bytes_mean": entry["reply_bytes_total"] // entry["sized"] if entry["sized"] else None,
+                    "reply_bytes_max": entry["reply_bytes_max"] if entry["sized"] else None,
+                }
+                for (name, ns), entry in self.totals.items()
+            ]
+            recent = list(self.slow)
+        rows.sort(key=lambda row: row["ms_total"], reverse=True)
+        return {"slow_ms": self.slow_ms, "size_sample": self.size_sample, "commands": rows, "recent_slow": recent}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.totals.clear()
+            self.slow.clear()
+
+
+# Shared by every client mongo_clients creates.
+monitor = CommandStats()
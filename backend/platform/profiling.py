@@ -0,0 +1,217 @@
+"""
+On-demand request profiling (opt-in).
+
+With PLATFORM_PROFILING=1 an admin can profile one request (any route;
+typically get_grid or project creation) by sending `X-Profile: 1` or adding
+`?profile=1`. The whole request, including response serialization, then runs
+under a sampling profiler and tracemalloc:
+
+- a sampler thread records the event-loop thread's stack every
+  PROFILE_INTERVAL seconds as folded stacks ("root;...;leaf" -> samples), the
+  input format of flamegraph.pl and speedscope. Concurrent requests of the
+  worker run on the same thread and appear in the samples too.
+- tracemalloc reports the current and peak traced memory and the lines that
+  allocated the most. It slows every allocation in the process while it runs.
+
+The result is stored in the platform profiles collection (kept for
+PROFILE_RETENTION seconds), its id is returned in the X-Profile-Id response
+header, and the admin routes under /api/platform/admin/profiles serve it.
+One request per worker is profiled at a time; a second one runs normally and
+gets X-Profile: busy.
+
+When PLATFORM_PROFILING is off the middleware is not installed. When it is
+on, requests that do not ask for a profile cost one header scan.
+"""
+
+import logging
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from urllib.parse import parse_qs
+
+from backend.platform import indexes
+
+logger = logging.getLogger("landos.platform")
+
+PROFILE_COLLECTION = "profiles"
+PROFILE_RETENTION = 7 * 24 * 3600
+PROFILE_INTERVAL = 0.005
+MAX_DEPTH = 128
+MAX_STACKS = 5000
+TOP_ALLOCATIONS = 15
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+
+indexes.declare(
+    "platform",
+    {
+        PROFILE_COLLECTION: [
+            ([("profile_id", 1)], {"name": "profile_id", "unique": True}),
+            ([("created_at", 1)], {"name": "profile_expiry", "expireAfterSeconds": PROFILE_RETENTION}),
+        ],
+    },
+)
+
+# One profile per worker at a time: tracemalloc is process-wide.
+_busy = threading.Lock()
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(str(BACKEND_ROOT)):
+        filename = filename[len(str(BACKEND_ROOT)) + 1:]
+    elif "site-packages/" in filename:
+        filename = filename.split("site-packages/", 1)[1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def fold(frame) -> str:
+    """The stack ending at frame as one folded line, root first."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """Samples one thread's stack from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join(timeout=1)
+
+
+def _memory_report(started_tracing: bool) -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    )
+    if started_tracing:
+        tracemalloc.stop()
+    top = [
+        {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    ]
+    return {"current_bytes": current, "peak_bytes": peak, "top": top}
+
+
+def wants_profile(scope) -> bool:
+    if any(name == b"x-profile" and value not in (b"", b"0") for name, value in scope.get("headers", ())):
+        return True
+    query = scope.get("query_string", b"")
+    if b"profile=" not in query:
+        return False
+    return parse_qs(query.decode("latin-1")).get("profile", ["0"])[0] not in ("", "0")
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that ask for it, for admins only.
+    admin_user(authorization) returns the admin's username or None; store(doc)
+    saves a finished profile.
+    """
+
+    def __init__(self, app, admin_user: Callable[[Optional[str]], Awaitable[Optional[str]]],
+                 store: Callable[[dict], Awaitable[None]]):
+        self.app = app
+        self.admin_user = admin_user
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope):
+            return await self.app(scope, receive, send)
+        username = await self.admin_user(_header(scope, b"authorization"))
+        if username is None:
+            return await self.app(scope, receive, send)
+        if not _busy.acquire(blocking=False):
+            return await self.app(scope, receive, _with_headers(send, [(b"x-profile", b"busy")]))
+        try:
+            await self._profile(scope, receive, send, username)
+        finally:
+            _busy.release()
+
+    async def _profile(self, scope, receive, send, username: str):
+        profile_id = secrets.token_hex(8)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        sampler = Sampler(threading.get_ident())
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _with_headers(send_wrapper, [(b"x-profile-id", profile_id.encode())]))
+        finally:
+            duration = time.perf_counter() - start
+            sampler.stop()
+            memory = _memory_report(started_tracing)
+            doc = {
+                "profile_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status_code,
+                "username": username,
+                "created_at": datetime.now(timezone.utc),
+                "duration_ms": round(duration * 1000, 2),
+                "interval_ms": sampler.interval * 1000,
+                "samples": sum(sampler.stacks.values()),
+                # Folded stacks as [stack, samples] pairs (stacks contain dots, so not as keys).
+                "stacks": [[stack, count] for stack, count in sampler.stacks.most_common(MAX_STACKS)],
+                "memory": memory,
+            }
+            try:
+                await self.store(doc)
+                logger.info("Profiled %s %s in %.1f ms as %s", doc["method"], doc["path"], doc["duration_ms"], profile_id)
+            except Exception:
+                logger.exception("Storing profile %s failed", profile_id)
+
+
+def _with_headers(send, headers: list):
+    async def wrapper(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": [*message.get("headers", []), *headers]}
+        await send(message)
+    return wrapper
+
+
+def folded(doc: dict) -> str:
+    """A stored profile as folded-stack text ("stack samples" per line)."""
+    return "".join(f"{stack} {count}\n" for stack, count in doc.get("stacks") or [])
@@ -0,0 +1,175 @@
+"""
+Session store with a per-worker cache.
+
+Sessions carry an expires_at and are removed by a TTL index once it passes.
+Validated sessions are kept in an in-process LRU cache for up to
+session_cache_ttl seconds (never past their own expiry), so authenticated
+requests normally skip the sessions lookup.
+
+Logout deletes the session and records the token in session_revocations.
+Every worker polls that collection and evicts revoked tokens from its cache,
+so a logout reaches the other uvicorn workers within one poll interval.
+Revocation records expire on their own once no cache can still hold the token.
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from backend.platform import indexes, metrics
+from backend.platform.config import PlatformConfig
+
+logger = logging.getLogger("landos.platform")
+
+SESSION_COLLECTION = "sessions"
+REVOCATION_COLLECTION = "session_revocations"
+# At least twice session_cache_ttl (SessionStore refuses longer cache TTLs), so every
+# worker has evicted the token by the time its revocation expires.
+REVOCATION_RETENTION = 3600
+# Revocations are re-read this far back so clock drift between workers cannot hide one.
+CLOCK_SKEW = timedelta(seconds=5)
+
+indexes.declare(
+    "platform",
+    {
+        SESSION_COLLECTION: [([("expires_at", 1)], {"name": "session_expiry", "expireAfterSeconds": 0})],
+        REVOCATION_COLLECTION: [
+            ([("revoked_at", 1)], {"name": "revocation_expiry", "expireAfterSeconds": REVOCATION_RETENTION}),
+        ],
+    },
+)
+
+
+class SessionCache:
+    """LRU of validated sessions with a per-entry deadline (monotonic seconds)."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[token]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(token)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, session: dict, remaining: float) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        self._entries[session["token"]] = (time.monotonic() + min(self.ttl, remaining), session)
+        self._entries.move_to_end(session["token"])
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, token: str) -> None:
+        if self._entries.pop(token, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SessionStore:
+    def __init__(self, database, config: PlatformConfig):
+        if config.session_cache_ttl * 2 > REVOCATION_RETENTION:
+            raise ValueError(
+                f"session_cache_ttl ({config.session_cache_ttl}s) must be at most {REVOCATION_RETENTION // 2}s: "
+                f"revocations are kept for {REVOCATION_RETENTION}s"
+            )
+        self.database = database
+        self.config = config
+        self.cache = SessionCache(config.session_cache_size, config.session_cache_ttl)
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _db(self):
+        return self.database.get_db()
+
+    async def create(self, username: str) -> dict:
+        now = datetime.utcnow()
+        session = {
+            "username": username,
+            "token": secrets.token_hex(16),
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.config.session_ttl),
+        }
+        await self._db()[SESSION_COLLECTION].insert_one(dict(session))
+        return session
+
+    async def get(self, token: str) -> Optional[dict]:
+        """Valid session for token (from cache when possible), or None."""
+        session = self.cache.get(token)
+        metrics.record_cache("sessions", session is not None)
+        if session is not None:
+            return session
+        session = await self._db()[SESSION_COLLECTION].find_one({"token": token}, {"_id": 0})
+        if not session:
+            return None
+        remaining = (session["expires_at"] - datetime.utcnow()).total_seconds() if session.get("expires_at") else 0
+        if remaining <= 0:
+            # The TTL monitor runs about once a minute; do not honour an expired session meanwhile.
+            return None
+        self.cache.put(session, remaining)
+        return session
+
+    async def revoke(self, token: str) -> None:
+        """Delete the session and tell the other workers to drop it from their caches."""
+        self.cache.invalidate(token)
+        await self._db()[SESSION_COLLECTION].delete_one({"token": token})
+        await self._db()[REVOCATION_COLLECTION].insert_one({"token": token, "revoked_at": datetime.utcnow()})
+
+    async def sync_revocations(self) -> int:
+        """Evict tokens revoked since the last sync; returns how many were seen."""
+        query = {"revoked_at": {"$gte": self._since - CLOCK_SKEW}} if self._since else {}
+        seen = 0
+        async for doc in self._db()[REVOCATION_COLLECTION].find(query, {"_id": 0}).sort("revoked_at", 1):
+            self.cache.invalidate(doc["token"])
+            self._since = doc["revoked_at"]
+            seen += 1
+        return seen
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.config.session_revocation_poll)
+            try:
+                await self.sync_revocations()
+            except Exception:
+                logger.exception("Session revocation poll failed")
+
+    async def start(self) -> None:
+        """Backfill expiry on legacy sessions and start the revocation poller."""
+        now = datetime.utcnow()
+        migrated = await self._db()[SESSION_COLLECTION].update_many(
+            {"expires_at": {"$exists": False}},
+            {"$set": {"expires_at": now + timedelta(seconds=self.config.session_ttl)}},
+        )
+        if migrated.modified_count:
+            logger.info("Session expiry set on %s legacy sessions", migrated.modified_count)
+        self._since = now
+        self.cache.clear()
+        if self.config.session_cache_ttl > 0 and self.config.session_revocation_poll > 0:
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
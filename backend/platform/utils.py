@@ -3,9 +3,11 @@ Platform utilities and validation helpers.
 """
 
 import asyncio
+import base64
+import json
 import re
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple, Union
 import hashlib
 
 # Analytics services will be used for area/region calculations.
@@ -133,3 +135,74 @@ def generate_project_name(geometry: dict, provided_name: str | None = None, now:
     now = now or datetime.now(timezone.utc)
     ts = now.strftime("%Y%m%dT%H%M%SZ")
     return f"{country}-{subdivision}-{ts}"
+
+
+# --- Project listings ---
+
+LISTING_FIELDS = {
+    "project_id", "username", "name", "geometry", "country", "country_name", "subdivision",
+    "subdivision_name", "area_hectares", "status", "created",
+}
+# Served from the analytics project summary rather than the project document.
+SUMMARY_FIELDS = {"summary", "bbox"}
+LISTING_SORT = [("created", 1), ("project_id", 1)]
+LISTING_MAX_LIMIT = 500
+
+
+def parse_listing_fields(fields: Union[str, List[str], None]) -> Tuple[Dict[str, int], set]:
+    """
+    Turn a comma-separated fields= value (or a list of names, from a JSON body)
+    into a Mongo projection and the set of summary-backed fields requested.
+    None selects every listing field plus the summary.
+    """
+    if fields is None:
+        requested = LISTING_FIELDS | {"summary"}
+    else:
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        elif not isinstance(fields, list) or not all(isinstance(name, str) for name in fields):
+            raise ValueError("fields must be a comma-separated string or a list of field names")
+        requested = {name.strip() for name in fields if name.strip()}
+        unknown = requested - LISTING_FIELDS - SUMMARY_FIELDS
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    projection = {"_id": 0, "project_id": 1, "created": 1}
+    projection.update({name: 1 for name in requested & LISTING_FIELDS})
+    return projection, requested
+
+
+def validate_listing_limit(limit: Optional[int]) -> Optional[int]:
+    if limit is None:
+        return None
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= LISTING_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {LISTING_MAX_LIMIT}")
+    return limit
+
+
+def encode_cursor(project: dict) -> str:
+    """Opaque keyset cursor positioned after the given project."""
+    raw = json.dumps([project.get("created"), project.get("project_id")]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[Optional[str], str]:
+    try:
+        created, project_id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(project_id, str) or not (created is None or isinstance(created, str)):
+        raise ValueError("invalid cursor")
+    return created, project_id
+
+
+def listing_filter(username: str, cursor: Optional[str] = None) -> dict:
+    """Projects of a user that sort after the cursor on (created, project_id)."""
+    filt: dict = {"username": username}
+    if cursor:
+        created, project_id = decode_cursor(cursor)
+        if created is None:
+            # Missing created sorts first; then come all projects that have one.
+            filt["$or"] = [{"created": None, "project_id": {"$gt": project_id}}, {"created": {"$ne": None}}]
+        else:
+            filt["$or"] = [{"created": {"$gt": created}}, {"created": created, "project_id": {"$gt": project_id}}]
+    return filt
@@ -1,6 +1,6 @@
 """Analytics engine router and initialization."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request, status
 
 from backend.services.analytics import api, terrain
 from backend.services.analytics.analytics_db_connection import analytics_db
@@ -9,6 +9,9 @@ compute_area_hectares = api.compute_area_hectares
 resolve_region = api.resolve_region
 validate_geometry = api.validate_geometry
 trigger_etl = api.trigger_etl
+render_tile = api.render_tile
+ingest_field_data = api.ingest_field_data
+get_history = api.get_history
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
@@ -18,13 +21,144 @@ if api.EXTERNAL_SERVICES.get("ping"):
     async def ping():
         return await api.ping()
 
+if api.EXTERNAL_SERVICES.get("raster_query"):
+    @router.post("/projects/{project_id}/query")
+    async def raster_query(project_id: str, payload: dict):
+        """
+        Evaluate a raster algebra expression over the project's layers.
+        Body: {"expression": str, "output": "auto"|"mask"|"raster", "clip": bool}
+        """
+        clip = payload.get("clip", True)
+        if not isinstance(clip, bool):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="clip must be a boolean")
+        try:
+            return await api.raster_query(
+                project_id,
+                payload.get("expression"),
+                output=payload.get("output") or "auto",
+                clip=clip,
+            )
+        except LookupError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+if api.EXTERNAL_SERVICES.get("extract_grid"):
+    @router.post("/projects/{project_id}/grid")
+    async def extract_grid(project_id: str, payload: dict):
+        """
+        Return the requested layers for a sub-polygon of the project as a windowed matrix.
+        Body: {"geometry": GeoJSON, "layers": ["dem", "soil", "land_cover"]}
+        """
+        try:
+            return await api.extract_grid(project_id, payload.get("geometry"), payload.get("layers"))
+        except LookupError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+if api.EXTERNAL_SERVICES.get("diff"):
+    @router.get("/projects/{project_id}/diff")
+    async def grid_diff(project_id: str, layer: str, since: str):
+        """
+        Return the changes to a layer since a version hash (or ISO timestamp) held by the client.
+        """
+        try:
+            return await api.get_diff(project_id, layer, since)
+        except LookupError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+if api.EXTERNAL_SERVICES.get("update"):
+    @router.post("/projects/{project_id}/update")
+    async def update(project_id: str, request: Request, flush: bool = False):
+        """
+        Load batched time-stamped property values for a project.
+        Body: JSON (records or {"properties": [...]}), NDJSON (application/x-ndjson)
+        or Arrow IPC stream (application/vnd.apache.arrow.stream).
+        Readings are buffered and written behind; flush=true writes them before responding.
+        """
+        content_type = (request.headers.get("content-type") or "application/json").split(";")[0].strip()
+        try:
+            if content_type in api.NDJSON_TYPES:
+                return await api.ingest_field_data_ndjson(project_id, request.stream(), flush=flush)
+            if content_type in api.ARROW_TYPES:
+                return await api.ingest_field_data_arrow(project_id, await request.body(), flush=flush)
+            return await api.ingest_field_data(project_id, await request.body(), flush=flush)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+if api.EXTERNAL_SERVICES.get("history"):
+    @router.get("/projects/{project_id}/history")
+    async def history(project_id: str, properties: str, start: str | None = None, end: str | None = None,
+                      resolution: str | None = None, max_points: int | None = None):
+        """
+        Return the value history of comma-separated properties between start and end (ISO).
+        resolution ("raw", "hour", "day" or seconds) or max_points select the raw or rollup tier.
+        """
+        try:
+            return await api.get_history(project_id, properties.split(","), start, end, resolution, max_points)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+if api.EXTERNAL_SERVICES.get("interpolate"):
+    @router.post("/projects/{project_id}/observations")
+    async def observations(project_id: str, payload: dict):
+        """
+        Interpolate point observations onto the project grid.
+        Body: {"observations": [{"property", "time", "lon", "lat", "value"}], "method": "idw"|"nearest"|"linear",
+        "max_distance": cells}
+        """
+        try:
+            return await api.interpolate_observations(
+                project_id,
+                payload.get("observations"),
+                method=payload.get("method") or "idw",
+                max_distance=payload.get("max_distance"),
+            )
+        except LookupError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    @router.get("/projects/{project_id}/observations/{prop}")
+    async def observation_layer(project_id: str, prop: str, at: str | None = None):
+        """
+        Return the interpolated raster of a property for the window containing at (latest by default).
+        """
+        try:
+            return await api.get_observation_layer(project_id, prop, at)
+        except LookupError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
 
 async def initialize():
     """
-    Initialize analytics engine.
+    Initialize analytics engine (connection and indexes; see load_datasets).
+    """
+    return await api.initialize(datasets=False)
+
+
+async def load_datasets():
+    """
+    Load the reference datasets; the platform runs this in the background.
+    """
+    return await api.load_datasets()
+
+
+async def shutdown():
+    """
+    Flush buffered writes before the engine stops.
     """
-    return await api.initialize()
+    return await api.shutdown()
 
 # Export DB for internal callers (platform grid endpoint)
 db = analytics_db
 terrain = terrain
+overviews = api.overviews
+grid = api.grid
+tiles = api.tiles
+summaries = api.summaries
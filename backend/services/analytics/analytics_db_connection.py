@@ -5,6 +5,7 @@ Connection handling for the analytics MongoDB database.
 from motor.motor_asyncio import AsyncIOMotorClient
 import logging
 
+from backend.platform import mongo_clients
 from backend.services.analytics import config
 
 logger = logging.getLogger("landos.analytics")
@@ -17,22 +18,21 @@ class AnalyticsDatabase:
         self.client: AsyncIOMotorClient | None = None
 
     def connect(self):
-        self.client = AsyncIOMotorClient(
-            self.mongo_url,
-            uuidRepresentation="standard",
-            serverSelectionTimeoutMS=2000,
-        )
+        if self.client is not None:
+            return self
+        # Shared with the platform engine when both point at the same server.
+        self.client = mongo_clients.acquire(self.mongo_url, "analytics")
         logger.info("Connected analytics Mongo @ %s (db=%s)", self.mongo_url, self.db_name)
         return self
 
     def get_db(self):
         if not self.client:
             raise RuntimeError("Analytics DB not connected")
-        return self.client[self.db_name]
+        return mongo_clients.database(self.client, self.db_name, "analytics")
 
     def close(self):
         if self.client:
-            self.client.close()
+            mongo_clients.release(self.client)
             self.client = None
             logger.info("Closed analytics Mongo connection")
 
@@ -5,13 +5,13 @@ Internal callers and external routes should use these functions. External servic
 are determined by config.EXTERNAL_SERVICES.
 """
 
+import asyncio
 import os
 import zipfile
 from datetime import datetime
 from pathlib import Path
 import logging
 import httpx
-import shapefile
 from shapely.geometry import shape, mapping, Polygon, MultiPolygon
 
 from backend.services.analytics import config
@@ -20,8 +20,21 @@ from backend.services.analytics.api import ping as ping_service
 from backend.services.analytics.api import calc_area
 from backend.services.analytics.api import determine_region
 from backend.services.analytics.api import trigger_etl as etl_service
+from backend.services.analytics.api import algebra
+from backend.services.analytics.api import overviews
+from backend.services.analytics.api import tiles
+from backend.services.analytics.api import grid
+from backend.services.analytics.api import diff
+from backend.services.analytics.api import timeseries
+from backend.services.analytics.api import update as update_service
+from backend.services.analytics.api import history as history_service
+from backend.services.analytics.api import write_buffer
+from backend.services.analytics.api import interpolate
+from backend.services.analytics.api import summaries
 from backend.services.analytics import terrain
 from backend.services.analytics import scheduler
+from backend.services.analytics import readiness
+from backend.platform import indexes
 from pymongo.errors import BulkWriteError
 
 EXTERNAL_SERVICES = getattr(config, "EXTERNAL_SERVICES", {})
@@ -31,6 +44,40 @@ logger = logging.getLogger("landos.analytics")
 ping = ping_service.ping
 resolve_region = determine_region.resolve_region
 trigger_etl = etl_service.trigger_etl
+raster_query = algebra.run_query
+render_tile = tiles.render_tile
+extract_grid = grid.extract_grid
+get_diff = diff.get_diff
+ingest_field_data = update_service.ingest
+ingest_field_data_ndjson = update_service.ingest_ndjson
+ingest_field_data_arrow = update_service.ingest_arrow
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonlines"}
+ARROW_TYPES = {"application/vnd.apache.arrow.stream"}
+get_history = history_service.get_history
+interpolate_observations = interpolate.interpolate_observations
+get_observation_layer = interpolate.get_observation_layer
+
+indexes.declare(
+    "analytics",
+    {
+        "terrain": [([("project_id", 1)], {"unique": True})],
+        "regions": [([("geometry", "2dsphere")], {})],
+        "subdivisions": [([("geometry", "2dsphere")], {})],
+        "layer_versions": [
+            ([("project_id", 1), ("layer", 1), ("created_at", -1)], {}),
+            ([("project_id", 1), ("layer", 1), ("version", 1)], {}),
+        ],
+        **timeseries.INDEXES,
+        **overviews.INDEXES,
+        **interpolate.INDEXES,
+        **summaries.INDEXES,
+    },
+    probes=[
+        ("terrain", {"project_id": ""}),
+        ("layer_versions", {"project_id": "", "layer": "dem"}),
+        (summaries.SUMMARY_COLLECTION, {"project_id": {"$in": [""]}}),
+    ],
+)
 
 
 async def compute_area_hectares(geometry: dict) -> float:
@@ -38,7 +85,6 @@ async def compute_area_hectares(geometry: dict) -> float:
     return await calc_area.compute_area_hectares(cleaned)
 
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def validate_geometry(geometry: dict) -> dict:
@@ -78,6 +124,7 @@ async def _download_if_missing(url: str, dest: Path):
         async with httpx.AsyncClient() as client:
             resp = await client.get(url, timeout=30)
             resp.raise_for_status()
+            dest.parent.mkdir(parents=True, exist_ok=True)
             dest.write_bytes(resp.content)
         logger.info("Downloaded %s to %s", url, dest)
         return dest
@@ -93,6 +140,8 @@ def _extract_zip(zip_path: Path, target_dir: Path) -> Path:
 
 
 def _load_shapefile_records(shp_dir: Path):
+    import shapefile  # pyshp; only needed when datasets are (re)loaded
+
     shp_files = list(shp_dir.glob("*.shp"))
     if not shp_files:
         raise FileNotFoundError(f"No .shp file found in {shp_dir}")
@@ -110,6 +159,11 @@ def _load_shapefile_records(shp_dir: Path):
         yield attrs, mapping(geom)
 
 
+def _read_zipped_shapefile(zip_path: Path, extract_dir: Path) -> list:
+    _extract_zip(zip_path, extract_dir)
+    return list(_load_shapefile_records(extract_dir))
+
+
 async def _ensure_countries(db):
     count = await db.regions.count_documents({})
     if count > 0:
@@ -118,9 +172,9 @@ async def _ensure_countries(db):
     zip_path = DATA_DIR / "countries.zip"
     await _download_if_missing(config.COUNTRIES_URL, zip_path)
     docs = []
-    extract_dir = DATA_DIR / "countries"
-    _extract_zip(zip_path, extract_dir)
-    for attrs, geom in _load_shapefile_records(extract_dir):
+    # Unzipping and parsing run in a thread so the loop keeps serving while datasets load.
+    records = await asyncio.to_thread(_read_zipped_shapefile, zip_path, DATA_DIR / "countries")
+    for attrs, geom in records:
         code = attrs.get("ADM0_A3") or attrs.get("ISO_A3") or attrs.get("ISO_A3_EH") or "UNK"
         name = attrs.get("NAME") or attrs.get("ADMIN") or "Unknown"
         docs.append(
@@ -165,9 +219,8 @@ async def _ensure_subdivisions(db):
         zip_path = DATA_DIR / f"subdivisions_{country_code}.zip"
         await _download_if_missing(url, zip_path)
         docs = []
-        extract_dir = DATA_DIR / f"subdivisions_{country_code}"
-        _extract_zip(zip_path, extract_dir)
-        for attrs, geom in _load_shapefile_records(extract_dir):
+        records = await asyncio.to_thread(_read_zipped_shapefile, zip_path, DATA_DIR / f"subdivisions_{country_code}")
+        for attrs, geom in records:
             code = attrs.get("GEOID") or attrs.get("AFFGEOID") or attrs.get("ID") or "UNK"
             name = attrs.get("NAME") or attrs.get("NAMELSAD") or "Unknown"
             docs.append(
@@ -204,9 +257,10 @@ async def _ensure_subdivisions(db):
         logger.info("Subdivision dataset metadata registered for %s", country_code)
 
 
-async def initialize():
+async def initialize(datasets: bool = True):
     """
-    Initialize analytics engine: load countries, subdivisions, indexes, and scheduler entries.
+    Initialize analytics engine: connect, ensure indexes and, unless datasets is
+    False (the platform loads them in the background), load the reference datasets.
     """
     logger.info("Analytics initialize: starting")
     analytics_db.mongo_url = os.getenv("ANALYTICS_MONGO_URL", config.MONGO_URL)
@@ -217,14 +271,44 @@ async def initialize():
     analytics_db.connect()
     db = analytics_db.get_db()
 
-    await db.regions.create_index([("geometry", "2dsphere")])
-    await db.subdivisions.create_index([("geometry", "2dsphere")])
+    await indexes.ensure(db, "analytics")
+    await indexes.verify(db, "analytics")
+    # Overview levels used to be embedded in the terrain document.
+    await db.terrain.update_many({"overviews": {"$exists": True}}, {"$unset": {"overviews": ""}})
     logger.info("Analytics DB connected (%s/%s); indexes ensured", analytics_db.mongo_url, analytics_db.db_name)
 
-    await _ensure_countries(db)
-    await _ensure_subdivisions(db)
-    countries = list(getattr(config, "SUBDIVISION_SOURCES", {}).keys()) or list(terrain.COUNTRY_MODULES.keys())
-    await terrain.initialize_configured(db, countries)
+    if datasets:
+        await _load_datasets(db)
 
     logger.info("Analytics initialize: completed")
     return None
+
+
+async def _load_datasets(db):
+    # Countries and subdivisions are independent collections.
+    await asyncio.gather(_ensure_countries(db), _ensure_subdivisions(db))
+    countries = list(getattr(config, "SUBDIVISION_SOURCES", {}).keys()) or list(terrain.COUNTRY_MODULES.keys())
+    await terrain.initialize_configured(db, countries)
+
+
+async def load_datasets():
+    """
+    Load countries, subdivisions and country dataset keys (downloading them on
+    a cold start) behind the readiness gate requests wait on.
+    """
+    readiness.begin()
+    try:
+        await _load_datasets(analytics_db.get_db())
+    except BaseException as exc:
+        readiness.finish(exc)
+        raise
+    readiness.finish()
+    logger.info("Analytics reference datasets ready")
+
+
+async def shutdown():
+    """
+    Flush the field data write-behind buffer.
+    """
+    await write_buffer.buffer.close()
+    logger.info("Analytics shutdown: field data buffer flushed (%s)", write_buffer.buffer.snapshot())
@@ -0,0 +1,494 @@
+"""
+Raster algebra query service.
+
+Evaluates a small, safe expression language over a project's aligned grid layers,
+e.g. ``slope(dem) < 5 and soil.drainagecl == "Well drained" and land_cover in {"Corn", "Soybeans"}``.
+Expressions are parsed with ``ast`` against a whitelist of nodes and compiled into
+vectorized numpy closures; nothing is ever passed to eval().
+
+Supported:
+- layers: dem, soil, land_cover, coverage (polygon mask)
+- arithmetic (+ - * / ** %), comparisons (chained), and/or/not, & | ^
+- class membership: ``land_cover in {1, 5}`` or by class name ``land_cover == "Corn"``
+- categorical attributes: ``soil.<attribute>`` (e.g. drainagecl, ph), ``land_cover.name``
+- functions: slope, focal_mean, focal_min, focal_max, focal_sum, abs, sqrt, where
+"""
+
+import ast
+import hashlib
+import json
+import logging
+import math
+import operator
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from backend.platform import metrics
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import calc_area, coverage
+from backend.services.analytics.api.grid import CATEGORICAL_LAYERS, LAYER_SOURCES
+
+logger = logging.getLogger("landos.analytics")
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_NODES = 200
+MAX_FOCAL_SIZE = 15
+COMPILE_CACHE_SIZE = 256
+METERS_PER_DEGREE = 111_320.0
+
+_COMPARE_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_BIN_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Pow: np.power,
+    ast.Mod: np.mod,
+    ast.BitAnd: np.logical_and,
+    ast.BitOr: np.logical_or,
+    ast.BitXor: np.logical_xor,
+}
+
+_compiled_cache: "OrderedDict[tuple, CompiledExpression]" = OrderedDict()
+
+
+@dataclass
+class CompiledExpression:
+    expression: str
+    layers: set = field(default_factory=set)
+    evaluate: Callable[[Dict[str, np.ndarray]], Any] = None
+
+
+def project_version(terrain: dict) -> str:
+    """Short hash of the per-layer versions; changes whenever any layer is rewritten."""
+    versions = terrain.get("layer_versions") or {}
+    layers = terrain.get("etl_layers") or {}
+    stamp = sorted(
+        (name, (versions.get(name) or {}).get("version") or (meta or {}).get("updated_at"))
+        for name, meta in layers.items()
+    )
+    return hashlib.sha1(json.dumps(stamp, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def load_layers(terrain: dict) -> Dict[str, np.ndarray]:
+    """Return the project's stored grids as numpy arrays keyed by layer name."""
+    arrays: Dict[str, np.ndarray] = {}
+    for name, (doc_key, grid_key) in LAYER_SOURCES.items():
+        grid = (terrain.get(doc_key) or {}).get(grid_key)
+        if not grid:
+            continue
+        arrays[name] = np.asarray(grid, dtype=float if name == "dem" else np.int64)
+    mask = coverage.unpack_mask(terrain.get("coverage_mask"))
+    if mask is not None:
+        arrays["coverage"] = mask
+    return arrays
+
+
+def _categories(terrain: dict, layer: str) -> Dict[int, dict]:
+    """Map class code -> attributes (always including 'name') for a categorical layer."""
+    classes: Dict[int, dict] = {}
+    if layer == "soil":
+        soil = terrain.get("soil_data") or {}
+        units = soil.get("units") or {}
+        for code, mukey in (soil.get("index_map") or {}).items():
+            attrs = dict(units.get(mukey) or {})
+            attrs.setdefault("name", attrs.get("muname") or mukey)
+            attrs["mukey"] = mukey
+            classes[int(code)] = attrs
+    elif layer == "land_cover":
+        for code, name in ((terrain.get("land_cover") or {}).get("index_map") or {}).items():
+            try:
+                classes[int(code)] = {"name": name}
+            except (TypeError, ValueError):
+                continue
+    return classes
+
+
+def _slope_degrees(dem: np.ndarray, transform) -> np.ndarray:
+    if dem.ndim != 2 or min(dem.shape) < 2:
+        return np.zeros(dem.shape, dtype=float)
+    a, _, _, _, e, f = list(transform)[:6]
+    lat = f + e * (np.arange(dem.shape[0]) + 0.5)
+    dx = abs(a) * METERS_PER_DEGREE * np.cos(np.radians(lat))[:, None]
+    dy = abs(e) * METERS_PER_DEGREE
+    grad_y, grad_x = np.gradient(dem.astype(float))
+    return np.degrees(np.arctan(np.hypot(grad_x / dx, grad_y / dy)))
+
+
+def _focal(reducer):
+    def apply(arr, size):
+        arr = np.asarray(arr, dtype=float)
+        radius = size // 2
+        windows = sliding_window_view(np.pad(arr, radius, mode="edge"), (size, size))
+        return reducer(windows, axis=(-2, -1))
+    return apply
+
+
+_FOCAL_FUNCTIONS = {
+    "focal_mean": _focal(np.mean),
+    "focal_min": _focal(np.min),
+    "focal_max": _focal(np.max),
+    "focal_sum": _focal(np.sum),
+}
+_ELEMENTWISE_FUNCTIONS = {
+    "abs": (1, np.abs),
+    "sqrt": (1, np.sqrt),
+    "where": (3, np.where),
+}
+
+
+class _Compiler:
+    def __init__(self, terrain: dict, available: set):
+        self.terrain = terrain
+        self.available = available
+        self.transform = (terrain.get("elevation_data") or {}).get("transform")
+        self.layers: set = set()
+        self._categories: Dict[str, Dict[int, dict]] = {}
+
+    def categories(self, layer: str) -> Dict[int, dict]:
+        if layer not in self._categories:
+            self._categories[layer] = _categories(self.terrain, layer)
+        return self._categories[layer]
+
+    def compile(self, node):
+        method = getattr(self, f"_compile_{type(node).__name__}", None)
+        if method is None:
+            raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+        return method(node)
+
+    def _compile_Expression(self, node):
+        return self.compile(node.body)
+
+    def _compile_Constant(self, node):
+        value = node.value
+        if isinstance(value, bool) or isinstance(value, (int, float)):
+            return lambda env: value
+        raise ValueError("Only numeric constants are allowed outside comparisons")
+
+    def _compile_Name(self, node):
+        name = node.id
+        if name not in LAYER_SOURCES and name != "coverage":
+            raise ValueError(f"Unknown layer '{name}'")
+        if name not in self.available:
+            raise ValueError(f"Layer '{name}' is not available for this project")
+        self.layers.add(name)
+        return lambda env: env[name]
+
+    def _compile_Attribute(self, node):
+        if not isinstance(node.value, ast.Name) or node.value.id not in CATEGORICAL_LAYERS:
+            raise ValueError("Attributes are only supported on categorical layers (soil, land_cover)")
+        layer_fn = self._compile_Name(node.value)
+        classes = self.categories(node.value.id)
+        attr = node.attr
+        if not any(attr in attrs for attrs in classes.values()):
+            raise ValueError(f"Unknown attribute '{attr}' for layer '{node.value.id}'")
+        values = {code: attrs.get(attr) for code, attrs in classes.items()}
+        numeric = all(v is None or _is_number(v) for v in values.values())
+        size = max(values) + 1 if values else 1
+        if numeric:
+            table = np.full(size, np.nan, dtype=float)
+            for code, v in values.items():
+                if v is not None and code >= 0:
+                    table[code] = float(v)
+            default = np.nan
+        else:
+            table = np.full(size, None, dtype=object)
+            for code, v in values.items():
+                if code >= 0:
+                    table[code] = v
+            default = None
+
+        def lookup(env):
+            grid = layer_fn(env)
+            inside = (grid >= 0) & (grid < size)
+            return np.where(inside, table[np.clip(grid, 0, size - 1)], default)
+        return lookup
+
+    def _is_text(self, node) -> bool:
+        """True for string literals and categorical attributes with non-numeric values."""
+        if _is_string(node):
+            return True
+        if isinstance(node, ast.Attribute) and _is_categorical_name(node.value):
+            values = [attrs.get(node.attr) for attrs in self.categories(node.value.id).values()]
+            return not all(v is None or _is_number(v) for v in values)
+        return False
+
+    def _require_numeric(self, nodes, context: str):
+        for node in nodes:
+            if self._is_text(node):
+                raise ValueError(f"{context} requires numeric operands, not text")
+
+    def _compile_UnaryOp(self, node):
+        if not isinstance(node.op, ast.Not):
+            self._require_numeric([node.operand], "Unary arithmetic")
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda env: np.logical_not(operand(env))
+        if isinstance(node.op, ast.USub):
+            return lambda env: np.negative(operand(env))
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+
+    def _compile_BoolOp(self, node):
+        parts = [self.compile(v) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def evaluate(env):
+            result = parts[0](env)
+            for part in parts[1:]:
+                result = combine(result, part(env))
+            return result
+        return evaluate
+
+    def _compile_BinOp(self, node):
+        func = _BIN_OPS.get(type(node.op))
+        if func is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        self._require_numeric([node.left, node.right], "Arithmetic")
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        return lambda env: func(left(env), right(env))
+
+    def _compile_Compare(self, node):
+        terms = [node.left] + list(node.comparators)
+        checks = [self._compile_comparison(terms[i], op, terms[i + 1]) for i, op in enumerate(node.ops)]
+
+        def evaluate(env):
+            result = checks[0](env)
+            for check in checks[1:]:
+                result = np.logical_and(result, check(env))
+            return result
+        return evaluate
+
+    def _compile_comparison(self, left_node, op, right_node):
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right_node, (ast.Set, ast.List, ast.Tuple)):
+                raise ValueError("Membership tests require a literal set, list or tuple")
+            members = [self._literal(elt) for elt in right_node.elts]
+            left = self.compile(left_node)
+            codes = np.asarray(self._resolve_members(left_node, members))
+            if isinstance(op, ast.In):
+                return lambda env: np.isin(left(env), codes)
+            return lambda env: ~np.isin(left(env), codes)
+
+        func = _COMPARE_OPS.get(type(op))
+        if func is None:
+            raise ValueError(f"Unsupported comparison: {type(op).__name__}")
+        if isinstance(op, (ast.Eq, ast.NotEq)):
+            for layer_node, other in ((left_node, right_node), (right_node, left_node)):
+                if _is_categorical_name(layer_node) and _is_string(other):
+                    layer = self.compile(layer_node)
+                    codes = np.asarray(self._resolve_members(layer_node, [other.value]))
+                    if isinstance(op, ast.Eq):
+                        return lambda env: np.isin(layer(env), codes)
+                    return lambda env: ~np.isin(layer(env), codes)
+            if self._is_text(left_node) != self._is_text(right_node):
+                raise ValueError("Equality tests cannot compare text with numbers")
+        else:
+            self._require_numeric([left_node, right_node], "Ordering comparison")
+        left = self._compile_operand(left_node)
+        right = self._compile_operand(right_node)
+        return lambda env: func(left(env), right(env))
+
+    def _compile_operand(self, node):
+        if _is_string(node):
+            value = node.value
+            return lambda env: value
+        return self.compile(node)
+
+    def _compile_Call(self, node):
+        if not isinstance(node.func, ast.Name):
+            raise ValueError("Only named functions may be called")
+        if node.keywords:
+            raise ValueError("Keyword arguments are not supported")
+        name = node.func.id
+        self._require_numeric(node.args, f"{name}()")
+        if name == "slope":
+            if len(node.args) != 1:
+                raise ValueError("slope() takes exactly one argument")
+            if not self.transform:
+                raise ValueError("slope() requires a DEM transform")
+            arg = self.compile(node.args[0])
+            transform = self.transform
+            return lambda env: _slope_degrees(np.asarray(arg(env), dtype=float), transform)
+        if name in _FOCAL_FUNCTIONS:
+            if len(node.args) not in (1, 2):
+                raise ValueError(f"{name}() takes a layer and an optional window size")
+            size = 3
+            if len(node.args) == 2:
+                size = self._literal(node.args[1])
+                if not isinstance(size, int) or size < 1 or size % 2 == 0 or size > MAX_FOCAL_SIZE:
+                    raise ValueError(f"{name}() window size must be an odd integer between 1 and {MAX_FOCAL_SIZE}")
+            arg = self.compile(node.args[0])
+            reducer = _FOCAL_FUNCTIONS[name]
+            return lambda env: reducer(arg(env), size)
+        if name in _ELEMENTWISE_FUNCTIONS:
+            arity, func = _ELEMENTWISE_FUNCTIONS[name]
+            if len(node.args) != arity:
+                raise ValueError(f"{name}() takes exactly {arity} argument(s)")
+            args = [self.compile(a) for a in node.args]
+            return lambda env: func(*(a(env) for a in args))
+        raise ValueError(f"Unknown function '{name}'")
+
+    def _literal(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            if _is_number(node.operand.value):
+                return -node.operand.value
+        raise ValueError("Expected a literal number or string")
+
+    def _resolve_members(self, layer_node, members):
+        """Translate class names into codes when testing a categorical layer."""
+        if not any(isinstance(m, str) for m in members):
+            return members
+        if not _is_categorical_name(layer_node):
+            return members
+        classes = self.categories(layer_node.id)
+        resolved = []
+        for member in members:
+            if not isinstance(member, str):
+                resolved.append(member)
+                continue
+            wanted = member.strip().lower()
+            matches = [
+                code
+                for code, attrs in classes.items()
+                if wanted in {str(attrs.get("name", "")).lower(), str(attrs.get("mukey", "")).lower()}
+            ]
+            if not matches:
+                raise ValueError(f"Unknown class '{member}' for layer '{layer_node.id}'")
+            resolved.extend(matches)
+        return resolved
+
+
+def _is_number(value) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_string(node) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _is_categorical_name(node) -> bool:
+    return isinstance(node, ast.Name) and node.id in CATEGORICAL_LAYERS
+
+
+def compile_expression(expression: str, terrain: dict, available: set | None = None) -> CompiledExpression:
+    """Parse and validate an expression against a project's layers."""
+    if not isinstance(expression, str) or not expression.strip():
+        raise ValueError("expression is required")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"expression exceeds {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise ValueError(f"Invalid expression: {exc.msg}") from None
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise ValueError(f"expression exceeds {MAX_NODES} syntax nodes")
+    if available is None:
+        available = set(load_layers(terrain).keys())
+    compiler = _Compiler(terrain, available)
+    evaluate = compiler.compile(tree)
+    return CompiledExpression(expression=expression, layers=compiler.layers, evaluate=evaluate)
+
+
+def get_compiled(project_id: str, terrain: dict, expression: str, available: set) -> CompiledExpression:
+    """Compile with an LRU cache keyed by (project, layer version, expression)."""
+    key = (project_id, project_version(terrain), expression.strip())
+    cached = _compiled_cache.get(key)
+    metrics.record_cache("algebra_compiled", cached is not None)
+    if cached is not None:
+        _compiled_cache.move_to_end(key)
+        return cached
+    compiled = compile_expression(expression, terrain, available)
+    _compiled_cache[key] = compiled
+    while len(_compiled_cache) > COMPILE_CACHE_SIZE:
+        _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def evaluate(compiled: CompiledExpression, layers: Dict[str, np.ndarray], shape) -> np.ndarray:
+    try:
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = compiled.evaluate(layers)
+    except TypeError as exc:
+        # Last line of defence for type mismatches the compiler did not catch.
+        raise ValueError(f"expression mixes incompatible value types: {exc}") from None
+    result = np.asarray(result)
+    if result.dtype == object:
+        raise ValueError("expression must produce numeric or boolean values")
+    return np.broadcast_to(result, shape)
+
+
+async def run_query(project_id: str, expression: str, output: str = "auto", clip: bool = True) -> dict:
+    """
+    Evaluate an expression for a project and return a mask or raster plus the matching area.
+    """
+    if output not in {"auto", "mask", "raster"}:
+        raise ValueError("output must be one of auto, mask, raster")
+    if analytics_db.client is None:
+        analytics_db.connect()
+    terrain = await analytics_db.get_db().terrain.find_one({"project_id": project_id})
+    if not terrain:
+        raise LookupError("Grid not found")
+    layers = load_layers(terrain)
+    if "dem" not in layers:
+        raise LookupError("DEM layer not found")
+    shape = layers["dem"].shape
+    compiled = get_compiled(project_id, terrain, expression, set(layers.keys()))
+    result = evaluate(compiled, layers, shape)
+
+    inside = layers.get("coverage") if clip else None
+    if inside is None:
+        inside = np.ones(shape, dtype=bool)
+    elevation = terrain.get("elevation_data") or {}
+    row_areas = calc_area.cell_areas_hectares(elevation.get("transform"), shape[0])
+
+    if output == "mask" or (output == "auto" and result.dtype == bool):
+        matched = np.logical_and(np.nan_to_num(result) != 0, inside)
+        grid = matched.astype(np.uint8).tolist()
+        kind = "mask"
+    else:
+        values = result.astype(float)
+        matched = np.logical_and(np.isfinite(values) & (values != 0), inside)
+        keep = np.isfinite(values) & inside
+        grid = [[float(v) if k else None for v, k in zip(row, krow)] for row, krow in zip(values.tolist(), keep.tolist())]
+        kind = "raster"
+    area = float((matched.sum(axis=1) * row_areas).sum())
+    cells = int(matched.sum())
+    logger.info(
+        "Raster query project=%s layers=%s type=%s cells=%s area=%.2f ha",
+        project_id, sorted(compiled.layers), kind, cells, area,
+    )
+    return {
+        "project_id": project_id,
+        "expression": expression,
+        "version": project_version(terrain),
+        "type": kind,
+        "grid": grid,
+        "cells": cells,
+        "area_hectares": area if math.isfinite(area) else 0.0,
+        "bounds": elevation.get("bounds"),
+        "transform": elevation.get("transform"),
+    }
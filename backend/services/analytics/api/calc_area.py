@@ -2,14 +2,22 @@
 Area calculation service (placeholder).
 """
 
+from functools import lru_cache
 from shapely.geometry import shape
-from pyproj import Geod
 import logging
+import numpy as np
 
-geod = Geod(ellps="WGS84")
 logger = logging.getLogger("landos.analytics")
 
 
+@lru_cache(maxsize=1)
+def _geod():
+    # pyproj loads PROJ data on import; defer it to the first area calculation.
+    from pyproj import Geod
+
+    return Geod(ellps="WGS84")
+
+
 def calculate_area_hectares(geometry: dict) -> float:
     geom = shape(geometry)
     if geom.is_empty:
@@ -23,7 +31,7 @@ def calculate_area_hectares(geometry: dict) -> float:
     total_area = 0.0
     for g in geoms:
         lon, lat = g.exterior.coords.xy
-        area, _ = geod.polygon_area_perimeter(lon, lat)
+        area, _ = _geod().polygon_area_perimeter(lon, lat)
         total_area += abs(area)
     hectares = total_area / 10_000.0
     logger.info("Computed area %.2f ha (geom_type=%s, parts=%d)", hectares, geom.geom_type, len(geoms))
@@ -32,3 +40,20 @@ def calculate_area_hectares(geometry: dict) -> float:
 
 async def compute_area_hectares(geometry: dict) -> float:
     return calculate_area_hectares(geometry)
+
+
+def cell_areas_hectares(transform, rows: int) -> np.ndarray:
+    """
+    Return the geodesic area (ha) of one grid cell for each row of a north-up
+    EPSG:4326 grid; cells in the same row share an area.
+    """
+    a, _, c, _, e, f = list(transform)[:6]
+    areas = np.zeros(rows, dtype=float)
+    for r in range(rows):
+        top = f + r * e
+        bottom = top + e
+        lon = [c, c + a, c + a, c]
+        lat = [top, top, bottom, bottom]
+        area, _ = _geod().polygon_area_perimeter(lon, lat)
+        areas[r] = abs(area) / 10_000.0
+    return areas
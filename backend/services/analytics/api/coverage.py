@@ -0,0 +1,67 @@
+"""
+Polygon coverage mask service.
+
+The DEM grid is cropped to the polygon bbox plus a buffer, so it always contains
+cells outside the field. The ETL rasterizes the project polygon once onto the DEM
+grid and stores the result bit-packed on the terrain document; consumers unpack it
+and apply it to any aligned layer with a single vectorized operation.
+"""
+
+import base64
+import logging
+
+import numpy as np
+from affine import Affine
+from shapely.geometry import shape
+
+logger = logging.getLogger("landos.analytics")
+
+MASK_ENCODING = "packbits"
+
+
+def build_coverage_mask(geometry: dict, transform, rows: int, cols: int) -> np.ndarray:
+    """Return a boolean (rows, cols) array that is True for cells whose center falls inside the geometry."""
+    if not rows or not cols:
+        return np.zeros((rows, cols), dtype=bool)
+    from rasterio.features import geometry_mask  # GDAL; only needed by the ETL
+
+    return geometry_mask(
+        [shape(geometry)],
+        out_shape=(rows, cols),
+        transform=Affine(*list(transform)[:6]),
+        all_touched=False,
+        invert=True,
+    )
+
+
+def pack_mask(mask: np.ndarray) -> dict:
+    """Bit-pack a boolean mask into a JSON/BSON friendly document."""
+    mask = np.asarray(mask, dtype=bool)
+    packed = np.packbits(mask, axis=None)
+    return {
+        "encoding": MASK_ENCODING,
+        "shape": list(mask.shape),
+        "cells": int(mask.sum()),
+        "data": base64.b64encode(packed.tobytes()).decode("ascii"),
+    }
+
+
+def unpack_mask(doc: dict | None) -> np.ndarray | None:
+    """Inverse of pack_mask; returns None when no mask is stored."""
+    if not doc or not doc.get("data"):
+        return None
+    if doc.get("encoding", MASK_ENCODING) != MASK_ENCODING:
+        raise ValueError(f"Unsupported coverage mask encoding: {doc.get('encoding')}")
+    rows, cols = doc["shape"]
+    packed = np.frombuffer(base64.b64decode(doc["data"]), dtype=np.uint8)
+    return np.unpackbits(packed, count=rows * cols).astype(bool).reshape(rows, cols)
+
+
+def apply_mask(grid, mask: np.ndarray | None, fill=0) -> np.ndarray:
+    """Return grid as an array with cells outside the mask replaced by fill."""
+    arr = np.asarray(grid)
+    if mask is None:
+        return arr
+    if mask.shape != arr.shape:
+        raise ValueError(f"Coverage mask shape {mask.shape} does not match grid shape {arr.shape}")
+    return np.where(mask, arr, fill)
@@ -5,7 +5,7 @@ Region resolution service (placeholder).
 import os
 import logging
 from backend.services.analytics.analytics_db_connection import analytics_db
-from backend.services.analytics import config
+from backend.services.analytics import config, readiness
 
 logger = logging.getLogger("landos.analytics")
 
@@ -18,6 +18,7 @@ async def resolve_region(geometry: dict) -> dict:
         analytics_db.mongo_url = os.getenv("ANALYTICS_MONGO_URL", config.MONGO_URL)
         analytics_db.db_name = os.getenv("ANALYTICS_DB_NAME", config.MONGO_DB)
         analytics_db.connect()
+    await readiness.wait_for_datasets()
     db = analytics_db.get_db()
     country = await db.regions.find_one(
         {"geometry": {"$geoIntersects": {"$geometry": geometry}}},
@@ -1,4 +1,188 @@
-# Endpoint handlers for analytics diffs.
-# This will keep track of when the terrain data was last updated, 
-# and provide the diffs in the grid from the time provided in the request.
-# We can do this by keeping version hashes.
+"""
+Grid diff service.
+
+Keeps track of when each terrain layer was last updated and provides the diffs
+in the grid since a version (or time) supplied by the client. Every layer write
+stamps a content-hash version on the terrain document and stores a compressed
+snapshot in the layer_versions collection (the last LAYER_HISTORY_DEPTH per
+layer), which is enough to compute changed cells between any retained version
+and the current one.
+"""
+
+import hashlib
+import logging
+import zlib
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from pymongo import DESCENDING
+
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api.grid import CATEGORICAL_LAYERS, LAYER_SOURCES
+
+logger = logging.getLogger("landos.analytics")
+
+LAYER_HISTORY_DEPTH = 8
+# Above this share of changed cells a full grid is smaller than index + value lists.
+FULL_RESYNC_RATIO = 0.5
+
+
+def _as_array(layer: str, grid) -> np.ndarray:
+    return np.asarray(grid, dtype=np.int64 if layer in CATEGORICAL_LAYERS else np.float64)
+
+
+def grid_version(layer: str, grid) -> str:
+    """Content hash of a layer grid; identical rewrites keep the same version."""
+    arr = _as_array(layer, grid)
+    digest = hashlib.sha1(f"{arr.dtype.str}{arr.shape}".encode("utf-8"))
+    digest.update(np.ascontiguousarray(arr).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def version_stamp(layer: str, grid) -> Optional[dict]:
+    """Version entry stored under terrain.layer_versions.<layer>."""
+    if not grid:
+        return None
+    return {"version": grid_version(layer, grid), "updated_at": datetime.utcnow().isoformat()}
+
+
+async def record_history(db, project_id: str, layer: str, grid, stamp: Optional[dict]) -> None:
+    """
+    Store a compressed snapshot for the stamped version and prune old ones.
+    Best effort: a history failure must not fail the layer ETL.
+    """
+    if not grid or not stamp:
+        return
+    try:
+        coll = db.layer_versions
+        latest = await coll.find_one(
+            {"project_id": project_id, "layer": layer},
+            {"_id": 0, "version": 1},
+            sort=[("created_at", DESCENDING)],
+        )
+        if latest and latest.get("version") == stamp["version"]:
+            logger.info("Layer %s unchanged for project %s (version %s)", layer, project_id, stamp["version"])
+            return
+        arr = _as_array(layer, grid)
+        await coll.insert_one(
+            {
+                "project_id": project_id,
+                "layer": layer,
+                "version": stamp["version"],
+                "created_at": datetime.fromisoformat(stamp["updated_at"]),
+                "dtype": arr.dtype.str,
+                "shape": list(arr.shape),
+                "data": zlib.compress(np.ascontiguousarray(arr).tobytes(), 6),
+            }
+        )
+        stale = (
+            await coll.find({"project_id": project_id, "layer": layer}, {"_id": 1})
+            .sort("created_at", DESCENDING)
+            .skip(LAYER_HISTORY_DEPTH)
+            .to_list(None)
+        )
+        if stale:
+            await coll.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+        logger.info("Layer %s version %s recorded for project %s", layer, stamp["version"], project_id)
+    except Exception:
+        logger.exception("Layer version history write failed for project %s layer %s", project_id, layer)
+
+
+def _snapshot_array(doc: dict) -> np.ndarray:
+    raw = zlib.decompress(doc["data"])
+    return np.frombuffer(raw, dtype=np.dtype(doc["dtype"])).reshape(doc["shape"])
+
+
+def _json_values(values: np.ndarray) -> list:
+    """Plain list with NaN cells (DEM nodata) as None, since JSON has no NaN."""
+    if values.dtype.kind != "f":
+        return values.tolist()
+    return [None if v != v else v for v in values.tolist()]
+
+
+def compute_delta(old: np.ndarray, new: np.ndarray) -> dict:
+    """Changed flat (row-major) indices and their new values (NaN as None), or a full-resync marker."""
+    if old.shape != new.shape:
+        return {"full": True, "reason": "shape_changed"}
+    same = old == new
+    if old.dtype.kind == "f":
+        same |= np.isnan(old) & np.isnan(new)
+    changed = np.flatnonzero(~same)
+    if changed.size > FULL_RESYNC_RATIO * new.size:
+        return {"full": True, "reason": "too_many_changes", "changed": int(changed.size)}
+    return {
+        "full": False,
+        "encoding": "indices",
+        "changed": int(changed.size),
+        "indices": changed.tolist(),
+        "values": _json_values(new.ravel()[changed]),
+    }
+
+
+async def _resolve_since(coll, project_id: str, layer: str, since: str) -> Optional[dict]:
+    doc = await coll.find_one({"project_id": project_id, "layer": layer, "version": since})
+    if doc:
+        return doc
+    try:
+        ts = datetime.fromisoformat(since.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+    return await coll.find_one(
+        {"project_id": project_id, "layer": layer, "created_at": {"$lte": ts}},
+        sort=[("created_at", DESCENDING)],
+    )
+
+
+async def get_diff(project_id: str, layer: str, since: str) -> dict:
+    """
+    Return the delta for a layer since a client-held version hash or ISO timestamp.
+    Falls back to the full grid when the requested version is no longer retained.
+    """
+    if layer not in LAYER_SOURCES:
+        raise LookupError(f"Unknown layer '{layer}'")
+    if not since:
+        raise ValueError("since is required")
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+    doc_key, grid_key = LAYER_SOURCES[layer]
+    terrain = await db.terrain.find_one({"project_id": project_id}, {"_id": 0, "layer_versions": 1})
+    if not terrain:
+        raise LookupError("Grid not found")
+    current = (terrain.get("layer_versions") or {}).get(layer)
+    if not current:
+        raise LookupError("Requested layer has no recorded version")
+    result = {
+        "project_id": project_id,
+        "layer": layer,
+        "from": since,
+        "to": current["version"],
+        "updated_at": current.get("updated_at"),
+    }
+    if since == current["version"]:
+        result.update({"full": False, "encoding": "indices", "changed": 0, "indices": [], "values": []})
+        return result
+
+    coll = db.layer_versions
+    base = await _resolve_since(coll, project_id, layer, since)
+    head = await coll.find_one({"project_id": project_id, "layer": layer, "version": current["version"]})
+    if base and base.get("version") == current["version"]:
+        result.update({"from": base["version"], "full": False, "encoding": "indices", "changed": 0, "indices": [], "values": []})
+        return result
+    if base and head:
+        new = _snapshot_array(head)
+        result["from"] = base["version"]
+        result["shape"] = list(new.shape)
+        result.update(compute_delta(_snapshot_array(base), new))
+    else:
+        result.update({"full": True, "reason": "version_not_retained"})
+    if result["full"]:
+        full = await db.terrain.find_one({"project_id": project_id}, {"_id": 0, f"{doc_key}.{grid_key}": 1})
+        grid = ((full or {}).get(doc_key) or {}).get(grid_key)
+        result["grid"] = [_json_values(np.asarray(row, dtype=float)) for row in grid] if grid and layer == "dem" else grid
+    logger.info(
+        "Diff project=%s layer=%s from=%s to=%s full=%s changed=%s",
+        project_id, layer, result["from"], result["to"], result["full"], result.get("changed"),
+    )
+    return result
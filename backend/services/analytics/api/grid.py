@@ -1,2 +1,189 @@
-# Endpoint handlers for analytics grid data.
-# This will return all the values for the requested polygon from the DB, in a matrix grid of coordinates and all their values.
+"""
+Windowed grid extraction service.
+
+Returns the values of the requested layers for a polygon inside a project (a
+field or management zone) as a compact multi-layer matrix. The minimal row/col
+window is computed from the stored DEM transform and only that window of each
+layer leaves Mongo ($slice inside an aggregation $map); cells outside the
+polygon are returned as null.
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+from affine import Affine
+from shapely.geometry import shape
+
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import coverage
+from backend.services.analytics.api import overviews
+
+logger = logging.getLogger("landos.analytics")
+
+# layer name -> (terrain document key, grid key)
+LAYER_SOURCES = {
+    "dem": ("elevation_data", "heightmap"),
+    "soil": ("soil_data", "grid"),
+    "land_cover": ("land_cover", "grid"),
+}
+CATEGORICAL_LAYERS = {"soil", "land_cover"}
+# Projection that leaves the full-resolution grids in Mongo (see layer_views).
+FULL_GRID_EXCLUDE = {f"{doc_key}.{grid_key}": 0 for doc_key, grid_key in LAYER_SOURCES.values()}
+
+
+def grid_shape(layer_doc: dict) -> tuple:
+    """Derive (rows, cols) of a stored layer from its bounds and transform without loading the grid."""
+    transform = (layer_doc or {}).get("transform") or []
+    bounds = (layer_doc or {}).get("bounds") or {}
+    if len(transform) < 6 or not bounds:
+        return 0, 0
+    cols = int(round((bounds["right"] - bounds["left"]) / abs(transform[0])))
+    rows = int(round((bounds["top"] - bounds["bottom"]) / abs(transform[4])))
+    return rows, cols
+
+
+def window_for_bounds(transform, rows: int, cols: int, bounds) -> Optional[tuple]:
+    """
+    Return the minimal (row_off, col_off, height, width) window covering bounds
+    (minx, miny, maxx, maxy), clipped to the grid; None when they do not overlap.
+    """
+    minx, miny, maxx, maxy = bounds
+    inv = ~Affine(*list(transform)[:6])
+    c0, r0 = inv * (minx, maxy)
+    c1, r1 = inv * (maxx, miny)
+    col_min = max(0, int(math.floor(min(c0, c1))))
+    col_max = min(cols, int(math.ceil(max(c0, c1))))
+    row_min = max(0, int(math.floor(min(r0, r1))))
+    row_max = min(rows, int(math.ceil(max(r0, r1))))
+    if col_min >= col_max or row_min >= row_max:
+        return None
+    return row_min, col_min, row_max - row_min, col_max - col_min
+
+
+async def read_window(db, project_id: str, layer: str, row_off: int, height: int,
+                      col_off: int = 0, width: Optional[int] = None, level: int = 0) -> List[list]:
+    """
+    Read a window of a stored layer (or of one of its overview levels) without
+    transferring the rest of the grid. width=None reads whole rows.
+    """
+    doc_key, grid_key = LAYER_SOURCES[layer]
+    source = "$grid" if level else f"${doc_key}.{grid_key}"
+    rows_expr = {"$slice": [source, row_off, height]}
+    if width is not None:
+        rows_expr = {"$map": {"input": rows_expr, "as": "row", "in": {"$slice": ["$$row", col_off, width]}}}
+    if level:
+        match = {"project_id": project_id, "layer": layer, "level": level}
+        collection = db[overviews.OVERVIEW_COLLECTION]
+    else:
+        match = {"project_id": project_id}
+        collection = db.terrain
+    pipeline = [
+        {"$match": match},
+        {"$project": {"_id": 0, "window": rows_expr}},
+    ]
+    docs = await collection.aggregate(pipeline).to_list(1)
+    return (docs[0].get("window") if docs else None) or []
+
+
+async def layer_views(db, project_id: str, terrain: dict, layers: Dict[str, dict],
+                      level: Optional[int] = None, max_cells: Optional[int] = None,
+                      mask_layer: str = "dem") -> tuple:
+    """
+    Resolve the overview level served for each layer and return (views, coverage_mask).
+    terrain is expected to be fetched without the full grids (FULL_GRID_EXCLUDE); a
+    layer that resolves to level 0 has its grid loaded on demand. The coverage mask is
+    reduced to the level of mask_layer so its shape matches that layer's grid.
+    """
+    summaries = terrain.get("overview_levels") or {}
+    views: Dict[str, dict] = {}
+    served: Dict[str, int] = {}
+    for name, layer_doc in layers.items():
+        rows, cols = grid_shape(layer_doc)
+        lvl = overviews.select_level(rows, cols, summaries.get(name), level=level, max_cells=max_cells)
+        level_doc = await overviews.load_level(db, project_id, name, lvl) if lvl else None
+        if level_doc:
+            views[name] = overviews.layer_at_level(name, layer_doc, [level_doc], lvl)
+            served[name] = lvl
+            continue
+        doc_key, grid_key = LAYER_SOURCES[name]
+        full = await db.terrain.find_one({"project_id": project_id}, {"_id": 0, f"{doc_key}.{grid_key}": 1})
+        views[name] = {**layer_doc, grid_key: ((full or {}).get(doc_key) or {}).get(grid_key)}
+        served[name] = 0
+    mask_doc = terrain.get("coverage_mask")
+    mask_level = served.get(mask_layer, 0)
+    if mask_doc and mask_level:
+        mask = coverage.unpack_mask(mask_doc)
+        mask_doc = coverage.pack_mask(overviews.reduce_mask(mask, mask_level)) if mask is not None else None
+    return views, mask_doc
+
+
+async def extract_grid(project_id: str, geometry: dict, layers: Optional[List[str]] = None) -> Dict:
+    """
+    Extract the requested layers for a sub-polygon of a project.
+    """
+    from backend.services.analytics.api import validate_geometry  # avoid circular import
+    geometry = validate_geometry(geometry)
+    requested = list(layers) if layers else list(LAYER_SOURCES)
+    unknown = [name for name in requested if name not in LAYER_SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown layers: {', '.join(unknown)}")
+
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+    projection = {"_id": 0, "elevation_data.transform": 1, "elevation_data.bounds": 1}
+    for name in requested:
+        doc_key, grid_key = LAYER_SOURCES[name]
+        projection[f"{doc_key}.transform"] = 1
+    meta = await db.terrain.find_one({"project_id": project_id}, projection)
+    if not meta or not (meta.get("elevation_data") or {}).get("transform"):
+        raise LookupError("Grid not found")
+
+    elevation = meta["elevation_data"]
+    transform = elevation["transform"]
+    rows, cols = grid_shape(elevation)
+    window = window_for_bounds(transform, rows, cols, shape(geometry).bounds)
+    if window is None:
+        raise ValueError("geometry does not intersect the project grid")
+    row_off, col_off, height, width = window
+    window_transform = list(Affine(*transform[:6]) * Affine.translation(col_off, row_off))
+    mask = coverage.build_coverage_mask(geometry, window_transform, height, width)
+
+    out_layers: Dict[str, list] = {}
+    missing: List[str] = []
+    for name in requested:
+        doc_key, _ = LAYER_SOURCES[name]
+        if not (meta.get(doc_key) or {}).get("transform"):
+            missing.append(name)
+            continue
+        values = await read_window(db, project_id, name, row_off, height, col_off, width)
+        arr = np.asarray(values, dtype=float)
+        if arr.shape != (height, width):
+            missing.append(name)
+            continue
+        if name in CATEGORICAL_LAYERS:
+            arr = arr.astype(np.int64)
+        out_layers[name] = [
+            [v if m else None for v, m in zip(row, mrow)]
+            for row, mrow in zip(arr.tolist(), mask.tolist())
+        ]
+
+    a, _, c, _, e, f = window_transform[:6]
+    logger.info(
+        "Grid extracted project=%s window=(%s,%s %sx%s) cells=%s layers=%s",
+        project_id, row_off, col_off, height, width, int(mask.sum()), sorted(out_layers),
+    )
+    return {
+        "project_id": project_id,
+        "window": {"row_off": row_off, "col_off": col_off, "rows": height, "cols": width},
+        "transform": window_transform,
+        "bounds": {"left": c, "top": f, "right": c + a * width, "bottom": f + e * height},
+        "x": (c + a * (np.arange(width) + 0.5)).tolist(),
+        "y": (f + e * (np.arange(height) + 0.5)).tolist(),
+        "cells": int(mask.sum()),
+        "mask": coverage.pack_mask(mask),
+        "layers": out_layers,
+        "missing": missing,
+    }
@@ -1,2 +1,181 @@
-# Endpoint handlers for analytics history.
-# This endpoint returns the value history for a group of properties, e.g. weather, for a specific time frame.
+"""
+Analytics history.
+
+Returns the value history for a group of properties (e.g. weather) for a
+specific time frame. Only buckets overlapping the frame are read; readings
+are then trimmed to the frame and returned in time order as columns.
+
+Long frames can be served from the hourly or daily rollups instead of raw
+readings: pass a resolution ("raw", "hour", "day" or seconds) to pick the
+coarsest tier at least that fine, or max_points to pick the finest tier whose
+series fits. Frames starting before the raw retention window fall back to the
+hourly rollups unless a resolution is given.
+"""
+
+import logging
+import time
+from typing import List, Optional, Union
+
+import numpy as np
+
+from backend.services.analytics import config
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import timeseries
+
+logger = logging.getLogger("landos.analytics")
+
+
+def merge_buckets(buckets: List[dict], start_ms: Optional[int], end_ms: Optional[int]) -> dict:
+    """Concatenate bucket columns, trim them to [start_ms, end_ms] and sort by time."""
+    if not buckets:
+        return {"times": np.empty(0, dtype=np.int64), "values": np.empty(0, dtype=float)}
+    times = np.concatenate([np.asarray(b.get("times") or [], dtype=np.int64) for b in buckets])
+    values = np.concatenate([np.asarray(b.get("values") or [], dtype=float) for b in buckets])
+    keep = np.ones(times.shape, dtype=bool)
+    if start_ms is not None:
+        keep &= times >= start_ms
+    if end_ms is not None:
+        keep &= times <= end_ms
+    times, values = times[keep], values[keep]
+    order = np.argsort(times, kind="stable")
+    return {"times": times[order], "values": values[order]}
+
+
+TIER_STEPS = {"raw": 0, **timeseries.ROLLUP_TIERS}
+
+
+def _resolution_ms(resolution: Union[str, int, float]) -> int:
+    if isinstance(resolution, str) and resolution in TIER_STEPS:
+        return TIER_STEPS[resolution]
+    try:
+        seconds = float(resolution)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid resolution '{resolution}'")
+    if not np.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"invalid resolution '{resolution}'")
+    return int(seconds * 1000)
+
+
+def tier_for_resolution(resolution) -> str:
+    """Coarsest tier whose step is not coarser than the requested resolution."""
+    step = _resolution_ms(resolution)
+    return [tier for tier, tier_step in TIER_STEPS.items() if tier_step <= step][-1]
+
+
+def _raw_expired(start_ms: Optional[int]) -> bool:
+    days = config.TIMESERIES_RAW_RETENTION_DAYS
+    if days <= 0:
+        return False
+    horizon = int(time.time() * 1000) - days * timeseries.DAY_SECONDS * 1000
+    return start_ms is not None and start_ms < horizon
+
+
+async def _estimate_points(db, tier: str, project_id: str, properties: List[str],
+                           start_ms: Optional[int], end_ms: Optional[int]) -> int:
+    """Largest per-property point count a tier would return for the frame."""
+    counts = dict.fromkeys(properties, 0)
+    if tier == "raw":
+        coll = db[timeseries.BUCKET_COLLECTION]
+        filt = timeseries.range_filter(project_id, properties, start_ms, end_ms)
+        projection = {"_id": 0, "property": 1, "count": 1}
+        increment = None
+    else:
+        coll = db[timeseries.ROLLUP_COLLECTION]
+        filt = timeseries.rollup_filter(project_id, properties, tier, start_ms, end_ms)
+        projection = {"_id": 0, "property": 1}
+        increment = 1
+    async for doc in coll.find(filt, projection):
+        counts[doc["property"]] = counts.get(doc["property"], 0) + (increment or doc.get("count", 0))
+    return max(counts.values(), default=0)
+
+
+async def select_tier(db, project_id: str, properties: List[str], start_ms: Optional[int],
+                      end_ms: Optional[int], resolution=None, max_points: Optional[int] = None) -> str:
+    if resolution is not None:
+        return tier_for_resolution(resolution)
+    tiers = list(TIER_STEPS)
+    if _raw_expired(start_ms):
+        tiers.remove("raw")
+    if max_points is None:
+        return tiers[0]
+    if max_points < 1:
+        raise ValueError("max_points must be positive")
+    for tier in tiers[:-1]:
+        if await _estimate_points(db, tier, project_id, properties, start_ms, end_ms) <= max_points:
+            return tier
+    return tiers[-1]
+
+
+async def _raw_series(db, project_id, properties, start_ms, end_ms):
+    cursor = db[timeseries.BUCKET_COLLECTION].find(
+        timeseries.range_filter(project_id, properties, start_ms, end_ms),
+        {"_id": 0, "property": 1, "bucket_start": 1, "times": 1, "values": 1},
+    ).sort("bucket_start", 1)
+    grouped = {name: [] for name in properties}
+    scanned = 0
+    async for bucket in cursor:
+        scanned += 1
+        grouped.setdefault(bucket["property"], []).append(bucket)
+
+    out = {}
+    for name, buckets in grouped.items():
+        series = merge_buckets(buckets, start_ms, end_ms)
+        out[name] = {
+            "times": [timeseries.from_millis(int(ms)).isoformat() + "Z" for ms in series["times"]],
+            "values": [v if np.isfinite(v) else None for v in series["values"].tolist()],
+        }
+    return out, scanned
+
+
+async def _rollup_series(db, tier, project_id, properties, start_ms, end_ms):
+    cursor = db[timeseries.ROLLUP_COLLECTION].find(
+        timeseries.rollup_filter(project_id, properties, tier, start_ms, end_ms),
+        {"_id": 0, "property": 1, "period_start": 1, "count": 1, "sum": 1, "min": 1, "max": 1},
+    ).sort("period_start", 1)
+    out = {name: {"times": [], "values": [], "min": [], "max": [], "count": []} for name in properties}
+    scanned = 0
+    async for period in cursor:
+        scanned += 1
+        series = out.setdefault(period["property"], {"times": [], "values": [], "min": [], "max": [], "count": []})
+        count = period.get("count") or 0
+        mean = period.get("sum", 0.0) / count if count else None
+        series["times"].append(period["period_start"].isoformat() + "Z")
+        series["values"].append(mean if mean is None or np.isfinite(mean) else None)
+        series["min"].append(period.get("min"))
+        series["max"].append(period.get("max"))
+        series["count"].append(count)
+    return out, scanned
+
+
+async def get_history(project_id: str, properties: List[str], start=None, end=None,
+                      resolution=None, max_points: Optional[int] = None) -> dict:
+    """
+    Return {"project_id", "start", "end", "tier", "properties": {name: {"times": [ISO], "values": [...]}}}.
+    Rollup tiers return period starts as times, the period mean as values and
+    per-period min, max and count alongside.
+    """
+    properties = [p for p in (properties or []) if p]
+    if not properties:
+        raise ValueError("at least one property is required")
+    start_ms = timeseries.to_millis(start) if start is not None else None
+    end_ms = timeseries.to_millis(end) if end is not None else None
+    if start_ms is not None and end_ms is not None and end_ms < start_ms:
+        raise ValueError("end must not be before start")
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+    tier = await select_tier(db, project_id, properties, start_ms, end_ms, resolution, max_points)
+    if tier == "raw":
+        out, scanned = await _raw_series(db, project_id, properties, start_ms, end_ms)
+    else:
+        out, scanned = await _rollup_series(db, tier, project_id, properties, start_ms, end_ms)
+    logger.info(
+        "History served project=%s properties=%s tier=%s docs=%s", project_id, len(properties), tier, scanned
+    )
+    return {
+        "project_id": project_id,
+        "start": timeseries.from_millis(start_ms).isoformat() + "Z" if start_ms is not None else None,
+        "end": timeseries.from_millis(end_ms).isoformat() + "Z" if end_ms is not None else None,
+        "tier": tier,
+        "properties": out,
+    }
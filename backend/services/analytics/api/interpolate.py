@@ -0,0 +1,259 @@
+"""
+Point observation interpolation.
+
+Turns scattered, timestamped field observations (moisture probes, yield
+monitors) into rasters aligned with the project's DEM grid. Observations are
+grouped per property and time window (INTERPOLATION_WINDOW_SECONDS); each
+window is interpolated on its own and stored as a versioned layer in the
+observation_layers collection, so a new batch only re-renders the windows it
+touches. Neighbour lookups go through a KD-tree built over the window's points.
+
+The points themselves are appended to observation_points, one document per
+batch and window, and re-read before interpolating, so concurrent batches for
+the same window do not lose each other's points and no document grows with
+the window. A layer is only overwritten by a raster built from at least as
+many points as the stored one.
+
+Methods:
+- "idw": inverse distance weighting over the k nearest points
+- "nearest": value of the nearest point
+- "linear": barycentric interpolation on the Delaunay triangulation (cells
+  outside the convex hull of the points are left empty)
+
+Cells outside the project polygon, or farther than max_distance from every
+point, are NaN in the stored raster and null in responses.
+"""
+
+import logging
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from backend.services.analytics import config
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import coverage
+from backend.services.analytics.api import diff
+from backend.services.analytics.api import grid
+from backend.services.analytics.api import timeseries
+from backend.services.analytics.api import update
+
+logger = logging.getLogger("landos.analytics")
+
+OBSERVATION_COLLECTION = "observation_layers"
+POINT_COLLECTION = "observation_points"
+METHODS = ("idw", "nearest", "linear")
+IDW_NEIGHBOURS = 8
+IDW_POWER = 2.0
+
+INDEXES = {
+    OBSERVATION_COLLECTION: [
+        ([("project_id", 1), ("property", 1), ("window_start", 1)], {"name": "project_property_window", "unique": True}),
+    ],
+    POINT_COLLECTION: [
+        ([("project_id", 1), ("property", 1), ("window_start", 1)], {"name": "project_property_window"}),
+    ],
+}
+
+
+def cell_centers(transform, rows: int, cols: int) -> tuple:
+    """x and y of every cell centre of a rows x cols grid under an affine transform."""
+    a, b, c, d, e, f = list(transform)[:6]
+    col, row = np.meshgrid(np.arange(cols) + 0.5, np.arange(rows) + 0.5)
+    return a * col + b * row + c, d * col + e * row + f
+
+
+def _metric(xs: np.ndarray, ys: np.ndarray, lat0: float) -> np.ndarray:
+    """Scale geographic coordinates so Euclidean distance is roughly isotropic."""
+    return np.column_stack([xs * np.cos(np.radians(lat0)), ys])
+
+
+def interpolate_points(xs, ys, values, transform, rows: int, cols: int, method: str = "idw",
+                       k: int = IDW_NEIGHBOURS, power: float = IDW_POWER,
+                       max_distance: Optional[float] = None, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Interpolate point values onto the grid; returns a float (rows, cols) array with
+    NaN where no value is produced. max_distance is in grid cells.
+    """
+    from scipy.spatial import Delaunay, QhullError, cKDTree
+
+    if method not in METHODS:
+        raise ValueError(f"unknown method '{method}' (expected one of {', '.join(METHODS)})")
+    xs, ys, values = (np.asarray(col, dtype=float) for col in (xs, ys, values))
+    out = np.full((rows, cols), np.nan)
+    if not len(values) or not rows or not cols:
+        return out
+    cx, cy = cell_centers(transform, rows, cols)
+    target = np.ones((rows, cols), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    lat0 = float(np.mean(ys))
+    points = _metric(xs, ys, lat0)
+    queries = _metric(cx[target], cy[target], lat0)
+
+    if method == "linear":
+        if len(values) < 3:
+            raise ValueError("linear interpolation needs at least 3 points")
+        try:
+            tri = Delaunay(points)
+        except QhullError as exc:
+            raise ValueError(f"points cannot be triangulated: {exc}")
+        simplex = tri.find_simplex(queries)
+        inside = simplex >= 0
+        trans = tri.transform[simplex[inside]]
+        bary = np.einsum("ijk,ik->ij", trans[:, :2], queries[inside] - trans[:, 2])
+        weights = np.column_stack([bary, 1 - bary.sum(axis=1)])
+        result = np.full(len(queries), np.nan)
+        result[inside] = (values[tri.simplices[simplex[inside]]] * weights).sum(axis=1)
+        out[target] = result
+        return out
+
+    tree = cKDTree(points)
+    k = 1 if method == "nearest" else min(k, len(values))
+    dist, idx = tree.query(queries, k=k)
+    dist, idx = dist.reshape(len(queries), k), idx.reshape(len(queries), k)
+    if method == "nearest":
+        result = values[idx[:, 0]]
+    else:
+        exact = dist[:, 0] == 0
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / dist ** power
+        weights[exact] = 0
+        weights[exact, 0] = 1
+        result = (weights * values[idx]).sum(axis=1) / weights.sum(axis=1)
+    if max_distance is not None:
+        cell = abs(transform[0]) * np.cos(np.radians(lat0))
+        result[dist[:, 0] > max_distance * cell] = np.nan
+    out[target] = result
+    return out
+
+
+def flatten_observations(records: Iterable) -> Dict[str, np.ndarray]:
+    """
+    Validate {"property", "time", "lon"|"x", "lat"|"y", "value"} records into
+    columns; returns the accepted columns and the number rejected.
+    """
+    records = [rec if isinstance(rec, dict) else {} for rec in records]
+    props = np.asarray([rec.get("property") if isinstance(rec.get("property"), str) else "" for rec in records], dtype=str)
+    times, time_ok = update.parse_times([rec.get("time") for rec in records])
+    xs, x_ok = update.parse_values([rec.get("lon", rec.get("x")) for rec in records])
+    ys, y_ok = update.parse_values([rec.get("lat", rec.get("y")) for rec in records])
+    values, value_ok = update.parse_values([rec.get("value") for rec in records])
+    ok = (props != "") & time_ok & x_ok & y_ok & value_ok
+    return {
+        "props": props[ok],
+        "times": times[ok],
+        "x": xs[ok],
+        "y": ys[ok],
+        "values": values[ok],
+        "rejected": int((~ok).sum()),
+    }
+
+
+def _pack(arr: np.ndarray) -> dict:
+    return {"dtype": arr.dtype.str, "shape": list(arr.shape), "data": zlib.compress(arr.tobytes(), 6)}
+
+
+def _unpack(doc: dict) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(doc["data"]), dtype=np.dtype(doc["dtype"])).reshape(doc["shape"])
+
+
+async def interpolate_observations(project_id: str, records: List[dict], method: str = "idw",
+                                   max_distance: Optional[float] = None) -> dict:
+    """
+    Add a batch of point observations and re-interpolate the (property, window)
+    layers it touches. Returns the accepted/rejected counts and the new versions.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method '{method}' (expected one of {', '.join(METHODS)})")
+    if not isinstance(records, list):
+        raise ValueError("observations must be a list")
+    cols = flatten_observations(records)
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+    terrain = await db.terrain.find_one({"project_id": project_id}, {"_id": 0, **grid.FULL_GRID_EXCLUDE})
+    elevation = (terrain or {}).get("elevation_data") or {}
+    rows, width = grid.grid_shape(elevation)
+    if not rows or not width:
+        raise LookupError("Terrain not found")
+    mask = coverage.unpack_mask(terrain.get("coverage_mask"))
+    if mask is not None and mask.shape != (rows, width):
+        mask = None
+    window_ms = config.INTERPOLATION_WINDOW_SECONDS * 1000
+    starts = cols["times"] - (cols["times"] % window_ms)
+    coll = db[OBSERVATION_COLLECTION]
+
+    layers = []
+    for prop, start_ms in sorted(set(zip(cols["props"].tolist(), starts.tolist()))):
+        pick = (cols["props"] == prop) & (starts == start_ms)
+        key = {"project_id": project_id, "property": prop, "window_start": timeseries.from_millis(start_ms)}
+        await db[POINT_COLLECTION].insert_one({
+            **key,
+            "x": cols["x"][pick].tolist(),
+            "y": cols["y"][pick].tolist(),
+            "values": cols["values"][pick].tolist(),
+            "created_at": datetime.utcnow(),
+        })
+        points = {"x": [], "y": [], "values": []}
+        async for batch in db[POINT_COLLECTION].find(key, {"_id": 0, "x": 1, "y": 1, "values": 1}):
+            for field in points:
+                points[field].extend(batch[field])
+        count = len(points["values"])
+        raster = interpolate_points(
+            points["x"], points["y"], points["values"], elevation["transform"], rows, width,
+            method=method, max_distance=max_distance, mask=mask,
+        )
+        version = diff.grid_version(prop, raster)
+        try:
+            # A concurrent batch may already have stored a raster over more points.
+            await coll.update_one(
+                {**key, "point_count": {"$not": {"$gt": count}}},
+                {
+                    "$set": {
+                        "window_end": timeseries.from_millis(start_ms + window_ms),
+                        "method": method,
+                        "point_count": count,
+                        "version": version,
+                        "updated_at": datetime.utcnow(),
+                        **_pack(raster),
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            logger.info("Observation layer %s %s already holds a newer raster", prop, key["window_start"])
+        layers.append({"property": prop, "window_start": key["window_start"].isoformat() + "Z",
+                       "points": count, "version": version})
+    logger.info("Interpolated %s observation layers for project %s (%s points)", len(layers), project_id, len(cols["values"]))
+    return {"accepted": int(len(cols["values"])), "rejected": cols["rejected"], "layers": layers}
+
+
+async def get_observation_layer(project_id: str, prop: str, at=None) -> dict:
+    """Raster of the window containing `at` (latest window when omitted), aligned with the DEM."""
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+    filt = {"project_id": project_id, "property": prop}
+    if at is not None:
+        filt["window_start"] = {"$lte": timeseries.from_millis(timeseries.to_millis(at))}
+    doc = await db[OBSERVATION_COLLECTION].find_one(filt, {"_id": 0, "points": 0}, sort=[("window_start", DESCENDING)])
+    if not doc or (at is not None and doc["window_end"] <= timeseries.from_millis(timeseries.to_millis(at))):
+        raise LookupError("Observation layer not found")
+    terrain = await db.terrain.find_one(
+        {"project_id": project_id}, {"_id": 0, "elevation_data.transform": 1, "elevation_data.bounds": 1}
+    )
+    elevation = (terrain or {}).get("elevation_data") or {}
+    raster = _unpack(doc)
+    return {
+        "project_id": project_id,
+        "property": prop,
+        "window_start": doc["window_start"].isoformat() + "Z",
+        "window_end": doc["window_end"].isoformat() + "Z",
+        "method": doc.get("method"),
+        "version": doc.get("version"),
+        "transform": elevation.get("transform"),
+        "bounds": elevation.get("bounds"),
+        "grid": np.where(np.isnan(raster), None, raster).tolist(),
+    }
@@ -0,0 +1,197 @@
+"""
+Overview pyramid service.
+
+Each stored layer gets a power-of-two pyramid at ETL time so clients can fetch a
+coarse preview before the full grid. Level n has 2**n x 2**n source cells per
+cell: continuous layers (DEM) use the block mean, categorical layers (soil,
+land cover) use the block mode. Levels are built iteratively with vectorized
+2x2 block reductions.
+
+Level grids live in their own collection (one document per project, layer and
+level) so the terrain document only carries a small per-layer summary under
+overview_levels.<layer>; full-grid reads never drag the pyramid along and the
+terrain document stays well below Mongo's document size limit.
+"""
+
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger("landos.analytics")
+
+# Stop once the coarsest level fits in this many cells per side.
+OVERVIEW_MIN_SIZE = 16
+OVERVIEW_MAX_LEVELS = 12
+OVERVIEW_COLLECTION = "overviews"
+INDEXES = {
+    OVERVIEW_COLLECTION: [([("project_id", 1), ("layer", 1), ("level", 1)], {"unique": True})],
+}
+SUMMARY_KEYS = ("level", "factor", "rows", "cols")
+DEM_PRECISION = 3
+
+GRID_KEYS = {"dem": "heightmap", "soil": "grid", "land_cover": "grid"}
+CATEGORICAL_LAYERS = {"soil", "land_cover"}
+
+_PAD = -(2 ** 31)
+
+
+def _pad_even(arr: np.ndarray, value) -> np.ndarray:
+    rows, cols = arr.shape
+    pad_r, pad_c = rows % 2, cols % 2
+    if not pad_r and not pad_c:
+        return arr
+    return np.pad(arr, ((0, pad_r), (0, pad_c)), mode="constant", constant_values=value)
+
+
+def _blocks(arr: np.ndarray) -> np.ndarray:
+    """Reshape (2R, 2C) -> (R, C, 4) so each 2x2 block is the last axis."""
+    rows, cols = arr.shape
+    return arr.reshape(rows // 2, 2, cols // 2, 2).swapaxes(1, 2).reshape(rows // 2, cols // 2, 4)
+
+
+def _reduce_sum(arr: np.ndarray) -> np.ndarray:
+    return _blocks(_pad_even(arr, 0)).sum(axis=-1)
+
+
+def _reduce_mode(arr: np.ndarray) -> np.ndarray:
+    blocks = _blocks(_pad_even(arr, _PAD))
+    counts = (blocks[..., :, None] == blocks[..., None, :]).sum(axis=-1)
+    counts = np.where(blocks == _PAD, -1, counts)
+    pick = counts.argmax(axis=-1)
+    return np.take_along_axis(blocks, pick[..., None], axis=-1)[..., 0]
+
+
+def _level_transform(transform, factor: int) -> list:
+    a, b, c, d, e, f = list(transform)[:6]
+    return [a * factor, b, c, d, e * factor, f, 0.0, 0.0, 1.0]
+
+
+def _level_bounds(transform: list, rows: int, cols: int) -> dict:
+    a, _, c, _, e, f = transform[:6]
+    xs = (c, c + a * cols)
+    ys = (f, f + e * rows)
+    return {"left": min(xs), "right": max(xs), "bottom": min(ys), "top": max(ys)}
+
+
+def build_pyramid(grid, transform, categorical: bool) -> List[Dict]:
+    """
+    Return overview levels 1..n for a 2D grid (level 0 is the stored grid itself).
+    """
+    if not grid or not transform:
+        return []
+    if categorical:
+        current = np.asarray(grid, dtype=np.int64)
+    else:
+        values = np.asarray(grid, dtype=float)
+        total = values
+        count = np.ones(values.shape, dtype=np.int64)
+    shape = current.shape if categorical else values.shape
+    levels: List[Dict] = []
+    level = 0
+    while max(shape) > OVERVIEW_MIN_SIZE and level < OVERVIEW_MAX_LEVELS:
+        level += 1
+        factor = 2 ** level
+        if categorical:
+            current = _reduce_mode(current)
+            out = current.tolist()
+            shape = current.shape
+        else:
+            total = _reduce_sum(total)
+            count = _reduce_sum(count)
+            shape = total.shape
+            out = np.round(total / count, DEM_PRECISION).tolist()
+        level_transform = _level_transform(transform, factor)
+        levels.append(
+            {
+                "level": level,
+                "factor": factor,
+                "rows": int(shape[0]),
+                "cols": int(shape[1]),
+                "grid": out,
+                "transform": level_transform,
+                "bounds": _level_bounds(level_transform, int(shape[0]), int(shape[1])),
+            }
+        )
+    logger.info("Overview pyramid built (levels=%s, categorical=%s)", len(levels), categorical)
+    return levels
+
+
+def build_layer_pyramid(layer: str, layer_doc: dict) -> List[Dict]:
+    """Build the pyramid for a stored layer document (dem, soil or land_cover)."""
+    grid = (layer_doc or {}).get(GRID_KEYS[layer])
+    return build_pyramid(grid, (layer_doc or {}).get("transform"), layer in CATEGORICAL_LAYERS)
+
+
+def level_summary(levels: List[Dict]) -> List[Dict]:
+    """Grid-free description of a pyramid, stored on the terrain document."""
+    return [{key: lvl[key] for key in SUMMARY_KEYS} for lvl in levels or []]
+
+
+async def store_pyramid(db, project_id: str, layer: str, levels: List[Dict]) -> List[Dict]:
+    """
+    Replace the stored levels of a layer and return their summary.
+    Best effort: on failure the layer is served without overviews (empty summary).
+    """
+    try:
+        coll = db[OVERVIEW_COLLECTION]
+        await coll.delete_many({"project_id": project_id, "layer": layer})
+        if levels:
+            await coll.insert_many([{"project_id": project_id, "layer": layer, **lvl} for lvl in levels])
+    except Exception:
+        logger.exception("Overview storage failed for project %s layer %s", project_id, layer)
+        return []
+    return level_summary(levels)
+
+
+async def load_level(db, project_id: str, layer: str, level: int) -> Dict | None:
+    """Fetch one stored overview level (grid, transform and bounds)."""
+    return await db[OVERVIEW_COLLECTION].find_one(
+        {"project_id": project_id, "layer": layer, "level": level}, {"_id": 0, "project_id": 0, "layer": 0}
+    )
+
+
+def reduce_mask(mask: np.ndarray, level: int) -> np.ndarray:
+    """Coverage mask at an overview level: a cell is covered if any of its source cells is."""
+    current = np.asarray(mask, dtype=np.int64)
+    for _ in range(level):
+        current = _reduce_sum(current)
+    return current > 0
+
+
+def select_level(rows: int, cols: int, pyramid: List[Dict], level: int | None = None, max_cells: int | None = None) -> int:
+    """
+    Resolve the pyramid level to serve. An explicit level is clamped to what is
+    available; max_cells picks the finest level whose cell count fits.
+    """
+    available = [0] + [lvl["level"] for lvl in pyramid or []]
+    if level is not None:
+        if level < 0:
+            raise ValueError("level must be >= 0")
+        return min(level, available[-1])
+    if max_cells is not None:
+        if max_cells < 1:
+            raise ValueError("max_cells must be >= 1")
+        if rows * cols <= max_cells:
+            return 0
+        for lvl in pyramid or []:
+            if lvl["rows"] * lvl["cols"] <= max_cells:
+                return lvl["level"]
+        return available[-1]
+    return 0
+
+
+def layer_at_level(layer: str, layer_doc: dict, pyramid: List[Dict], level: int) -> dict:
+    """Return a copy of the layer document with its grid swapped for the given overview level."""
+    if not level:
+        return layer_doc
+    match = next((lvl for lvl in pyramid or [] if lvl["level"] == level), None)
+    if match is None:
+        return layer_doc
+    view = dict(layer_doc)
+    view[GRID_KEYS[layer]] = match["grid"]
+    view["transform"] = match["transform"]
+    view["bounds"] = match["bounds"]
+    view["level"] = match["level"]
+    view["factor"] = match["factor"]
+    return view
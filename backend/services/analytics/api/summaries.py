@@ -0,0 +1,122 @@
+"""
+Materialized project summaries.
+
+Every layer write refreshes a compact per-project record in the
+project_summaries collection: per-layer status, version and stats (elevation
+range for the DEM, class histogram for categorical layers), the project bbox
+and a thumbnail-scale DEM. Project listings read these with one indexed query
+instead of loading terrain documents.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api.grid import CATEGORICAL_LAYERS, LAYER_SOURCES
+
+logger = logging.getLogger("landos.analytics")
+
+SUMMARY_COLLECTION = "project_summaries"
+THUMBNAIL_SIZE = 32
+TOP_CLASSES = 8
+
+INDEXES = {
+    SUMMARY_COLLECTION: [([("project_id", 1)], {"name": "project_id", "unique": True})],
+}
+
+
+def elevation_stats(grid, mask: Optional[np.ndarray] = None) -> dict:
+    arr = np.asarray(grid, dtype=float)
+    if mask is not None and mask.shape == arr.shape:
+        arr = arr[mask]
+    arr = arr[np.isfinite(arr)]
+    if not arr.size:
+        return {}
+    return {"min": round(float(arr.min()), 2), "max": round(float(arr.max()), 2), "mean": round(float(arr.mean()), 2)}
+
+
+def class_histogram(layer_doc: dict, mask: Optional[np.ndarray] = None) -> dict:
+    """Share of each class (largest first, TOP_CLASSES kept); 0 is nodata."""
+    arr = np.asarray(layer_doc.get("grid") or [], dtype=np.int64)
+    if mask is not None and mask.shape == arr.shape:
+        arr = arr[mask]
+    arr = arr[arr != 0]
+    if not arr.size:
+        return {}
+    codes, counts = np.unique(arr, return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:TOP_CLASSES]
+    index_map = layer_doc.get("index_map") or {}
+    units = layer_doc.get("units") or {}
+    classes = []
+    for code, count in zip(codes[order].tolist(), counts[order].tolist()):
+        key = str(index_map.get(str(code), code))
+        unit = units.get(key) or {}
+        classes.append({"code": code, "name": unit.get("muname") or unit.get("name") or key,
+                        "share": round(count / arr.size, 4)})
+    return {"dominant": classes[0]["name"], "classes": classes}
+
+
+def thumbnail(grid, size: int = THUMBNAIL_SIZE) -> list:
+    """Block-mean the grid down to at most size x size cells (None for nodata)."""
+    arr = np.asarray(grid, dtype=float)
+    if arr.ndim != 2 or not arr.size:
+        return []
+    factor = max(1, int(np.ceil(max(arr.shape) / size)))
+    rows, cols = -(-arr.shape[0] // factor) * factor, -(-arr.shape[1] // factor) * factor
+    padded = np.full((rows, cols), np.nan)
+    padded[: arr.shape[0], : arr.shape[1]] = arr
+    blocks = padded.reshape(rows // factor, factor, cols // factor, factor)
+    valid = np.isfinite(blocks).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore"):
+        means = np.nansum(blocks, axis=(1, 3)) / valid
+    return np.where(valid > 0, np.round(means, 1), None).tolist()
+
+
+def layer_summary(layer: str, layer_doc: dict, mask: Optional[np.ndarray] = None) -> dict:
+    _, grid_key = LAYER_SOURCES[layer]
+    if not (layer_doc or {}).get(grid_key):
+        return {}
+    if layer in CATEGORICAL_LAYERS:
+        return class_histogram(layer_doc, mask)
+    return elevation_stats(layer_doc[grid_key], mask)
+
+
+async def update_summary(db, project_id: str, layer: str, layer_doc: Optional[dict] = None,
+                         stamp: Optional[dict] = None, status: Optional[dict] = None,
+                         mask: Optional[np.ndarray] = None) -> None:
+    """
+    Refresh one layer's entry of the project summary. Best effort: a summary
+    failure must not fail the layer ETL.
+    """
+    try:
+        now = datetime.utcnow()
+        entry = {
+            "status": (status or {}).get("status"),
+            "version": (stamp or {}).get("version"),
+            "updated_at": now,
+            **layer_summary(layer, layer_doc or {}, mask),
+        }
+        fields = {"project_id": project_id, f"layers.{layer}": entry, "updated_at": now}
+        bounds = (layer_doc or {}).get("bounds")
+        if layer == "dem" and bounds:
+            fields["bbox"] = [bounds["left"], bounds["bottom"], bounds["right"], bounds["top"]]
+            fields["thumbnail"] = thumbnail(layer_doc.get("heightmap"))
+        await db[SUMMARY_COLLECTION].update_one({"project_id": project_id}, {"$set": fields}, upsert=True)
+    except Exception:
+        logger.exception("Project summary update failed for project %s layer %s", project_id, layer)
+
+
+async def load_summaries(project_ids: Iterable[str]) -> Dict[str, dict]:
+    """Summaries keyed by project_id for the given projects (missing ones are omitted)."""
+    ids = list(project_ids)
+    if not ids:
+        return {}
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+    cursor = db[SUMMARY_COLLECTION].find({"project_id": {"$in": ids}}, {"_id": 0})
+    return {doc.pop("project_id"): doc async for doc in cursor}
+
@@ -0,0 +1,272 @@
+"""
+XYZ tile service for project layers.
+
+Cuts fixed-size Web Mercator tiles (z/x/y) out of a stored EPSG:4326 layer on
+demand. Only the rows covering the tile are read (grid.read_window on the base
+grid, or on the overview level that best matches the zoom), and rendered
+tiles are cached in-process keyed by layer version so a layer rewrite never
+serves stale tiles. The cache is bounded by total bytes (TILE_CACHE_MAX_BYTES
+per worker). Layer versions are also remembered for TILE_VERSION_TTL seconds so
+conditional requests can be answered without touching Mongo or rendering.
+
+Formats:
+- "bin": raw little-endian array (float32 for DEM with NaN nodata, int32 for
+  categorical layers with 0 nodata), TILE_SIZE x TILE_SIZE, row-major.
+- "png": colorized RGBA PNG with transparent nodata.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import struct
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.platform import metrics
+from backend.services.analytics import config
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import grid
+from backend.services.analytics.api.grid import CATEGORICAL_LAYERS, LAYER_SOURCES
+
+logger = logging.getLogger("landos.analytics")
+
+TILE_SIZE = 256
+MAX_ZOOM = 24
+TILE_CACHE_MAX_BYTES = config.TILE_CACHE_MAX_BYTES
+TILE_VERSION_TTL = config.TILE_VERSION_TTL
+TILE_FORMATS = {"bin": "application/octet-stream", "png": "image/png"}
+
+# Elevation ramp (fraction of range -> RGB)
+DEM_RAMP = [
+    (0.0, (38, 115, 77)),
+    (0.35, (145, 191, 82)),
+    (0.65, (222, 196, 120)),
+    (0.85, (163, 117, 82)),
+    (1.0, (245, 245, 245)),
+]
+
+_tile_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_tile_cache_bytes = 0
+# (project_id, layer) -> (version, monotonic time it was read)
+_versions: dict = {}
+
+
+def layer_version(terrain: dict, layer: str) -> str:
+    """Recorded content version of the layer, falling back to a hash of its ETL stamp."""
+    recorded = (terrain.get("layer_versions") or {}).get(layer) or {}
+    if recorded.get("version"):
+        return recorded["version"]
+    meta = (terrain.get("etl_layers") or {}).get(layer) or {}
+    stamp = [layer, meta.get("updated_at"), meta.get("status")]
+    return hashlib.sha1(json.dumps(stamp, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _remember_version(project_id: str, layer: str, version: str) -> None:
+    _versions[(project_id, layer)] = (version, time.monotonic())
+
+
+async def current_version(project_id: str, layer: str) -> str:
+    """
+    Current version of a layer for conditional tile requests. Served from the
+    in-process version memo when fresh, otherwise from a tiny projected read.
+    """
+    if layer not in LAYER_SOURCES:
+        raise LookupError(f"Unknown layer '{layer}'")
+    memo = _versions.get((project_id, layer))
+    if memo and time.monotonic() - memo[1] < TILE_VERSION_TTL:
+        return memo[0]
+    if analytics_db.client is None:
+        analytics_db.connect()
+    meta = await analytics_db.get_db().terrain.find_one(
+        {"project_id": project_id}, {"_id": 0, f"etl_layers.{layer}": 1, f"layer_versions.{layer}": 1}
+    )
+    if not meta:
+        raise LookupError("Grid not found")
+    version = layer_version(meta, layer)
+    _remember_version(project_id, layer, version)
+    return version
+
+
+def _cache_put(key: tuple, tile: dict) -> None:
+    global _tile_cache_bytes
+    size = len(tile["content"])
+    if size > TILE_CACHE_MAX_BYTES:
+        return
+    previous = _tile_cache.pop(key, None)
+    if previous is not None:
+        _tile_cache_bytes -= len(previous["content"])
+    _tile_cache[key] = tile
+    _tile_cache_bytes += size
+    while _tile_cache_bytes > TILE_CACHE_MAX_BYTES:
+        _, evicted = _tile_cache.popitem(last=False)
+        _tile_cache_bytes -= len(evicted["content"])
+
+
+def clear_cache() -> None:
+    global _tile_cache_bytes
+    _tile_cache.clear()
+    _tile_cache_bytes = 0
+    _versions.clear()
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """Return (west, south, east, north) in degrees for an XYZ tile."""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def _pixel_centers(z: int, x: int, y: int, size: int):
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    lons = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return lons, lats
+
+
+def choose_level(cell_width: float, z: int, levels: list) -> dict | None:
+    """Pick the coarsest overview whose cells are still no larger than a tile pixel."""
+    pixel = 360.0 / (2 ** z * TILE_SIZE)
+    best = None
+    for lvl in levels or []:
+        if cell_width * lvl["factor"] <= pixel:
+            best = lvl
+    return best
+
+
+async def _read_metadata(db, project_id: str, layer: str):
+    doc_key, _ = LAYER_SOURCES[layer]
+    projection = {
+        "_id": 0,
+        "etl_layers": 1,
+        f"layer_versions.{layer}": 1,
+        f"{doc_key}.transform": 1,
+        f"{doc_key}.bounds": 1,
+        f"{doc_key}.min_elevation": 1,
+        f"{doc_key}.max_elevation": 1,
+        f"overview_levels.{layer}": 1,
+    }
+    return await db.terrain.find_one({"project_id": project_id}, projection)
+
+
+def _encode_png(rgba: np.ndarray) -> bytes:
+    height, width, _ = rgba.shape
+    raw = b"".join(b"\x00" + rgba[r].tobytes() for r in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def colorize(values: np.ndarray, valid: np.ndarray, layer: str, vmin=None, vmax=None) -> np.ndarray:
+    """Map tile values to RGBA; categorical codes get a stable hashed palette."""
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    if layer in CATEGORICAL_LAYERS:
+        codes = values.astype(np.uint64)
+        hashed = (codes * np.uint64(2654435761)) & np.uint64(0xFFFFFF)
+        rgba[..., 0] = (hashed >> np.uint64(16)) & np.uint64(255)
+        rgba[..., 1] = (hashed >> np.uint64(8)) & np.uint64(255)
+        rgba[..., 2] = hashed & np.uint64(255)
+    else:
+        finite = values[valid]
+        lo = vmin if vmin is not None else (float(finite.min()) if finite.size else 0.0)
+        hi = vmax if vmax is not None else (float(finite.max()) if finite.size else 1.0)
+        frac = np.clip((np.nan_to_num(values) - lo) / ((hi - lo) or 1.0), 0, 1)
+        stops = [s for s, _ in DEM_RAMP]
+        for channel in range(3):
+            rgba[..., channel] = np.interp(frac, stops, [c[channel] for _, c in DEM_RAMP]).astype(np.uint8)
+    rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba
+
+
+async def render_tile(project_id: str, layer: str, z: int, x: int, y: int, fmt: str = "bin") -> dict:
+    """
+    Return {"content", "media_type", "version", "level", "dtype"} for one tile.
+    Raises LookupError for unknown projects/layers and ValueError for bad tile coordinates.
+    """
+    if layer not in LAYER_SOURCES:
+        raise LookupError(f"Unknown layer '{layer}'")
+    if fmt not in TILE_FORMATS:
+        raise ValueError(f"format must be one of {sorted(TILE_FORMATS)}")
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise ValueError("tile coordinates out of range")
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+
+    meta = await _read_metadata(db, project_id, layer)
+    if not meta:
+        raise LookupError("Grid not found")
+    doc_key, _ = LAYER_SOURCES[layer]
+    layer_doc = meta.get(doc_key) or {}
+    transform = layer_doc.get("transform")
+    if not transform:
+        raise LookupError("Requested layer not found")
+    version = layer_version(meta, layer)
+    _remember_version(project_id, layer, version)
+    key = (project_id, layer, version, z, x, y, fmt)
+    cached = _tile_cache.get(key)
+    metrics.record_cache("tiles", cached is not None)
+    if cached is not None:
+        _tile_cache.move_to_end(key)
+        return cached
+
+    rows, cols = grid.grid_shape(layer_doc)
+    overview = choose_level(abs(transform[0]), z, (meta.get("overview_levels") or {}).get(layer))
+    level = overview["level"] if overview else 0
+    factor = overview["factor"] if overview else 1
+    if overview:
+        rows, cols = overview["rows"], overview["cols"]
+    a, _, c, _, e, f = list(transform)[:6]
+    a, e = a * factor, e * factor
+
+    lons, lats = _pixel_centers(z, x, y, TILE_SIZE)
+    col_idx = np.floor((lons - c) / a).astype(np.int64)
+    row_idx = np.floor((lats - f) / e).astype(np.int64)
+    row_ok = (row_idx >= 0) & (row_idx < rows)
+    col_ok = (col_idx >= 0) & (col_idx < cols)
+
+    categorical = layer in CATEGORICAL_LAYERS
+    dtype = np.int32 if categorical else np.float32
+    nodata = 0 if categorical else np.nan
+    values = np.full((TILE_SIZE, TILE_SIZE), nodata, dtype=dtype)
+    valid = np.zeros((TILE_SIZE, TILE_SIZE), dtype=bool)
+    if row_ok.any() and col_ok.any():
+        r0 = int(row_idx[row_ok].min())
+        r1 = int(row_idx[row_ok].max()) + 1
+        c0 = int(col_idx[col_ok].min())
+        c1 = int(col_idx[col_ok].max()) + 1
+        window = await grid.read_window(db, project_id, layer, r0, r1 - r0, c0, c1 - c0, level=level)
+        window = np.asarray(window, dtype=dtype)
+        if window.ndim == 2 and window.shape[0] and window.shape[1]:
+            rr = np.clip(row_idx - r0, 0, window.shape[0] - 1)
+            cc = np.clip(col_idx - c0, 0, window.shape[1] - 1)
+            valid = row_ok[:, None] & col_ok[None, :]
+            values = np.where(valid, window[rr[:, None], cc[None, :]], nodata).astype(dtype)
+            if categorical:
+                valid &= values != 0
+
+    if fmt == "png":
+        rgba = colorize(values, valid, layer, layer_doc.get("min_elevation"), layer_doc.get("max_elevation"))
+        content = _encode_png(rgba)
+    else:
+        content = values.astype(values.dtype.newbyteorder("<")).tobytes()
+    tile = {
+        "content": content,
+        "media_type": TILE_FORMATS[fmt],
+        "version": version,
+        "level": level,
+        "dtype": np.dtype(dtype).name,
+    }
+    _cache_put(key, tile)
+    logger.info("Tile rendered project=%s layer=%s z=%s x=%s y=%s level=%s fmt=%s", project_id, layer, z, x, y, level, fmt)
+    return tile
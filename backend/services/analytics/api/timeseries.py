@@ -0,0 +1,179 @@
+"""
+Bucketed time-series storage for field property values.
+
+Readings are grouped into one document per (project, property, time window):
+the bucket keeps columnar arrays of timestamps (epoch milliseconds) and values
+plus running count/min/max/sum, so a write touches one document per window
+instead of one per reading, and range queries only scan overlapping buckets.
+A window holds at most BUCKET_MAX_READINGS readings; once a bucket is full the
+upsert no longer matches it and a new bucket for the same window is started,
+which keeps documents far below Mongo's 16 MB limit at any sensor rate.
+
+Hourly and daily rollups (count/sum/min/max per property and period) live in
+ROLLUP_COLLECTION and are folded in incrementally as buckets are written. TTL
+indexes expire raw buckets after TIMESERIES_RAW_RETENTION_DAYS and hourly
+rollups after TIMESERIES_HOURLY_RETENTION_DAYS; daily rollups are kept.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from backend.services.analytics import config
+
+logger = logging.getLogger("landos.analytics")
+
+BUCKET_COLLECTION = "timeseries"
+BUCKET_SECONDS = 3600
+BUCKET_MS = BUCKET_SECONDS * 1000
+BUCKET_MAX_READINGS = 10000
+
+# Accepted reading times: 1900-01-01 .. 9999-12-31 (UTC, epoch ms).
+MIN_MS = -2208988800000
+MAX_MS = 253402300799999
+
+ROLLUP_COLLECTION = "timeseries_rollups"
+# tier -> period length in ms (ordered fine to coarse)
+ROLLUP_TIERS = {"hour": 3600 * 1000, "day": 86400 * 1000}
+DAY_SECONDS = 86400
+
+
+def _ttl(days: int) -> dict:
+    return {"expireAfterSeconds": days * DAY_SECONDS} if days > 0 else {}
+
+
+INDEXES = {
+    BUCKET_COLLECTION: [
+        ([("project_id", 1), ("property", 1), ("bucket_start", 1)], {"name": "project_property_bucket"}),
+        ([("bucket_end", 1)], {"name": "raw_retention", **_ttl(config.TIMESERIES_RAW_RETENTION_DAYS)}),
+    ],
+    ROLLUP_COLLECTION: [
+        ([("project_id", 1), ("property", 1), ("tier", 1), ("period_start", 1)], {"name": "project_property_period", "unique": True}),
+        (
+            [("period_end", 1)],
+            {
+                "name": "hourly_retention",
+                "partialFilterExpression": {"tier": "hour"},
+                **_ttl(config.TIMESERIES_HOURLY_RETENTION_DAYS),
+            },
+        ),
+    ],
+}
+
+
+def to_millis(value) -> int:
+    """Parse an ISO timestamp, datetime or epoch seconds into UTC epoch milliseconds."""
+    if isinstance(value, bool) or value is None:
+        raise ValueError("time is required")
+    try:
+        if isinstance(value, (int, float)):
+            ms = int(round(float(value) * 1000))
+        else:
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if not isinstance(value, datetime):
+                raise ValueError
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            ms = int(round(value.timestamp() * 1000))
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"invalid time '{value}'")
+    if not MIN_MS <= ms <= MAX_MS:
+        raise ValueError(f"time '{value}' is out of range")
+    return ms
+
+
+def from_millis(ms: int) -> datetime:
+    """Naive UTC datetime for epoch milliseconds (matches how pymongo returns dates)."""
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def bucket_start(ms: int, bucket_ms: int = BUCKET_MS) -> int:
+    return ms - (ms % bucket_ms)
+
+
+def bucket_filter(project_id: str, prop: str, start_ms: int) -> dict:
+    return {"project_id": project_id, "property": prop, "bucket_start": from_millis(start_ms)}
+
+
+def bucket_update(project_id: str, prop: str, start_ms: int, times: list, values: list,
+                  write_id=None) -> UpdateOne:
+    """
+    Upsert appending readings to a bucket of the window that still has room for
+    them and folding them into its running aggregates. At most BUCKET_MAX_READINGS
+    readings may be passed at once. A write_id is recorded in the bucket's
+    "writes" so a write whose outcome is unknown can be looked up.
+    """
+    filt = bucket_filter(project_id, prop, start_ms)
+    filt["count"] = {"$lte": BUCKET_MAX_READINGS - len(values)}
+    update = {
+        "$push": {"times": {"$each": times}, "values": {"$each": values}},
+        "$inc": {"count": len(values), "sum": sum(values)},
+        "$min": {"min": min(values), "first": min(times)},
+        "$max": {"max": max(values), "last": max(times)},
+        "$setOnInsert": {"bucket_end": from_millis(start_ms + BUCKET_MS)},
+    }
+    if write_id is not None:
+        update["$addToSet"] = {"writes": write_id}
+    return UpdateOne(filt, update, upsert=True)
+
+
+def range_filter(project_id: str, properties: list, start_ms: Optional[int], end_ms: Optional[int],
+                 bucket_ms: int = BUCKET_MS) -> dict:
+    """Match only the buckets whose window overlaps [start_ms, end_ms]."""
+    filt: dict = {"project_id": project_id, "property": {"$in": list(properties)}}
+    window: dict = {}
+    if start_ms is not None:
+        window["$gte"] = from_millis(bucket_start(start_ms, bucket_ms))
+    if end_ms is not None:
+        window["$lte"] = from_millis(end_ms)
+    if window:
+        filt["bucket_start"] = window
+    return filt
+
+
+def rollup_updates(project_id: str, prop: str, times: list, values: list) -> list:
+    """
+    Upserts folding readings of one property into its hourly and daily rollups.
+    Readings are grouped per period so each rollup document gets one update.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    ops = []
+    for tier, period_ms in ROLLUP_TIERS.items():
+        starts, group = np.unique(times - (times % period_ms), return_inverse=True)
+        counts = np.bincount(group, minlength=len(starts))
+        sums = np.bincount(group, weights=values, minlength=len(starts))
+        lows = np.full(len(starts), np.inf)
+        highs = np.full(len(starts), -np.inf)
+        np.minimum.at(lows, group, values)
+        np.maximum.at(highs, group, values)
+        for start_ms, count, total, low, high in zip(
+            starts.tolist(), counts.tolist(), sums.tolist(), lows.tolist(), highs.tolist()
+        ):
+            ops.append(
+                UpdateOne(
+                    {"project_id": project_id, "property": prop, "tier": tier, "period_start": from_millis(start_ms)},
+                    {
+                        "$inc": {"count": count, "sum": total},
+                        "$min": {"min": low},
+                        "$max": {"max": high},
+                        "$setOnInsert": {"period_end": from_millis(start_ms + period_ms)},
+                    },
+                    upsert=True,
+                )
+            )
+    return ops
+
+
+def rollup_filter(project_id: str, properties: list, tier: str, start_ms: Optional[int],
+                  end_ms: Optional[int]) -> dict:
+    """Match the rollup periods of a tier that overlap [start_ms, end_ms]."""
+    filt = range_filter(project_id, properties, start_ms, end_ms, ROLLUP_TIERS[tier])
+    filt["tier"] = tier
+    if "bucket_start" in filt:
+        filt["period_start"] = filt.pop("bucket_start")
+    return filt
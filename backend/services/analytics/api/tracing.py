@@ -0,0 +1,191 @@
+"""
+Lightweight ETL stage tracing.
+
+A layer ETL runs inside trace(layer, project_id); each stage inside it is a
+span() recording its duration plus optional attributes (bytes moved, cache
+hit/miss, row counts). store_timings() saves a compact breakdown under
+etl_layers.<layer>.timings on the terrain document. When
+ANALYTICS_ETL_TRACE_SINK names a file, every finished trace is also appended
+to it as one OTLP/JSON line (root span per layer ETL, one child per stage).
+
+Spans outside an active trace are no-ops, so the helpers can be called from
+code that also runs on its own.
+"""
+
+import functools
+import json
+import logging
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from backend.services.analytics import config
+
+logger = logging.getLogger("landos.analytics")
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("etl_trace", default=None)
+
+
+class Trace:
+    def __init__(self, layer: str, project_id: str):
+        self.layer = layer
+        self.project_id = project_id
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self.spans: list = []
+        self._open: list = []
+
+    def timings(self) -> dict:
+        """{"total_ms", "stages": {name: {"ms", ...attributes}}}; repeated stages are summed."""
+        end = self.end_ns or time.time_ns()
+        stages: dict = {}
+        for span in self.spans:
+            entry = stages.setdefault(span["name"], {"ms": 0.0})
+            entry["ms"] = round(entry["ms"] + (span["end_ns"] - span["start_ns"]) / 1e6, 2)
+            for key, value in span["attributes"].items():
+                entry[key] = entry.get(key, 0) + value if key == "bytes" else value
+        return {"total_ms": round((end - self.start_ns) / 1e6, 2), "stages": stages}
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def trace(layer: str, project_id: str):
+    """Collect the spans of one layer ETL; exported to the sink when it ends."""
+    active = Trace(layer, project_id)
+    token = _current.set(active)
+    try:
+        yield active
+    except BaseException as exc:
+        active.error = str(exc) or type(exc).__name__
+        raise
+    finally:
+        active.end_ns = time.time_ns()
+        _current.reset(token)
+        export(active)
+
+
+def traced(layer: str):
+    """Run an ETL coroutine taking the project dict as first argument inside trace()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(project, *args, **kwargs):
+            with trace(layer, (project or {}).get("project_id")):
+                return await fn(project, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time one stage of the active trace; yields its attribute dict for the caller to fill."""
+    active = _current.get()
+    if active is None:
+        yield {}
+        return
+    record = {"name": name, "span_id": secrets.token_hex(8), "start_ns": time.time_ns(), "attributes": dict(attributes)}
+    active._open.append(record)
+    try:
+        yield record["attributes"]
+    except BaseException as exc:
+        record["error"] = str(exc) or type(exc).__name__
+        raise
+    finally:
+        # Stages of one trace may overlap (asyncio.gather), so close this record, not the last one opened.
+        active._open.remove(record)
+        record["end_ns"] = time.time_ns()
+        active.spans.append(record)
+
+
+def annotate(**attributes) -> None:
+    """Add attributes to the innermost open span (e.g. cache="hit" from a fetch helper)."""
+    active = _current.get()
+    if active is not None and active._open:
+        active._open[-1]["attributes"].update(attributes)
+
+
+async def store_timings(db, project_id: str, active: Optional[Trace], status: Optional[dict] = None) -> None:
+    """
+    Save the trace's timing breakdown under etl_layers.<layer>.timings. status is
+    the layer's in-memory status entry, updated too so later whole-map writes keep
+    it. Best effort: a failure here must not fail the ETL.
+    """
+    if active is None:
+        return
+    timings = active.timings()
+    if status is not None:
+        status["timings"] = timings
+    try:
+        await db.terrain.update_one(
+            {"project_id": project_id}, {"$set": {f"etl_layers.{active.layer}.timings": timings}}
+        )
+    except Exception:
+        logger.exception("Storing ETL timings failed for project %s layer %s", project_id, active.layer)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _otlp_span(active: Trace, name: str, span_id: str, parent: Optional[str], start: int, end: int,
+               attributes: dict, error: Optional[str]) -> dict:
+    item = {
+        "traceId": active.trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(end),
+        "attributes": [_attribute(k, v) for k, v in attributes.items()],
+        "status": {"code": 2, "message": error} if error else {"code": 1},
+    }
+    if parent:
+        item["parentSpanId"] = parent
+    return item
+
+
+def to_otlp(active: Trace) -> dict:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+    root = _otlp_span(
+        active, f"etl.{active.layer}", active.span_id, None, active.start_ns, active.end_ns or time.time_ns(),
+        {"etl.layer": active.layer, "project.id": active.project_id or ""}, active.error,
+    )
+    children = [
+        _otlp_span(active, s["name"], s["span_id"], active.span_id, s["start_ns"], s["end_ns"],
+                   s["attributes"], s.get("error"))
+        for s in active.spans
+    ]
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", "landos-analytics")]},
+            "scopeSpans": [{"scope": {"name": "landos.etl"}, "spans": [root, *children]}],
+        }]
+    }
+
+
+def export(active: Trace) -> None:
+    """Append the trace to the configured sink file, if any."""
+    sink = config.ETL_TRACE_SINK
+    if not sink:
+        return
+    try:
+        with open(os.path.expanduser(sink), "a") as handle:
+            handle.write(json.dumps(to_otlp(active)) + "\n")
+    except OSError:
+        logger.exception("ETL trace export to %s failed", sink)
@@ -9,23 +9,26 @@ from datetime import datetime
 from pathlib import Path
 import logging
 import httpx
-import rasterio
-from rasterio.io import MemoryFile
-from rasterio.transform import Affine, array_bounds
+from affine import Affine
 import math
 import numpy as np
 from shapely.geometry import shape
 
 from backend.services.analytics.analytics_db_connection import analytics_db
 from backend.services.analytics.api import determine_region
+from backend.services.analytics.api import coverage
+from backend.services.analytics.api import overviews
+from backend.services.analytics.api import diff
+from backend.services.analytics.api import summaries
+from backend.services.analytics.api import tracing
 from backend.services.analytics import terrain
 from backend.services.analytics import config
+from backend.platform import metrics
 
 OPENTOPO_URL = "https://portal.opentopography.org/API/globaldem"
 OPENTOPO_DEM = "SRTMGL3"
 OPENTOPO_TIMEOUT = 180.0
 CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / "dem_cache"
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
 logger = logging.getLogger("landos.analytics")
 
 
@@ -64,7 +67,10 @@ async def _fetch_tiff(geom, project_id: str):
         "API_Key": config.OPENTOPO_API_KEY,
     }
     bbox_key = f"{minx:.4f}_{miny:.4f}_{maxx:.4f}_{maxy:.4f}.tif".replace(".", "_").replace("-", "m")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
     existing = list(CACHE_DIR.glob(f"*_{bbox_key}"))
+    metrics.record_cache("dem_files", bool(existing))
+    tracing.annotate(cache="hit" if existing else "miss")
     if existing:
         cache_path = existing[0]
         logger.info("DEM cache hit for project %s -> %s", project_id, cache_path.name)
@@ -72,14 +78,19 @@ async def _fetch_tiff(geom, project_id: str):
     cache_path = CACHE_DIR / f"dem_{bbox_key}"
     logger.info("DEM fetch start for project %s (url=%s)", project_id, OPENTOPO_URL)
     async with httpx.AsyncClient() as client:
-        resp = await client.get(OPENTOPO_URL, params=params, timeout=OPENTOPO_TIMEOUT)
-        resp.raise_for_status()
+        with metrics.track_fetch("opentopography"):
+            resp = await client.get(OPENTOPO_URL, params=params, timeout=OPENTOPO_TIMEOUT)
+            resp.raise_for_status()
         cache_path.write_bytes(resp.content)
         logger.info("DEM fetched for project %s, saved %s", project_id, cache_path.name)
         return resp.content
 
 
 def _process_tiff(tiff_bytes: bytes, geom_bounds=None):
+    # rasterio (GDAL) is only needed once a DEM is processed; keep it out of API startup.
+    from rasterio.io import MemoryFile
+    from rasterio.transform import array_bounds
+
     with MemoryFile(tiff_bytes) as memfile:
         with memfile.open() as dataset:
             elevation_array = dataset.read(1)
@@ -155,34 +166,33 @@ def _process_tiff(tiff_bytes: bytes, geom_bounds=None):
     }
 
 
-async def trigger_etl(project: dict):
-    """
-    Fetch and store DEM data for the project.
-    """
-    if analytics_db.client is None:
-        analytics_db.connect()
-    db = analytics_db.get_db()
-
-    project_id = project.get("project_id")
-    geometry = project.get("geometry")
-    if not project_id or not geometry:
-        raise ValueError("project_id and geometry are required for ETL")
-
-    logger.info("ETL start for project %s", project_id)
-    geom = _geometry_from_geojson(geometry)
-    region = {}
-    try:
-        region = await determine_region.resolve_region(geom)
-    except Exception as exc:
-        logger.warning("Region resolution failed for project %s: %s", project_id, exc)
-    tiff_bytes = await _fetch_tiff(geom, project_id)
+@metrics.etl_run("dem")
+async def _load_dem(db, project_id: str, geom: dict) -> dict:
+    """Fetch, process and store the project DEM; returns the terrain fields written."""
+    with tracing.span("fetch_dem") as span:
+        tiff_bytes = await _fetch_tiff(geom, project_id)
+        span["bytes"] = len(tiff_bytes)
     geom_bounds = shape(geom).bounds
-    elevation = _process_tiff(tiff_bytes, geom_bounds=geom_bounds)
+    with tracing.span("process_tiff") as span:
+        elevation = _process_tiff(tiff_bytes, geom_bounds=geom_bounds)
+        rows = len(elevation["heightmap"])
+        cols = len(elevation["heightmap"][0]) if rows else 0
+        span["cells"] = rows * cols
     elevation["fetched_at"] = datetime.utcnow()
+    with tracing.span("coverage_mask"):
+        mask = coverage.build_coverage_mask(geom, elevation["transform"], rows, cols)
+    logger.info("Coverage mask built for project %s (%s of %s cells inside polygon)", project_id, int(mask.sum()), rows * cols)
+
+    dem_version = diff.version_stamp("dem", elevation["heightmap"])
+    with tracing.span("overviews"):
+        dem_levels = await overviews.store_pyramid(db, project_id, "dem", overviews.build_layer_pyramid("dem", elevation))
 
     terrain_doc = {
         "project_id": project_id,
         "elevation_data": elevation,
+        "coverage_mask": coverage.pack_mask(mask),
+        "overview_levels.dem": dem_levels,
+        "layer_versions.dem": dem_version,
         "etl_layers": {
             "dem": {
                 "status": "ok",
@@ -191,28 +201,63 @@ async def trigger_etl(project: dict):
         },
     }
 
-    await db.terrain.update_one({"project_id": project_id}, {"$set": terrain_doc}, upsert=True)
-    await db.projects.update_one({"project_id": project_id}, {"$set": {"status": "dem_loaded"}})
+    with tracing.span("mongo_write"):
+        await db.terrain.update_one({"project_id": project_id}, {"$set": terrain_doc}, upsert=True)
+        await diff.record_history(db, project_id, "dem", elevation["heightmap"], dem_version)
+        await summaries.update_summary(
+            db, project_id, "dem", elevation, dem_version, terrain_doc["etl_layers"]["dem"], mask
+        )
+        await db.projects.update_one({"project_id": project_id}, {"$set": {"status": "dem_loaded"}})
     logger.info("DEM stored for project %s", project_id)
+    return terrain_doc
+
+
+async def trigger_etl(project: dict):
+    """
+    Fetch and store DEM data for the project.
+    """
+    if analytics_db.client is None:
+        analytics_db.connect()
+    db = analytics_db.get_db()
+
+    project_id = project.get("project_id")
+    geometry = project.get("geometry")
+    if not project_id or not geometry:
+        raise ValueError("project_id and geometry are required for ETL")
+
+    logger.info("ETL start for project %s", project_id)
+    geom = _geometry_from_geojson(geometry)
+    with tracing.trace("dem", project_id) as dem_trace:
+        region = {}
+        try:
+            with tracing.span("resolve_region"):
+                region = await determine_region.resolve_region(geom)
+        except Exception as exc:
+            logger.warning("Region resolution failed for project %s: %s", project_id, exc)
+        terrain_doc = await _load_dem(db, project_id, geom)
+    await tracing.store_timings(db, project_id, dem_trace, terrain_doc["etl_layers"]["dem"])
     try:
         logger.info("Country ETL start for project %s (country=%s)", project_id, region.get("country"))
         await terrain.run_country_etl(region.get("country"), {"project_id": project_id, "geometry": geom})
         logger.info("Country ETL finished for project %s", project_id)
     except Exception as exc:
         logger.exception("Country ETL failed for project %s: %s", project_id, exc)
+        failed = {"status": "failed", "error": str(exc), "updated_at": datetime.utcnow().isoformat()}
         await db.terrain.update_one(
             {"project_id": project_id},
             {
                 "$set": {
                     "etl_layers": {
                         "dem": terrain_doc["etl_layers"]["dem"],
-                        "soil": {"status": "failed", "error": str(exc), "updated_at": datetime.utcnow().isoformat()},
-                        "land_cover": {"status": "failed", "error": str(exc), "updated_at": datetime.utcnow().isoformat()},
+                        "soil": failed,
+                        "land_cover": failed,
                     }
                 }
             },
             upsert=True,
         )
+        for layer in ("soil", "land_cover"):
+            await summaries.update_summary(db, project_id, layer, status=failed)
         raise
     logger.info("ETL completed for project %s", project_id)
     return {"ok": True}
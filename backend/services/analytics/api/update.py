@@ -1,2 +1,279 @@
-# This is the main entry point for field data provided by the operations engine. 
-# It takes an array of properties with time stamped values and loads them into the DB.
\ No newline at end of file
+"""
+Field data ingest.
+
+Main entry point for field data provided by the operations engine (sensor and
+action results). Accepts batched payloads as JSON, NDJSON streams or Arrow IPC
+streams, flattens them into property/time/value columns, validates the columns
+in vectorized form and hands the accepted readings to the write-behind buffer,
+which stores them in the bucketed time-series store.
+
+Record shapes (JSON array items or NDJSON lines):
+- {"property": str, "values": [{"time": ISO|epoch, "value": number}, ...]}
+- {"property": str, "times": [...], "values": [...]}          (columnar)
+- {"property": str, "time": ISO|epoch, "value": number}        (single reading)
+Arrow streams carry "property", "time" and "value" columns.
+"""
+
+import json
+import logging
+from typing import AsyncIterable, Iterable, List, Tuple
+
+import numpy as np
+
+from backend.services.analytics.api import timeseries
+from backend.services.analytics.api import write_buffer
+
+logger = logging.getLogger("landos.analytics")
+
+NDJSON_BATCH_LINES = 10000
+_NAT = np.iinfo(np.int64).min
+
+
+def _column(value):
+    """A record's times/values column as a list; None when it is not a list."""
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else None
+
+
+def flatten_records(records: Iterable) -> Tuple[list, list, list, int]:
+    """Flatten record shapes into parallel property/time/value lists; counts malformed records."""
+    props: list = []
+    times: list = []
+    values: list = []
+    malformed = 0
+    for rec in records:
+        name = rec.get("property") if isinstance(rec, dict) else None
+        if not name or not isinstance(name, str):
+            column = _column(rec.get("values")) if isinstance(rec, dict) else None
+            malformed += max(1, len(column or []))
+            continue
+        if "times" in rec:
+            col_t, col_v = _column(rec.get("times")), _column(rec.get("values"))
+            if col_t is None or col_v is None or len(col_t) != len(col_v):
+                malformed += max(1, len(col_t or []), len(col_v or []))
+                continue
+            props.extend([name] * len(col_t))
+            times.extend(col_t)
+            values.extend(col_v)
+        elif "values" in rec:
+            column = _column(rec.get("values"))
+            if column is None:
+                malformed += 1
+                continue
+            for reading in column:
+                reading = reading if isinstance(reading, dict) else {}
+                props.append(name)
+                times.append(reading.get("time"))
+                values.append(reading.get("value"))
+        else:
+            props.append(name)
+            times.append(rec.get("time"))
+            values.append(rec.get("value"))
+    return props, times, values, malformed
+
+
+def _safe_millis(value) -> int:
+    try:
+        return timeseries.to_millis(value)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return _NAT
+
+
+def _epoch_millis(raw: list) -> np.ndarray:
+    """Epoch seconds (or datetimes) to epoch ms, _NAT where invalid; bools are not times."""
+    if not any(isinstance(v, (bool, np.bool_)) for v in raw):
+        try:
+            millis = np.asarray(raw, dtype=float) * 1000
+        except (TypeError, ValueError):
+            millis = None
+        if millis is not None and millis.ndim == 1:
+            ok = np.isfinite(millis) & (millis >= timeseries.MIN_MS) & (millis <= timeseries.MAX_MS)
+            ms = np.full(len(raw), _NAT, dtype=np.int64)
+            ms[ok] = np.round(millis[ok]).astype(np.int64)
+            return ms
+    return np.fromiter((_safe_millis(v) for v in raw), dtype=np.int64, count=len(raw))
+
+
+def _iso_millis(raw: list) -> np.ndarray:
+    """ISO strings to epoch ms, _NAT where invalid."""
+    try:
+        text = np.char.rstrip(np.asarray(raw, dtype=str), "Z")
+        # numpy has no timezone support: offset timestamps go through the per-element parser.
+        offset = (np.char.count(text, "+") > 0) | (np.char.count(text, "-") > 2)
+        ms = np.full(len(raw), _NAT, dtype=np.int64)
+        ms[~offset] = text[~offset].astype("datetime64[ms]").astype(np.int64)
+        for idx in np.flatnonzero(offset):
+            ms[idx] = _safe_millis(raw[idx])
+        return ms
+    except (TypeError, ValueError):
+        # Malformed strings: fall back per element.
+        return np.fromiter((_safe_millis(v) for v in raw), dtype=np.int64, count=len(raw))
+
+
+def parse_times(raw: list) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized parse of epoch seconds or ISO strings into epoch ms; returns (ms, valid).
+    Strings and other elements are parsed separately, so a batch may mix both.
+    """
+    if not raw:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+    text = np.fromiter((isinstance(v, str) for v in raw), dtype=bool, count=len(raw))
+    if not text.any():
+        ms = _epoch_millis(raw)
+    elif text.all():
+        ms = _iso_millis(raw)
+    else:
+        ms = np.empty(len(raw), dtype=np.int64)
+        ms[~text] = _epoch_millis([v for v, is_text in zip(raw, text) if not is_text])
+        ms[text] = _iso_millis([v for v, is_text in zip(raw, text) if is_text])
+    ok = (ms != _NAT) & (ms >= timeseries.MIN_MS) & (ms <= timeseries.MAX_MS)
+    return ms, ok
+
+
+def _safe_float(value) -> float:
+    if isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_values(raw: list) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized numeric conversion; returns (values, valid)."""
+    try:
+        vals = np.asarray(raw, dtype=float)
+    except (TypeError, ValueError):
+        vals = np.fromiter((_safe_float(v) for v in raw), dtype=float, count=len(raw))
+    return vals, np.isfinite(vals)
+
+
+def validate_columns(props, times, values) -> dict:
+    """Validate columns and split them into accepted arrays and rejection counts by reason."""
+    props = np.asarray(props, dtype=str) if len(props) else np.empty(0, dtype=str)
+    ms, time_ok = parse_times(times)
+    vals, value_ok = parse_values(values)
+    prop_ok = props != ""
+    ok = prop_ok & time_ok & value_ok
+    return {
+        "props": props[ok],
+        "times": ms[ok],
+        "values": vals[ok],
+        "rejected": {
+            "invalid_property": int((~prop_ok).sum()),
+            "invalid_time": int((prop_ok & ~time_ok).sum()),
+            "invalid_value": int((prop_ok & time_ok & ~value_ok).sum()),
+        },
+    }
+
+
+def _merge_counts(total: dict, part: dict):
+    for key, val in part.items():
+        total[key] = total.get(key, 0) + val
+
+
+async def _accept(project_id: str, props, times, values, malformed: int, counts: dict):
+    checked = validate_columns(props, times, values)
+    await write_buffer.buffer.add(project_id, checked["props"], checked["times"], checked["values"])
+    counts["accepted"] += len(checked["times"])
+    _merge_counts(counts["rejected_reasons"], checked["rejected"])
+    if malformed:
+        _merge_counts(counts["rejected_reasons"], {"malformed": malformed})
+
+
+async def _finish(project_id: str, counts: dict, flush: bool) -> dict:
+    flushed = await write_buffer.buffer.flush() if flush else 0
+    counts["rejected"] = sum(counts["rejected_reasons"].values())
+    logger.info(
+        "Field data ingest project=%s accepted=%s rejected=%s flushed=%s",
+        project_id, counts["accepted"], counts["rejected"], flushed,
+    )
+    return {"project_id": project_id, **counts, "flushed": flushed, "buffer": write_buffer.buffer.snapshot()}
+
+
+def _new_counts() -> dict:
+    return {"accepted": 0, "rejected": 0, "rejected_reasons": {}}
+
+
+def decode_json(body) -> List:
+    """Accept a record list, {"properties": [...]} or a single record."""
+    payload = json.loads(body) if isinstance(body, (bytes, str)) else body
+    if isinstance(payload, dict):
+        payload = payload["properties"] if "properties" in payload else [payload]
+    if not isinstance(payload, list):
+        raise ValueError("payload must be a list of property records")
+    return payload
+
+
+async def ingest(project_id: str, properties, flush: bool = False) -> dict:
+    """Ingest a JSON batch of property records."""
+    try:
+        records = decode_json(properties)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"invalid JSON: {exc}")
+    counts = _new_counts()
+    props, times, values, malformed = flatten_records(records)
+    await _accept(project_id, props, times, values, malformed, counts)
+    return await _finish(project_id, counts, flush)
+
+
+async def ingest_ndjson(project_id: str, chunks: AsyncIterable[bytes], flush: bool = False) -> dict:
+    """Ingest an NDJSON stream incrementally, validating and buffering NDJSON_BATCH_LINES at a time."""
+    counts = _new_counts()
+    records: list = []
+    bad_lines = 0
+    tail = b""
+
+    async def drain():
+        nonlocal records, bad_lines
+        props, times, values, malformed = flatten_records(records)
+        await _accept(project_id, props, times, values, malformed + bad_lines, counts)
+        records, bad_lines = [], 0
+
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                bad_lines += 1
+        if len(records) >= NDJSON_BATCH_LINES:
+            await drain()
+    if tail.strip():
+        try:
+            records.append(json.loads(tail))
+        except json.JSONDecodeError:
+            bad_lines += 1
+    if records or bad_lines:
+        await drain()
+    return await _finish(project_id, counts, flush)
+
+
+async def ingest_arrow(project_id: str, body: bytes, flush: bool = False) -> dict:
+    """Ingest an Arrow IPC stream with property, time and value columns."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Arrow ingest requires pyarrow")
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except pa.ArrowInvalid as exc:
+        raise ValueError(f"invalid Arrow stream: {exc}")
+    missing = {"property", "time", "value"} - set(table.column_names)
+    if missing:
+        raise ValueError(f"Arrow stream is missing columns: {', '.join(sorted(missing))}")
+    props = table.column("property").fill_null("").to_numpy(zero_copy_only=False).astype(str)
+    time_col = table.column("time")
+    if pa.types.is_timestamp(time_col.type):
+        times = time_col.cast(pa.timestamp("ms")).cast(pa.int64()).fill_null(_NAT).to_numpy()
+        times = np.where(times == _NAT, np.nan, times / 1000.0)
+    else:
+        times = time_col.to_pylist()
+    values = table.column("value").to_numpy(zero_copy_only=False)
+    counts = _new_counts()
+    await _accept(project_id, props, list(times), values, 0, counts)
+    return await _finish(project_id, counts, flush)
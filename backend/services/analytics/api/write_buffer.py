@@ -0,0 +1,303 @@
+"""
+Write-behind buffer for field data.
+
+Validated readings are appended in memory and written to the bucketed
+time-series store by a background flusher, either when flush_size readings are
+pending or every flush_interval seconds. Each flush groups readings into
+(project, property, bucket) upserts and sends them in one unordered bulk write.
+
+When pending readings reach max_pending (Mongo is falling behind), add() waits
+until a flush frees space, so producers are slowed down instead of memory
+growing without bound. Bucket writes the server reports as failed are put
+back in the buffer and retried on the next flush. When the bulk write fails
+without saying which upserts were applied (e.g. the connection drops partway),
+the next flush first looks up the write id each upsert records in its bucket
+and retries only the ones not found, so readings are not appended twice.
+Readings are only dropped (and counted as such) after max_retries failed
+attempts.
+
+Once a bucket write has been applied, the same readings are folded into the
+hourly and daily rollups. Rollup updates that fail are kept aside and retried
+on the next flush on their own, so bucket writes are never applied twice; at
+most max_rollup_backlog of them are kept, the oldest are dropped beyond that.
+
+The asyncio primitives and the flusher task belong to the event loop that is
+running when the buffer is first used; if a later caller runs on a different
+loop they are rebuilt there and anything still pending is carried over.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from backend.services.analytics import config
+from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import timeseries
+
+logger = logging.getLogger("landos.analytics")
+
+
+def build_bucket_ops(project_id: str, props: np.ndarray, times: np.ndarray, values: np.ndarray) -> list:
+    """
+    Group columns by (property, bucket window) into one upsert per bucket-sized
+    slice. Returns (op, write) pairs, write being the slice the op carries:
+    (project_id, property, times, values, write_id).
+    """
+    if not len(times):
+        return []
+    starts = times - (times % timeseries.BUCKET_MS)
+    order = np.lexsort((times, starts, props))
+    props, starts, times, values = props[order], starts[order], times[order], values[order]
+    boundary = np.ones(len(times), dtype=bool)
+    boundary[1:] = (props[1:] != props[:-1]) | (starts[1:] != starts[:-1])
+    edges = np.append(np.flatnonzero(boundary), len(times))
+    cap = timeseries.BUCKET_MAX_READINGS
+    pairs = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        for part in range(lo, hi, cap):
+            prop = str(props[lo])
+            part_times = times[part:min(part + cap, hi)].tolist()
+            part_values = values[part:min(part + cap, hi)].tolist()
+            write_id = ObjectId()
+            op = timeseries.bucket_update(project_id, prop, int(starts[lo]), part_times, part_values, write_id)
+            pairs.append((op, (project_id, prop, part_times, part_values, write_id)))
+    return pairs
+
+
+def _rollup_ops(write: tuple) -> list:
+    """Rollup updates for the readings of one applied bucket write."""
+    project_id, prop, times, values, _ = write
+    return timeseries.rollup_updates(project_id, prop, times, values)
+
+
+def _write_chunk(write: tuple, attempts: int) -> tuple:
+    """Buffer columns of a bucket write so its readings can be retried."""
+    project_id, prop, times, values, _ = write
+    return (project_id, np.full(len(times), prop), np.asarray(times, dtype=np.int64),
+            np.asarray(values, dtype=float), attempts)
+
+
+async def _applied(db, writes: List[tuple]) -> set:
+    """Write ids of the given bucket writes that are recorded in their buckets."""
+    ids = [write[4] for write in writes]
+    found = set()
+    cursor = db[timeseries.BUCKET_COLLECTION].find(
+        {"project_id": {"$in": sorted({write[0] for write in writes})}, "writes": {"$in": ids}},
+        {"_id": 0, "writes": 1},
+    )
+    async for doc in cursor:
+        found.update(doc.get("writes") or [])
+    return found & set(ids)
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_size: int = config.INGEST_FLUSH_SIZE,
+                 flush_interval: float = config.INGEST_FLUSH_INTERVAL,
+                 max_pending: int = config.INGEST_MAX_PENDING,
+                 max_retries: int = config.INGEST_MAX_RETRIES,
+                 max_rollup_backlog: int = config.INGEST_MAX_ROLLUP_BACKLOG):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.max_rollup_backlog = max_rollup_backlog
+        self.pending = 0
+        self.stats = {
+            "buffered": 0, "flushed": 0, "retried": 0, "dropped": 0,
+            "flushes": 0, "buckets": 0, "backpressure_waits": 0,
+            "rollups": 0, "rollup_retries": 0, "rollups_dropped": 0,
+        }
+        self._chunks: List[tuple] = []
+        # (write, attempts) of bucket writes whose outcome is unknown.
+        self._unconfirmed: List[tuple] = []
+        self._rollup_backlog: list = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._space = asyncio.Condition()
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = None
+
+    def _ensure_started(self) -> None:
+        self._bind()
+        self._closing = False
+        if self._task is None or self._task.done():
+            self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Field data flush failed")
+
+    async def add(self, project_id: str, props: np.ndarray, times: np.ndarray, values: np.ndarray) -> None:
+        """Queue validated columns for one project; waits while the buffer is full."""
+        count = len(times)
+        if not count:
+            return
+        self._ensure_started()
+        async with self._space:
+            if self.pending >= self.max_pending:
+                self.stats["backpressure_waits"] += 1
+                logger.warning("Field data buffer full (%s pending); applying backpressure", self.pending)
+            while self.pending >= self.max_pending:
+                self._wake.set()
+                await self._space.wait()
+            self._chunks.append((project_id, props, times, values, 0))
+            self.pending += count
+            self.stats["buffered"] += count
+        if self.pending >= self.flush_size:
+            self._wake.set()
+
+    async def _write(self, chunks: List[tuple], unconfirmed: List[tuple]) -> Tuple[List[tuple], List[tuple]]:
+        """
+        Write chunks as bucket upserts, after resolving earlier writes of unknown
+        outcome. Returns the chunks to retry and the writes still unconfirmed.
+        """
+        if analytics_db.client is None:
+            analytics_db.connect()
+        db = analytics_db.get_db()
+        applied: List[tuple] = []
+        if unconfirmed:
+            try:
+                found = await _applied(db, [write for write, _ in unconfirmed])
+            except Exception:
+                logger.exception("Field data flush: checking %s unconfirmed bucket writes failed", len(unconfirmed))
+                return [(*chunk[:4], chunk[4] + 1) for chunk in chunks], [(w, a + 1) for w, a in unconfirmed]
+            applied = [write for write, _ in unconfirmed if write[4] in found]
+            chunks = [_write_chunk(w, a) for w, a in unconfirmed if w[4] not in found] + list(chunks)
+        by_project: dict = {}
+        for project_id, props, times, values, attempts in chunks:
+            group = by_project.setdefault(project_id, {"parts": [], "attempts": 0})
+            group["parts"].append((props, times, values))
+            group["attempts"] = max(group["attempts"], attempts)
+        entries = []
+        for project_id, group in by_project.items():
+            parts = group["parts"]
+            pairs = build_bucket_ops(
+                project_id,
+                np.concatenate([p[0] for p in parts]),
+                np.concatenate([p[1] for p in parts]),
+                np.concatenate([p[2] for p in parts]),
+            )
+            entries.extend((op, write, group["attempts"]) for op, write in pairs)
+        self.stats["buckets"] += len(entries)
+        failed: List[int] = []
+        try:
+            if entries:
+                await db[timeseries.BUCKET_COLLECTION].bulk_write([op for op, _, _ in entries], ordered=False)
+        except BulkWriteError as exc:
+            # Unordered: only the listed upserts were not applied, so only those are retried.
+            failed = sorted({err.get("index") for err in exc.details.get("writeErrors", [])})
+            logger.error("Field data flush: %s of %s bucket writes failed", len(failed), len(entries))
+        except Exception:
+            # Some upserts may have been applied: the next flush checks before retrying.
+            logger.exception("Field data flush of %s bucket writes failed", len(entries))
+            await self._write_rollups(db, [update for write in applied for update in _rollup_ops(write)])
+            return [], [(write, attempts + 1) for _, write, attempts in entries]
+        skip = set(failed)
+        applied.extend(write for i, (_, write, _) in enumerate(entries) if i not in skip)
+        await self._write_rollups(db, [update for write in applied for update in _rollup_ops(write)])
+        return [_write_chunk(entries[i][1], entries[i][2] + 1) for i in failed], []
+
+    async def _write_rollups(self, db, rollups: list) -> None:
+        """Apply rollup updates, keeping the ones that failed for the next flush."""
+        rollups = self._rollup_backlog + rollups
+        self._rollup_backlog = []
+        if not rollups:
+            return
+        try:
+            await db[timeseries.ROLLUP_COLLECTION].bulk_write(rollups, ordered=False)
+        except BulkWriteError as exc:
+            failed = sorted({err.get("index") for err in exc.details.get("writeErrors", [])})
+            logger.error("Field data flush: %s of %s rollup updates failed", len(failed), len(rollups))
+            self._rollup_backlog = [rollups[i] for i in failed]
+        except Exception:
+            logger.exception("Field data flush of %s rollup updates failed", len(rollups))
+            self._rollup_backlog = rollups
+        self.stats["rollups"] += len(rollups) - len(self._rollup_backlog)
+        self.stats["rollup_retries"] += len(self._rollup_backlog)
+        excess = len(self._rollup_backlog) - self.max_rollup_backlog
+        if excess > 0:
+            self._rollup_backlog = self._rollup_backlog[excess:]
+            self.stats["rollups_dropped"] += excess
+            logger.error("Field data rollup backlog full; dropped %s oldest rollup updates", excess)
+
+    async def flush(self) -> int:
+        """Write everything pending now; returns the number of readings written."""
+        if self._loop is None:
+            return 0
+        self._bind()
+        async with self._flush_lock:
+            chunks, self._chunks = self._chunks, []
+            unconfirmed, self._unconfirmed = self._unconfirmed, []
+            count = sum(len(chunk[2]) for chunk in chunks) + sum(len(write[2]) for write, _ in unconfirmed)
+            if not count:
+                return 0
+            retry: List[tuple] = list(chunks)
+            unknown: List[tuple] = list(unconfirmed)
+            try:
+                retry, unknown = await self._write(chunks, unconfirmed)
+            finally:
+                dropped = [chunk for chunk in retry if chunk[4] > self.max_retries]
+                requeue = [chunk for chunk in retry if chunk[4] <= self.max_retries]
+                given_up = [write for write, attempts in unknown if attempts > self.max_retries]
+                unknown = [(write, attempts) for write, attempts in unknown if attempts <= self.max_retries]
+                kept = sum(len(chunk[2]) for chunk in requeue) + sum(len(write[2]) for write, _ in unknown)
+                lost = sum(len(chunk[2]) for chunk in dropped) + sum(len(write[2]) for write in given_up)
+                async with self._space:
+                    self._chunks[:0] = requeue
+                    self._unconfirmed = unknown
+                    self.pending -= count - kept
+                    self._space.notify_all()
+            if given_up:
+                logger.error("Field data flush gave up on %s bucket writes of unknown outcome", len(given_up))
+            written = count - kept - lost
+            self.stats["flushed"] += written
+            self.stats["retried"] += kept
+            self.stats["dropped"] += lost
+            self.stats["flushes"] += 1
+            if lost:
+                logger.error("Field data flush dropped %s readings after %s attempts", lost, self.max_retries + 1)
+            logger.info("Field data flushed: %s readings in %s chunks (%s requeued)", written, len(chunks), kept)
+            return written
+
+    async def close(self) -> None:
+        """Stop the background flusher and write what is left."""
+        if self._loop is None:
+            return
+        self._bind()
+        self._closing = True
+        if self._task is not None:
+            self._wake.set()
+            try:
+                await self._task
+            except Exception:
+                logger.exception("Field data flusher stopped with an error")
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "pending": self.pending}
+
+
+buffer = WriteBehindBuffer()
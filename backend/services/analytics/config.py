@@ -10,6 +10,12 @@ EXTERNAL_SERVICES = {
     "compute_area_hectares": False,
     "resolve_region": False,
     "trigger_etl": False,
+    "raster_query": True,
+    "extract_grid": True,
+    "diff": True,
+    "update": True,
+    "history": True,
+    "interpolate": True,
 }
 
 MONGO_URL = os.getenv("ANALYTICS_MONGO_URL", "mongodb://localhost:27017")
@@ -26,3 +32,28 @@ SUBDIVISION_SOURCES = {
 
 # DEM source
 OPENTOPO_API_KEY = os.getenv("OPENTOPO_API_KEY", "8890d11a205337023a515bce10979bae")
+
+# Field data ingest write-behind buffer
+INGEST_FLUSH_SIZE = int(os.getenv("ANALYTICS_INGEST_FLUSH_SIZE", "5000"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_INGEST_FLUSH_INTERVAL", "1.0"))
+INGEST_MAX_PENDING = int(os.getenv("ANALYTICS_INGEST_MAX_PENDING", "50000"))
+INGEST_MAX_RETRIES = int(os.getenv("ANALYTICS_INGEST_MAX_RETRIES", "3"))
+INGEST_MAX_ROLLUP_BACKLOG = int(os.getenv("ANALYTICS_INGEST_MAX_ROLLUP_BACKLOG", "50000"))
+
+# Rendered tile cache (per worker)
+TILE_CACHE_MAX_BYTES = int(os.getenv("ANALYTICS_TILE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TILE_VERSION_TTL = float(os.getenv("ANALYTICS_TILE_VERSION_TTL", "5"))
+
+# Time-series retention (days, 0 keeps forever). Daily rollups are always kept.
+TIMESERIES_RAW_RETENTION_DAYS = int(os.getenv("ANALYTICS_TIMESERIES_RAW_RETENTION_DAYS", "90"))
+TIMESERIES_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_TIMESERIES_HOURLY_RETENTION_DAYS", "730"))
+
+# Point observation interpolation: observations are rasterized per window of this length.
+INTERPOLATION_WINDOW_SECONDS = int(os.getenv("ANALYTICS_INTERPOLATION_WINDOW_SECONDS", "3600"))
+
+# ETL stage traces are appended here as OTLP/JSON lines when set (timings are always stored).
+ETL_TRACE_SINK = os.getenv("ANALYTICS_ETL_TRACE_SINK", "")
+
+# Requests needing the reference datasets (regions, subdivisions, country keys) wait this long
+# for the background load started at platform startup.
+DATASET_WAIT_TIMEOUT = float(os.getenv("ANALYTICS_DATASET_WAIT_TIMEOUT", "300"))
@@ -0,0 +1,50 @@
+"""
+Reference dataset readiness gate.
+
+The platform loads countries, subdivisions and country dataset keys in the
+background after startup (api.load_datasets), so a cold boot does not wait on
+the Natural Earth / TIGER downloads. Code that reads those datasets awaits
+wait_for_datasets() first. It returns at once when no load is running: in
+scripts and tests that call api.initialize() directly, and once the load has
+finished or failed.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from backend.services.analytics import config
+
+logger = logging.getLogger("landos.analytics")
+
+# idle (no background load started), loading, ready or failed.
+state = {"status": "idle", "error": None}
+_done: Optional[asyncio.Event] = None
+
+
+def begin() -> None:
+    """Mark a dataset load as running; waiters block until finish()."""
+    global _done
+    _done = asyncio.Event()
+    state.update(status="loading", error=None)
+
+
+def finish(error: Optional[BaseException] = None) -> None:
+    state.update(status="failed" if error else "ready", error=repr(error) if error else None)
+    if _done is not None:
+        _done.set()
+
+
+async def wait_for_datasets(timeout: Optional[float] = None) -> str:
+    """
+    Wait for a running dataset load (up to timeout, default
+    DATASET_WAIT_TIMEOUT seconds) and return the status.
+    """
+    if state["status"] != "loading" or _done is None:
+        return state["status"]
+    limit = config.DATASET_WAIT_TIMEOUT if timeout is None else timeout
+    try:
+        await asyncio.wait_for(_done.wait(), limit)
+    except asyncio.TimeoutError:
+        logger.warning("Reference datasets still loading after %.0fs; continuing without them", limit)
+    return state["status"]
@@ -1,23 +1,32 @@
 """
 Country-specific ETL dispatch.
+
+Country modules are imported on first use (they pull in the raster stack), so
+the API process starts without them.
 """
 
+import asyncio
+import importlib
 import logging
 from typing import Optional, Callable, Awaitable
 
-from backend.services.analytics.terrain import usa
+from backend.services.analytics import readiness
 
 logger = logging.getLogger("landos.analytics")
 
+# Country code -> ETL module, or its dotted path until first use.
 COUNTRY_MODULES = {
-    "USA": usa,
+    "USA": "backend.services.analytics.terrain.usa",
 }
 
 
 def _get_country_module(country_code: Optional[str]):
     code = (country_code or "").upper()
     if code in COUNTRY_MODULES:
-        return COUNTRY_MODULES[code]
+        mod = COUNTRY_MODULES[code]
+        if isinstance(mod, str):
+            mod = COUNTRY_MODULES[code] = importlib.import_module(mod)
+        return mod
     raise RuntimeError(f"No ETL module defined for country {code or '(unknown)'}")
 
 
@@ -26,6 +35,7 @@ async def run_country_etl(country_code: Optional[str], project: dict):
     Run full country-specific ETL (all layers beyond DEM).
     """
     mod = _get_country_module(country_code)
+    await readiness.wait_for_datasets()
     return await mod.run_all(project)
 
 
@@ -34,6 +44,7 @@ async def run_country_layer(country_code: Optional[str], layer: str, project: di
     Run a specific layer ETL for the given country.
     """
     mod = _get_country_module(country_code)
+    await readiness.wait_for_datasets()
     return await mod.run_layer(layer, project)
 
 
@@ -52,8 +63,7 @@ async def initialize_configured(db, countries: Optional[list] = None):
     Initialize datasets for configured countries.
     """
     targets = countries if countries is not None else list(COUNTRY_MODULES.keys())
-    for code in targets:
-        try:
-            await initialize_country(code, db)
-        except Exception:
-            logger.exception("Country initialization failed for %s", code)
+    results = await asyncio.gather(*(initialize_country(code, db) for code in targets), return_exceptions=True)
+    for code, result in zip(targets, results):
+        if isinstance(result, Exception):
+            logger.error("Country initialization failed for %s", code, exc_info=result)
@@ -16,13 +16,16 @@ from typing import Dict, List, Any
 
 import httpx
 import numpy as np
-import pyproj
-import rasterio
-from rasterio.io import MemoryFile
 from shapely.geometry import shape
 
 from backend.services.analytics.analytics_db_connection import analytics_db
 from backend.services.analytics import scheduler
+from backend.services.analytics.api import overviews
+from backend.services.analytics.api import diff
+from backend.services.analytics.api import coverage
+from backend.services.analytics.api import summaries
+from backend.services.analytics.api import tracing
+from backend.platform import metrics
 
 logger = logging.getLogger("landos.analytics")
 
@@ -31,10 +34,8 @@ CDL_YEAR = 2023
 CDL_LEGEND_URL = "https://www.nass.usda.gov/Research_and_Science/Cropland/metadata/MetaData_CDL_2023.csv"
 
 DATA_DIR = Path(__file__).resolve().parents[2] / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 LEGEND_CACHE = DATA_DIR / "cdl_legend_2023.csv"
 LAND_COVER_CACHE = DATA_DIR / "land_cover_cache"
-LAND_COVER_CACHE.mkdir(parents=True, exist_ok=True)
 
 # Reference legend from landos_ref (real CDL legend)
 REF_LEGEND_PATH = (
@@ -59,6 +60,7 @@ async def _download_land_cover_keys() -> List[Dict[str, Any]]:
         async with httpx.AsyncClient(timeout=30.0) as client:
             resp = await client.get(CDL_LEGEND_URL)
             resp.raise_for_status()
+            path.parent.mkdir(parents=True, exist_ok=True)
             path.write_bytes(resp.content)
             logger.info("Downloaded CDL legend to %s", path)
     keys: List[Dict[str, Any]] = []
@@ -148,6 +150,10 @@ async def _fetch_land_cover_raster(project: dict) -> Dict[str, Any]:
     """
     Fetch CDL raster for the project polygon. Cached by projected bbox.
     """
+    # pyproj / rasterio load PROJ and GDAL; imported on first land cover fetch.
+    import pyproj
+    from rasterio.io import MemoryFile
+
     geometry = _normalize_geometry(project.get("geometry") or {})
     geom = shape(geometry)
     transformer = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:5070", always_xy=True)
@@ -159,39 +165,47 @@ async def _fetch_land_cover_raster(project: dict) -> Dict[str, Any]:
     cache_path = LAND_COVER_CACHE / cache_key
 
     tif_bytes: bytes
-    if cache_path.exists():
-        tif_bytes = cache_path.read_bytes()
-        logger.info("Land cover cache hit (%s)", cache_path.name)
-    else:
-        logger.info("Land cover fetch start (bbox=%s)", bbox_str)
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.get(
-                CDL_URL,
-                params={"year": str(CDL_YEAR), "bbox": bbox_str},
-                headers={"User-Agent": "LandOS/1.0"},
-            )
-            resp.raise_for_status()
-            text = resp.text
-            if "<returnURL>" not in text:
-                raise RuntimeError("CDL service did not return a URL")
-            tif_url = text.split("<returnURL>")[1].split("</returnURL>")[0].strip()
-            tif_resp = await client.get(tif_url, headers={"User-Agent": "LandOS/1.0"})
-            tif_resp.raise_for_status()
-            tif_bytes = tif_resp.content
-            cache_path.write_bytes(tif_bytes)
-            logger.info("Land cover fetched and cached at %s", cache_path.name)
-
-    with MemoryFile(tif_bytes) as memfile:
-        with memfile.open() as dataset:
-            data = dataset.read(1)
-            bounds = {
-                "left": dataset.bounds.left,
-                "bottom": dataset.bounds.bottom,
-                "right": dataset.bounds.right,
-                "top": dataset.bounds.top,
-            }
-            transform = list(dataset.transform)
-            grid = data.astype(int).tolist()
+    cached = cache_path.exists()
+    metrics.record_cache("land_cover_files", cached)
+    with tracing.span("fetch_cdl", cache="hit" if cached else "miss") as span:
+        if cached:
+            tif_bytes = cache_path.read_bytes()
+            logger.info("Land cover cache hit (%s)", cache_path.name)
+        else:
+            logger.info("Land cover fetch start (bbox=%s)", bbox_str)
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                # Two-step service: the first call returns the URL of the clipped raster.
+                with metrics.track_fetch("nass_cdl"):
+                    resp = await client.get(
+                        CDL_URL,
+                        params={"year": str(CDL_YEAR), "bbox": bbox_str},
+                        headers={"User-Agent": "LandOS/1.0"},
+                    )
+                    resp.raise_for_status()
+                    text = resp.text
+                    if "<returnURL>" not in text:
+                        raise RuntimeError("CDL service did not return a URL")
+                    tif_url = text.split("<returnURL>")[1].split("</returnURL>")[0].strip()
+                    tif_resp = await client.get(tif_url, headers={"User-Agent": "LandOS/1.0"})
+                    tif_resp.raise_for_status()
+                tif_bytes = tif_resp.content
+                LAND_COVER_CACHE.mkdir(parents=True, exist_ok=True)
+                cache_path.write_bytes(tif_bytes)
+                logger.info("Land cover fetched and cached at %s", cache_path.name)
+        span["bytes"] = len(tif_bytes)
+
+    with tracing.span("read_raster"):
+        with MemoryFile(tif_bytes) as memfile:
+            with memfile.open() as dataset:
+                data = dataset.read(1)
+                bounds = {
+                    "left": dataset.bounds.left,
+                    "bottom": dataset.bounds.bottom,
+                    "right": dataset.bounds.right,
+                    "top": dataset.bounds.top,
+                }
+                transform = list(dataset.transform)
+                grid = data.astype(int).tolist()
     return {"grid": grid, "bounds": bounds, "transform": transform}
 
 
@@ -209,6 +223,8 @@ async def _load_key_docs(db) -> List[Dict[str, Any]]:
     return [first] if first else []
 
 
+@metrics.etl_run("land_cover")
+@tracing.traced("land_cover")
 async def fetch_land_cover_data(project: dict):
     """
     Fetch and store land cover data for a USA project.
@@ -262,11 +278,13 @@ async def fetch_land_cover_data(project: dict):
                 {"$set": {"project_id": project_id, "etl_layers": failed_layers}},
                 upsert=True,
             )
+            await summaries.update_summary(db, project_id, "land_cover", status=etl_status)
             raise
 
     grid = raster.get("grid") or []
     if grid and rows and cols and (len(grid) != rows or len(grid[0]) != cols):
-        grid = _resample_grid(grid, rows, cols)
+        with tracing.span("resample", cells=rows * cols):
+            grid = _resample_grid(grid, rows, cols)
 
     key_docs = await _load_key_docs(db)
     key_lookup = {str(doc.get("code")): doc.get("name") for doc in key_docs if doc}
@@ -290,21 +308,35 @@ async def fetch_land_cover_data(project: dict):
     }
     current_layers = dict((terrain.get("etl_layers") or {}))
     current_layers["land_cover"] = etl_status
+    land_cover_version = diff.version_stamp("land_cover", grid)
+    with tracing.span("overviews"):
+        land_cover_levels = await overviews.store_pyramid(
+            db, project_id, "land_cover", overviews.build_layer_pyramid("land_cover", land_cover_doc)
+        )
 
-    await db.terrain.update_one(
-        {"project_id": project_id},
-        {
-            "$set": {
-                "project_id": project_id,
-                "land_cover": land_cover_doc,
-                "etl_layers": current_layers,
-            }
-        },
-        upsert=True,
-    )
-    await db.projects.update_one(
-        {"project_id": project_id},
-        {"$set": {"status": "land_cover_loaded"}},
-    )
+    with tracing.span("mongo_write"):
+        await db.terrain.update_one(
+            {"project_id": project_id},
+            {
+                "$set": {
+                    "project_id": project_id,
+                    "land_cover": land_cover_doc,
+                    "overview_levels.land_cover": land_cover_levels,
+                    "layer_versions.land_cover": land_cover_version,
+                    "etl_layers": current_layers,
+                }
+            },
+            upsert=True,
+        )
+        await diff.record_history(db, project_id, "land_cover", grid, land_cover_version)
+        await summaries.update_summary(
+            db, project_id, "land_cover", land_cover_doc, land_cover_version, etl_status,
+            coverage.unpack_mask(terrain.get("coverage_mask")),
+        )
+        await db.projects.update_one(
+            {"project_id": project_id},
+            {"$set": {"status": "land_cover_loaded"}},
+        )
+    await tracing.store_timings(db, project_id, tracing.current(), etl_status)
     logger.info("Land cover ETL stored for project %s", project_id)
-    return {"ok": True}
+    return {"ok": True, "outcome": "fallback" if etl_status.get("note") else "ok"}
@@ -10,10 +10,15 @@ from shapely.geometry import shape
 from shapely import wkt
 import logging
 import numpy as np
-from rasterio.features import rasterize
 import asyncio
 
 from backend.services.analytics.analytics_db_connection import analytics_db
+from backend.services.analytics.api import overviews
+from backend.services.analytics.api import diff
+from backend.services.analytics.api import coverage
+from backend.services.analytics.api import summaries
+from backend.services.analytics.api import tracing
+from backend.platform import metrics
 
 SSURGO_URL = "https://sdmdataaccess.nrcs.usda.gov/Tabular/post.rest"
 logger = logging.getLogger("landos.analytics")
@@ -31,6 +36,28 @@ def _normalize_geometry(geometry: dict):
     return geometry
 
 
+def rasterize(*args, **kwargs):
+    # rasterio (GDAL) is imported on the first soil rasterization, not with the API.
+    from rasterio.features import rasterize as burn
+
+    return burn(*args, **kwargs)
+
+
+def _rasterize_units(shapes, rows: int, cols: int, transform) -> list:
+    """Burn (polygon, unit index) pairs onto the DEM grid; 0 where no map unit covers a cell."""
+    arr = rasterize(
+        shapes,
+        out_shape=(rows, cols),
+        transform=transform,
+        fill=0,
+        dtype="int32",
+        all_touched=False,
+    )
+    return arr.astype(int).tolist()
+
+
+@metrics.etl_run("soil")
+@tracing.traced("soil")
 async def fetch_soil_data(project: dict):
     """
     Fetch and store soil data for a project in the USA.
@@ -76,9 +103,11 @@ async def fetch_soil_data(project: dict):
         while attempts < 2:
             attempts += 1
             try:
-                resp = await client.post(SSURGO_URL, json={"query": query, "format": "JSON"})
-                resp.raise_for_status()
-                rows = resp.json().get("Table", [])
+                with tracing.span("sdm_query", attempt=attempts) as span, metrics.track_fetch("sdm"):
+                    resp = await client.post(SSURGO_URL, json={"query": query, "format": "JSON"})
+                    resp.raise_for_status()
+                    rows = resp.json().get("Table", [])
+                    span["rows"] = len(rows)
                 break
             except Exception as exc:
                 last_exc = exc
@@ -104,22 +133,24 @@ async def fetch_soil_data(project: dict):
     id_to_mukey = {}
     unit_attrs = {}
     shapes = []
-    for row in mapped_rows:
-        mukey = str(row.get("mukey") or "").strip()
-        poly_wkt = row.get("wkt")
-        if not mukey or not poly_wkt:
-            continue
-        try:
-            poly_geom = wkt.loads(poly_wkt)
-            if not poly_geom.is_valid:
-                poly_geom = poly_geom.buffer(0)
-        except Exception:
-            continue
-        idx = mukey_to_id.setdefault(mukey, len(mukey_to_id) + 1)
-        id_to_mukey[str(idx)] = mukey
-        attrs = {k: v for k, v in row.items() if k != "wkt"}
-        unit_attrs[mukey] = attrs
-        shapes.append((poly_geom, idx))
+    with tracing.span("parse_polygons") as span:
+        for row in mapped_rows:
+            mukey = str(row.get("mukey") or "").strip()
+            poly_wkt = row.get("wkt")
+            if not mukey or not poly_wkt:
+                continue
+            try:
+                poly_geom = wkt.loads(poly_wkt)
+                if not poly_geom.is_valid:
+                    poly_geom = poly_geom.buffer(0)
+            except Exception:
+                continue
+            idx = mukey_to_id.setdefault(mukey, len(mukey_to_id) + 1)
+            id_to_mukey[str(idx)] = mukey
+            attrs = {k: v for k, v in row.items() if k != "wkt"}
+            unit_attrs[mukey] = attrs
+            shapes.append((poly_geom, idx))
+        span["polygons"] = len(shapes)
 
     soil_grid = None
     etl_status = {"status": "ok", "updated_at": datetime.datetime.utcnow().isoformat()}
@@ -128,15 +159,8 @@ async def fetch_soil_data(project: dict):
         etl_status = {"status": "failed", "error": "no soil polygons", "updated_at": datetime.datetime.utcnow().isoformat()}
     else:
         try:
-            arr = rasterize(
-                shapes,
-                out_shape=(rows, cols),
-                transform=transform,
-                fill=0,
-                dtype="int32",
-                all_touched=False,
-            )
-            soil_grid = arr.astype(int).tolist()
+            with tracing.span("rasterize", cells=rows * cols):
+                soil_grid = _rasterize_units(shapes, rows, cols, transform)
         except Exception as exc:
             logger.exception("Soil rasterize failed for project %s: %s", project_id, exc)
             etl_status = {"status": "failed", "error": str(exc), "updated_at": datetime.datetime.utcnow().isoformat()}
@@ -153,10 +177,26 @@ async def fetch_soil_data(project: dict):
         "fetched_at": datetime.datetime.utcnow(),
     }
 
-    await db.terrain.update_one(
-        {"project_id": project_id},
-        {"$set": {"soil_data": soil_doc, "etl_layers.soil": etl_status}},
-        upsert=True,
-    )
+    soil_version = diff.version_stamp("soil", soil_grid)
+    with tracing.span("overviews"):
+        soil_levels = await overviews.store_pyramid(db, project_id, "soil", overviews.build_layer_pyramid("soil", soil_doc))
+    with tracing.span("mongo_write"):
+        await db.terrain.update_one(
+            {"project_id": project_id},
+            {
+                "$set": {
+                    "soil_data": soil_doc,
+                    "overview_levels.soil": soil_levels,
+                    "layer_versions.soil": soil_version,
+                    "etl_layers.soil": etl_status,
+                }
+            },
+            upsert=True,
+        )
+        await diff.record_history(db, project_id, "soil", soil_grid, soil_version)
+        await summaries.update_summary(
+            db, project_id, "soil", soil_doc, soil_version, etl_status, coverage.unpack_mask(terrain.get("coverage_mask"))
+        )
+    await tracing.store_timings(db, project_id, tracing.current(), etl_status)
     logger.info("Soil ETL stored for project %s", project_id)
-    return {"ok": True, "count": len(mapped_rows)}
+    return {"ok": True, "count": len(mapped_rows), "outcome": etl_status["status"]}
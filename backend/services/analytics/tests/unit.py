@@ -286,6 +286,9 @@ async def test_soil_etl_records_status_and_grid(monkeypatch):
     assert soil_doc and soil_doc.get("grid"), "Soil grid should be rasterized"
     status = terrain.get("etl_layers", {}).get("soil")
     assert status and status.get("status") == "ok", "Soil ETL status should be ok"
+    stages = status["timings"]["stages"]
+    assert {"sdm_query", "parse_polygons", "rasterize", "overviews", "mongo_write"} <= set(stages)
+    assert stages["sdm_query"]["rows"] == 1 and stages["parse_polygons"]["polygons"] == 1
 
 
 @pytest.mark.anyio
@@ -644,3 +647,1042 @@ async def test_land_cover_retry_sets_failed_then_ok(monkeypatch):
     terrain = await fake.db.terrain.find_one({"project_id": "p3"})
     status = terrain.get("etl_layers", {}).get("land_cover")
     assert status and status.get("status") == "ok"
+
+
+# --- Coverage mask ---
+
+
+def test_coverage_mask_excludes_cells_outside_polygon():
+    from backend.services.analytics.api import coverage
+
+    # 4x4 grid of unit cells with origin (0, 4); polygon covers the lower-left 2x2 block
+    transform = [1, 0, 0, 0, -1, 4]
+    geom = {"type": "Polygon", "coordinates": [[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]}
+    mask = coverage.build_coverage_mask(geom, transform, 4, 4)
+    assert mask.shape == (4, 4)
+    assert mask.sum() == 4
+    assert mask[2:, :2].all(), "Cells inside the polygon should be covered"
+    assert not mask[:2, :].any() and not mask[:, 2:].any(), "Buffer cells should be excluded"
+
+    masked = coverage.apply_mask(np.full((4, 4), 7), mask, fill=0)
+    assert masked.sum() == 28
+
+
+def test_coverage_mask_pack_roundtrip():
+    from backend.services.analytics.api import coverage
+
+    mask = np.zeros((3, 5), dtype=bool)
+    mask[1, 1:4] = True
+    doc = coverage.pack_mask(mask)
+    json.dumps(doc)  # must be JSON serializable for the grid endpoint
+    assert doc["shape"] == [3, 5] and doc["cells"] == 3
+    assert np.array_equal(coverage.unpack_mask(doc), mask)
+    assert coverage.unpack_mask(None) is None
+
+
+# --- Raster algebra ---
+
+
+def _algebra_terrain():
+    from backend.services.analytics.api import coverage
+
+    mask = np.ones((3, 3), dtype=bool)
+    mask[0, 0] = False
+    return {
+        "project_id": "alg1",
+        "elevation_data": {
+            "heightmap": [[1, 1, 1], [1, 2, 1], [1, 1, 9]],
+            "transform": [0.001, 0, -98.0, 0, -0.001, 33.0],
+            "bounds": {"left": -98.0, "right": -97.997, "top": 33.0, "bottom": 32.997},
+        },
+        "soil_data": {
+            "grid": [[1, 1, 2], [1, 2, 2], [0, 2, 2]],
+            "index_map": {"1": "m1", "2": "m2"},
+            "units": {"m1": {"drainagecl": "Well drained", "ph": 6.5}, "m2": {"drainagecl": "Poorly drained", "ph": "7.1"}},
+        },
+        "land_cover": {"grid": [[1, 5, 5], [1, 1, 5], [5, 5, 1]], "index_map": {"1": "Corn", "5": "Soybeans"}},
+        "coverage_mask": coverage.pack_mask(mask),
+        "etl_layers": {"dem": {"status": "ok", "updated_at": "2024-01-01T00:00:00"}},
+    }
+
+
+def test_raster_algebra_evaluates_layers_classes_and_attributes():
+    from backend.services.analytics.api import algebra
+
+    terrain = _algebra_terrain()
+    layers = algebra.load_layers(terrain)
+
+    def run(expr):
+        return algebra.evaluate(algebra.compile_expression(expr, terrain), layers, (3, 3))
+
+    assert run('land_cover in {"Corn"}').tolist() == (np.asarray(terrain["land_cover"]["grid"]) == 1).tolist()
+    assert run('soil.drainagecl == "Well drained"').sum() == 3
+    assert run("soil.ph > 7").sum() == 5, "Numeric attributes should be coerced from strings"
+    assert run("1 < dem <= 2").sum() == 1
+    assert run("slope(dem) < 5").dtype == bool
+    assert run("focal_max(dem, 3)")[1, 1] == 9
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ['__import__("os")', "dem.__class__", "(lambda: 1)()", "unknown_layer", "dem[0]", "soil.nope", 'land_cover == "Wheat"', "focal_mean(dem, 4)",
+     'dem < "x"', "soil.drainagecl > 5", "abs(soil.drainagecl)", 'dem == "x"', "soil.drainagecl + 1"],
+)
+def test_raster_algebra_rejects_unsafe_or_invalid_expressions(expression):
+    from backend.services.analytics.api import algebra
+
+    with pytest.raises(ValueError):
+        algebra.compile_expression(expression, _algebra_terrain())
+
+
+@pytest.mark.anyio
+async def test_raster_query_returns_clipped_mask_and_area(monkeypatch):
+    from backend.services.analytics.api import algebra
+
+    terrain = _algebra_terrain()
+
+    class FakeTerrain:
+        async def find_one(self, filt):
+            return terrain if filt.get("project_id") == "alg1" else None
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return type("DB", (), {"terrain": FakeTerrain()})()
+
+    monkeypatch.setattr(algebra, "analytics_db", FakeAnalyticsDB())
+    algebra._compiled_cache.clear()
+
+    result = await algebra.run_query("alg1", "land_cover == 1")
+    assert result["type"] == "mask"
+    assert result["grid"][0][0] == 0, "Cells outside the coverage mask should be excluded"
+    assert result["cells"] == 3
+    assert result["area_hectares"] > 0
+    await algebra.run_query("alg1", "land_cover == 1")
+    assert len(algebra._compiled_cache) == 1, "Compiled expression should be reused for the same version"
+
+    raster = await algebra.run_query("alg1", "dem * 2", clip=False)
+    assert raster["type"] == "raster" and raster["grid"][2][2] == 18.0
+
+    with pytest.raises(LookupError):
+        await algebra.run_query("missing", "dem > 1")
+
+
+def test_raster_query_route_requires_boolean_clip(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from backend.services import analytics
+
+    calls = []
+
+    async def fake_query(project_id, expression, output="auto", clip=True):
+        calls.append(clip)
+        return {"clip": clip}
+
+    monkeypatch.setattr(analytics.api, "raster_query", fake_query)
+    app = FastAPI()
+    app.include_router(analytics.router)
+    client = TestClient(app)
+    assert client.post("/api/analytics/projects/p1/query", json={"expression": "dem > 1", "clip": "false"}).status_code == 400
+    assert client.post("/api/analytics/projects/p1/query", json={"expression": "dem > 1", "clip": False}).json() == {"clip": False}
+    assert calls == [False]
+
+
+# --- Overview pyramids ---
+
+
+def test_overview_pyramid_uses_mean_for_dem_and_mode_for_categorical(monkeypatch):
+    from backend.services.analytics.api import overviews
+
+    monkeypatch.setattr(overviews, "OVERVIEW_MIN_SIZE", 1)
+    dem = [[1, 3, 5], [3, 5, 7], [10, 10, 10]]
+    levels = overviews.build_pyramid(dem, [1, 0, 0, 0, -1, 3], categorical=False)
+    assert [lvl["level"] for lvl in levels] == [1, 2]
+    assert levels[0]["grid"] == [[3.0, 6.0], [10.0, 10.0]], "Partial edge blocks should average only real cells"
+    assert levels[0]["transform"][:6] == [2, 0, 0, 0, -2, 3]
+    assert levels[-1]["rows"] == levels[-1]["cols"] == 1
+    assert levels[-1]["grid"][0][0] == pytest.approx(np.mean(dem))
+
+    classes = [[1, 1, 2, 2], [1, 5, 2, 2], [3, 3, 4, 4], [3, 3, 4, 7]]
+    levels = overviews.build_pyramid(classes, [1, 0, 0, 0, -1, 4], categorical=True)
+    assert levels[0]["grid"] == [[1, 2], [3, 4]]
+
+
+def test_overview_level_selection_and_layer_view():
+    from backend.services.analytics.api import overviews
+
+    pyramid = [
+        {"level": 1, "factor": 2, "rows": 50, "cols": 50, "grid": [[1]], "transform": [2, 0, 0, 0, -2, 0], "bounds": {}},
+        {"level": 2, "factor": 4, "rows": 25, "cols": 25, "grid": [[2]], "transform": [4, 0, 0, 0, -4, 0], "bounds": {}},
+    ]
+    assert overviews.select_level(100, 100, pyramid) == 0
+    assert overviews.select_level(100, 100, pyramid, max_cells=10_000) == 0
+    assert overviews.select_level(100, 100, pyramid, max_cells=3000) == 1
+    assert overviews.select_level(100, 100, pyramid, max_cells=10) == 2
+    assert overviews.select_level(100, 100, pyramid, level=9) == 2
+    with pytest.raises(ValueError):
+        overviews.select_level(100, 100, pyramid, level=-1)
+
+    layer_doc = {"heightmap": [[0]], "transform": [1, 0, 0, 0, -1, 0], "min_elevation": 0}
+    view = overviews.layer_at_level("dem", layer_doc, pyramid, 2)
+    assert view["heightmap"] == [[2]] and view["level"] == 2 and view["min_elevation"] == 0
+    assert layer_doc["heightmap"] == [[0]], "Stored layer document should not be mutated"
+
+
+@pytest.mark.anyio
+async def test_overview_levels_are_stored_apart_and_served_with_matching_mask(monkeypatch):
+    from backend.services.analytics.api import coverage, grid, overviews
+
+    monkeypatch.setattr(overviews, "OVERVIEW_MIN_SIZE", 1)
+    heightmap = [[float(r * 4 + c) for c in range(4)] for r in range(4)]
+    dem = {"heightmap": heightmap, "transform": [1, 0, 0, 0, -1, 4], "bounds": {"left": 0, "right": 4, "bottom": 0, "top": 4}}
+    stored = []
+    full_reads = []
+
+    class FakeOverviews:
+        async def delete_many(self, filt):
+            stored.clear()
+
+        async def insert_many(self, docs):
+            stored.extend(docs)
+
+        async def find_one(self, filt, projection=None):
+            return next((dict(d) for d in stored if d["layer"] == filt["layer"] and d["level"] == filt["level"]), None)
+
+    class FakeTerrain:
+        async def find_one(self, filt, projection=None):
+            full_reads.append(projection)
+            return {"elevation_data": {"heightmap": heightmap}}
+
+    class FakeDB:
+        terrain = FakeTerrain()
+        levels = FakeOverviews()
+
+        def __getitem__(self, name):
+            assert name == overviews.OVERVIEW_COLLECTION
+            return self.levels
+
+    db = FakeDB()
+
+    summary = await overviews.store_pyramid(db, "o1", "dem", overviews.build_layer_pyramid("dem", dem))
+    assert [lvl["level"] for lvl in summary] == [1, 2] and "grid" not in summary[0]
+    assert len(stored) == 2 and stored[0]["project_id"] == "o1"
+
+    meta = {"elevation_data": {k: v for k, v in dem.items() if k != "heightmap"}, "overview_levels": {"dem": summary},
+            "coverage_mask": coverage.pack_mask(np.eye(4, dtype=bool))}
+    views, mask = await grid.layer_views(db, "o1", meta, {"dem": meta["elevation_data"]}, level=1)
+    assert views["dem"]["heightmap"] == [[2.5, 4.5], [10.5, 12.5]] and views["dem"]["level"] == 1
+    assert mask["shape"] == [2, 2] and coverage.unpack_mask(mask).tolist() == [[True, False], [False, True]]
+    assert not full_reads, "Overview requests should not load the full grid"
+
+    views, mask = await grid.layer_views(db, "o1", meta, {"dem": meta["elevation_data"]}, max_cells=100)
+    assert views["dem"]["heightmap"] == heightmap and mask["shape"] == [4, 4]
+    assert full_reads == [{"_id": 0, "elevation_data.heightmap": 1}]
+
+
+# --- XYZ tiles ---
+
+
+@pytest.mark.anyio
+async def test_render_tile_reads_window_and_caches_by_version(monkeypatch):
+    import math
+    from backend.services.analytics.api import tiles
+
+    heightmap = [[float(r * 10 + c) for c in range(10)] for r in range(10)]
+    meta = {
+        "etl_layers": {"dem": {"status": "ok", "updated_at": "v1"}},
+        "elevation_data": {
+            "transform": [0.01, 0, -98.0, 0, -0.01, 33.0],
+            "bounds": {"left": -98.0, "right": -97.9, "top": 33.0, "bottom": 32.9},
+            "min_elevation": 0.0,
+            "max_elevation": 99.0,
+        },
+    }
+    reads = []
+
+    async def fake_meta(db, project_id, layer):
+        return meta if project_id == "t1" else None
+
+    async def fake_rows(db, project_id, layer, r0, count, c0=0, width=None, level=0):
+        reads.append((level, r0, count))
+        return [row[c0:c0 + width] for row in heightmap[r0:r0 + count]]
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return object()
+
+    monkeypatch.setattr(tiles, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(tiles, "_read_metadata", fake_meta)
+    monkeypatch.setattr(tiles.grid, "read_window", fake_rows)
+    tiles.clear_cache()
+
+    z = 10
+    x = int((-97.95 + 180) / 360 * 2 ** z)
+    lat = math.radians(32.95)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * 2 ** z)
+    west, south, east, north = tiles.tile_bounds(z, x, y)
+    assert west <= -97.95 <= east and south <= 32.95 <= north
+
+    tile = await tiles.render_tile("t1", "dem", z, x, y)
+    values = np.frombuffer(tile["content"], dtype="<f4").reshape(tiles.TILE_SIZE, tiles.TILE_SIZE)
+    finite = values[np.isfinite(values)]
+    assert finite.size > 0, "Tile overlapping the layer should contain data"
+    assert set(np.unique(finite)).issubset(set(np.asarray(heightmap, dtype=np.float32).ravel()))
+    assert reads and all(count <= 10 for _, _, count in reads), "Only the overlapping rows should be read"
+
+    reads.clear()
+    await tiles.render_tile("t1", "dem", z, x, y)
+    assert not reads, "Repeated tile should be served from the cache"
+
+    meta["etl_layers"]["dem"]["updated_at"] = "v2"
+    await tiles.render_tile("t1", "dem", z, x, y)
+    assert reads, "A new layer version should invalidate cached tiles"
+
+    png = await tiles.render_tile("t1", "dem", z, x, y, fmt="png")
+    assert png["content"].startswith(b"\x89PNG") and png["media_type"] == "image/png"
+
+    assert await tiles.current_version("t1", "dem") == png["version"], "Version is memoized from the last render"
+    assert tiles._tile_cache_bytes == sum(len(t["content"]) for t in tiles._tile_cache.values())
+    monkeypatch.setattr(tiles, "TILE_CACHE_MAX_BYTES", len(png["content"]) + 10)
+    await tiles.render_tile("t1", "dem", z, x, y + 1, fmt="png")
+    assert tiles._tile_cache_bytes <= tiles.TILE_CACHE_MAX_BYTES and len(tiles._tile_cache) == 1, "Cache is bounded by bytes"
+
+    with pytest.raises(ValueError):
+        await tiles.render_tile("t1", "dem", 3, 8, 0)
+    with pytest.raises(LookupError):
+        await tiles.render_tile("missing", "dem", z, x, y)
+    with pytest.raises(LookupError):
+        await tiles.render_tile("t1", "rainfall", z, x, y)
+
+
+def test_tile_overview_choice_matches_zoom():
+    from backend.services.analytics.api import tiles
+
+    levels = [{"level": 1, "factor": 2}, {"level": 2, "factor": 4}]
+    cell = 0.001
+    assert tiles.choose_level(cell, 18, levels) is None, "High zoom should use full resolution"
+    assert tiles.choose_level(cell, 8, levels)["level"] == 2, "Low zoom should use the coarsest adequate overview"
+
+
+# --- Windowed grid extraction ---
+
+
+def test_window_for_bounds_is_minimal_and_clipped():
+    from backend.services.analytics.api import grid
+
+    transform = [1, 0, 0, 0, -1, 10]
+    assert grid.window_for_bounds(transform, 10, 10, (2.5, 3.5, 4.5, 6.5)) == (3, 2, 4, 3)
+    assert grid.window_for_bounds(transform, 10, 10, (-5, -5, 1, 11)) == (0, 0, 10, 1)
+    assert grid.window_for_bounds(transform, 10, 10, (20, 20, 30, 30)) is None
+
+
+@pytest.mark.anyio
+async def test_extract_grid_reads_only_window_and_masks_polygon(monkeypatch):
+    from backend.services.analytics.api import grid
+
+    heightmap = [[float(r * 10 + c) for c in range(10)] for r in range(10)]
+    soil = [[(r + c) % 3 for c in range(10)] for r in range(10)]
+    transform = [1, 0, 0, 0, -1, 10]
+    bounds = {"left": 0, "right": 10, "bottom": 0, "top": 10}
+    meta = {"elevation_data": {"transform": transform, "bounds": bounds}, "soil_data": {"transform": transform}}
+    reads = []
+
+    class FakeTerrain:
+        async def find_one(self, filt, projection=None):
+            return meta if filt.get("project_id") == "g1" else None
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return type("DB", (), {"terrain": FakeTerrain()})()
+
+    async def fake_window(db, project_id, layer, row_off, height, col_off=0, width=None, level=0):
+        reads.append((layer, row_off, height, col_off, width))
+        source = heightmap if layer == "dem" else soil
+        return [row[col_off:col_off + width] for row in source[row_off:row_off + height]]
+
+    monkeypatch.setattr(grid, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(grid, "read_window", fake_window)
+
+    # Triangle covering part of a 3x3 window: rows 4..6, cols 2..4
+    geom = {"type": "Polygon", "coordinates": [[[2, 4], [5, 4], [2, 7], [2, 4]]]}
+    result = await grid.extract_grid("g1", geom, ["dem", "soil", "land_cover"])
+    assert result["window"] == {"row_off": 3, "col_off": 2, "rows": 3, "cols": 3}
+    assert all(r[2] == 3 and r[4] == 3 for r in reads), "Only the polygon window should be read"
+    dem = result["layers"]["dem"]
+    assert dem[2][0] == heightmap[5][2], "Cells inside the polygon keep their values"
+    assert dem[0][2] is None, "Cells outside the polygon should be null"
+    assert result["cells"] == sum(v is not None for row in dem for v in row)
+    assert result["layers"]["soil"][2][0] == soil[5][2]
+    assert result["missing"] == ["land_cover"]
+    assert result["x"][0] == 2.5 and result["y"][0] == 6.5
+
+    with pytest.raises(ValueError):
+        await grid.extract_grid("g1", {"type": "Polygon", "coordinates": [[[50, 50], [51, 50], [51, 51], [50, 50]]]})
+    with pytest.raises(LookupError):
+        await grid.extract_grid("missing", geom)
+
+
+# --- Grid diff ---
+
+
+def test_grid_diff_delta_encoding():
+    from backend.services.analytics.api import diff
+
+    old = np.zeros((4, 4))
+    new = old.copy()
+    new[1, 2] = 5.0
+    new[3, 0] = np.nan
+    delta = diff.compute_delta(old, new)
+    assert delta["full"] is False and delta["changed"] == 2
+    assert delta["indices"] == [6, 12]
+    assert delta["values"] == [5.0, None], "NaN cells are encoded as null"
+    assert diff.compute_delta(np.full((2, 2), np.nan), np.full((2, 2), np.nan))["changed"] == 0
+    assert diff.compute_delta(old, np.ones((4, 4)))["reason"] == "too_many_changes"
+    assert diff.compute_delta(old, np.zeros((3, 3)))["reason"] == "shape_changed"
+    assert diff.grid_version("dem", [[1, 2]]) == diff.grid_version("dem", [[1.0, 2.0]])
+    assert diff.grid_version("dem", [[1, 2]]) != diff.grid_version("dem", [[2, 1]])
+    assert diff.version_stamp("soil", None) is None
+
+
+@pytest.mark.anyio
+async def test_grid_diff_returns_changed_cells_since_version(monkeypatch):
+    from backend.services.analytics.api import diff
+
+    class FakeCursor:
+        def __init__(self, docs):
+            self.docs = docs
+
+        def sort(self, key, direction):
+            self.docs = sorted(self.docs, key=lambda d: d[key], reverse=direction < 0)
+            return self
+
+        def skip(self, n):
+            self.docs = self.docs[n:]
+            return self
+
+        async def to_list(self, length):
+            return self.docs
+
+    class FakeVersions:
+        def __init__(self):
+            self.docs = []
+
+        def _match(self, doc, filt):
+            for key, value in filt.items():
+                if isinstance(value, dict) and "$lte" in value:
+                    if not doc[key] <= value["$lte"]:
+                        return False
+                elif isinstance(value, dict) and "$in" in value:
+                    if doc[key] not in value["$in"]:
+                        return False
+                elif doc.get(key) != value:
+                    return False
+            return True
+
+        async def find_one(self, filt, projection=None, sort=None):
+            docs = [d for d in self.docs if self._match(d, filt)]
+            docs.sort(key=lambda d: d["created_at"], reverse=True)
+            return docs[0] if docs else None
+
+        def find(self, filt, projection=None):
+            return FakeCursor([d for d in self.docs if self._match(d, filt)])
+
+        async def insert_one(self, doc):
+            self.docs.append({**doc, "_id": len(self.docs)})
+
+        async def delete_many(self, filt):
+            self.docs = [d for d in self.docs if not self._match(d, filt)]
+
+    versions = FakeVersions()
+    terrain = {}
+
+    class FakeTerrain:
+        async def find_one(self, filt, projection=None):
+            return terrain if filt.get("project_id") == "d1" else None
+
+    db = type("DB", (), {"terrain": FakeTerrain(), "layer_versions": versions})()
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return db
+
+    monkeypatch.setattr(diff, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(diff, "LAYER_HISTORY_DEPTH", 2)
+
+    grids = [[[1, 1], [1, 1]], [[1, 2], [1, 1]], [[1, 2], [3, 1]]]
+    stamps = []
+    for i, g in enumerate(grids):
+        stamp = diff.version_stamp("soil", g)
+        stamp["updated_at"] = f"2024-01-0{i + 1}T00:00:00"
+        stamps.append(stamp)
+        await diff.record_history(db, "d1", "soil", g, stamp)
+    await diff.record_history(db, "d1", "soil", grids[-1], stamps[-1])
+    assert len(versions.docs) == 2, "History is pruned and unchanged rewrites are not stored"
+    terrain.update({"layer_versions": {"soil": stamps[-1]}, "soil_data": {"grid": grids[-1]}})
+
+    result = await diff.get_diff("d1", "soil", stamps[1]["version"])
+    assert result["full"] is False and result["indices"] == [2] and result["values"] == [3]
+    assert result["to"] == stamps[2]["version"]
+
+    by_time = await diff.get_diff("d1", "soil", "2024-01-02T12:00:00Z")
+    assert by_time["from"] == stamps[1]["version"] and by_time["changed"] == 1
+
+    same = await diff.get_diff("d1", "soil", stamps[2]["version"])
+    assert same["changed"] == 0
+
+    stale = await diff.get_diff("d1", "soil", stamps[0]["version"])
+    assert stale["full"] is True and stale["grid"] == grids[-1]
+
+    with pytest.raises(LookupError):
+        await diff.get_diff("d1", "slope", stamps[0]["version"])
+    with pytest.raises(LookupError):
+        await diff.get_diff("d1", "dem", stamps[0]["version"])
+
+
+# --- Time-series store ---
+
+
+class FakeBucketCollection:
+    """Minimal bucket collection applying the update operators used by the store."""
+
+    def __init__(self):
+        self.docs = []
+        self.queries = []
+
+    def _match(self, doc, filt):
+        for key, cond in filt.items():
+            value = doc.get(key, 0 if key == "count" else None)
+            if isinstance(cond, dict):
+                if "$in" in cond:
+                    candidates = value if isinstance(value, list) else [value]
+                    if not any(item in cond["$in"] for item in candidates):
+                        return False
+                if "$gte" in cond and not value >= cond["$gte"]:
+                    return False
+                if "$lte" in cond and not value <= cond["$lte"]:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            filt, update = op._filter, op._doc
+            doc = next((d for d in self.docs if self._match(d, filt)), None)
+            if doc is None:
+                doc = {k: v for k, v in filt.items() if not isinstance(v, dict)}
+                doc.update(update.get("$setOnInsert", {}))
+                self.docs.append(doc)
+            for key, spec in update.get("$push", {}).items():
+                doc.setdefault(key, []).extend(spec["$each"])
+            for key, item in update.get("$addToSet", {}).items():
+                if item not in doc.setdefault(key, []):
+                    doc[key].append(item)
+            for key, inc in update["$inc"].items():
+                doc[key] = doc.get(key, 0) + inc
+            for key, val in update["$min"].items():
+                doc[key] = min(doc.get(key, val), val)
+            for key, val in update["$max"].items():
+                doc[key] = max(doc.get(key, val), val)
+
+    def find(self, filt, projection=None):
+        self.queries.append(filt)
+        docs = [d for d in self.docs if self._match(d, filt)]
+
+        class Cursor:
+            def sort(self, key, direction):
+                docs.sort(key=lambda d: d[key], reverse=direction < 0)
+                return self
+
+            def __aiter__(self):
+                self._it = iter(docs)
+                return self
+
+            async def __anext__(self):
+                try:
+                    return next(self._it)
+                except StopIteration:
+                    raise StopAsyncIteration
+
+        return Cursor()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_timeseries_ingest_buckets_and_history_scans_overlapping(monkeypatch):
+    from backend.services.analytics.api import history, timeseries, update, write_buffer
+
+    coll = FakeBucketCollection()
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return {timeseries.BUCKET_COLLECTION: coll, timeseries.ROLLUP_COLLECTION: FakeBucketCollection()}
+
+    monkeypatch.setattr(write_buffer, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(write_buffer, "buffer", write_buffer.WriteBehindBuffer())
+    monkeypatch.setattr(history, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(history.config, "TIMESERIES_RAW_RETENTION_DAYS", 0)
+
+    payload = [
+        {"property": "moisture", "values": [
+            {"time": "2024-05-01T10:15:00Z", "value": 0.3},
+            {"time": "2024-05-01T10:05:00Z", "value": 0.2},
+            {"time": "2024-05-01T11:30:00Z", "value": 0.4},
+        ]},
+        {"property": "temp", "values": [{"time": "2024-05-01T10:00:00Z", "value": 18}]},
+    ]
+    result = await update.ingest("ts1", payload, flush=True)
+    assert result["accepted"] == 4 and result["rejected"] == 0 and result["flushed"] == 4
+    assert result["buffer"]["buckets"] == 3
+    await update.ingest("ts1", [{"property": "moisture", "time": "2024-05-01T10:45:00Z", "value": 0.5}], flush=True)
+    assert len(coll.docs) == 3, "Readings in the same window append to one bucket"
+    bucket = next(d for d in coll.docs if d["property"] == "moisture" and d["count"] == 3)
+    assert bucket["min"] == 0.2 and bucket["max"] == 0.5 and bucket["sum"] == pytest.approx(1.0)
+    assert bucket["times"] == sorted(bucket["times"]), "Bucket columns are written in time order"
+
+    hist = await history.get_history("ts1", ["moisture", "rain"], "2024-05-01T10:10:00Z", "2024-05-01T11:00:00Z")
+    moisture = hist["properties"]["moisture"]
+    assert moisture["times"] == ["2024-05-01T10:15:00Z", "2024-05-01T10:45:00Z"]
+    assert moisture["values"] == [0.3, 0.5]
+    assert hist["properties"]["rain"] == {"times": [], "values": []}
+    window = coll.queries[-1]["bucket_start"]
+    assert window["$gte"].hour == 10 and window["$lte"].hour == 11
+
+    with pytest.raises(ValueError):
+        await history.get_history("ts1", ["moisture"], "2024-05-02T00:00:00Z", "2024-05-01T00:00:00Z")
+    with pytest.raises(ValueError):
+        await update.ingest("ts1", b"not json")
+
+
+def test_field_data_validation_is_vectorized_and_counts_rejects():
+    from backend.services.analytics.api import update
+
+    props, times, values, malformed = update.flatten_records([
+        {"property": "moisture", "times": [1714558500, "2024-05-01T10:15:00+02:00", "yesterday", None],
+         "values": [0.3, "0.4", 0.5, 0.6]},
+        {"property": "moisture", "values": [{"time": 1714558500, "value": "wet"}, "junk"]},
+        {"values": [{"time": 1, "value": 1}, {"time": 2, "value": 2}]},
+    ])
+    assert malformed == 2
+    checked = update.validate_columns(props, times, values)
+    assert checked["times"].tolist() == [1714558500000, 1714551300000]
+    assert checked["values"].tolist() == [0.3, 0.4]
+    assert checked["rejected"] == {"invalid_property": 0, "invalid_time": 3, "invalid_value": 1}
+    iso, ok = update.parse_times(["2024-05-01T10:15:00Z", "2024-05-01T10:15:00.5"])
+    assert ok.all() and (iso[1] - iso[0]) == 500
+    mixed, ok = update.parse_times([1700000000, "2024-01-01T00:00:00Z", True])
+    assert ok.tolist() == [True, True, False], "epochs mixed with ISO strings parse; bools are not times"
+    assert mixed[0] == 1700000000000
+    _, _, _, malformed = update.flatten_records([
+        {"property": "m", "values": 5},
+        {"property": "m", "times": 3, "values": [1]},
+        {"values": "x"},
+    ])
+    assert malformed == 3, "non-list columns are counted as malformed, not raised"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_field_data_ndjson_stream_and_write_behind_backpressure(monkeypatch):
+    import asyncio
+    from backend.services.analytics.api import timeseries, update, write_buffer
+
+    coll = FakeBucketCollection()
+    release = asyncio.Event()
+    calls = []
+
+    async def slow_bulk_write(ops, ordered=True):
+        calls.append((len(ops), ordered))
+        await release.wait()
+        await FakeBucketCollection.bulk_write(coll, ops, ordered)
+
+    coll.bulk_write = slow_bulk_write
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return {timeseries.BUCKET_COLLECTION: coll, timeseries.ROLLUP_COLLECTION: FakeBucketCollection()}
+
+    buf = write_buffer.WriteBehindBuffer(flush_size=2, flush_interval=60, max_pending=2)
+    monkeypatch.setattr(write_buffer, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(write_buffer, "buffer", buf)
+    monkeypatch.setattr(update, "NDJSON_BATCH_LINES", 2)
+
+    async def stream():
+        yield b'{"property": "rain", "time": 1714558500, "value": 1}\n{"property": "rain", "ti'
+        yield b'me": 1714558560, "value": 2}\nnot json\n'
+        yield b'{"property": "rain", "time": 1714558620, "value": 3}\n{"property": "rain", "time": 1714558680, "value": 4}'
+
+    task = asyncio.create_task(update.ingest_ndjson("nd1", stream()))
+    for _ in range(20):
+        await asyncio.sleep(0)
+    assert not task.done(), "Producer waits while the buffer is full and Mongo is slow"
+    assert buf.stats["backpressure_waits"] == 1 and calls == [(1, False)]
+    release.set()
+    result = await task
+    await buf.close()
+    assert result["accepted"] == 4 and result["rejected_reasons"] == {
+        "invalid_property": 0, "invalid_time": 0, "invalid_value": 0, "malformed": 1,
+    }
+    assert buf.snapshot()["flushed"] == 4 and buf.pending == 0
+    assert coll.docs[0]["times"] == [1714558500000, 1714558560000, 1714558620000, 1714558680000]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_write_behind_buffer_requeues_failed_writes(monkeypatch):
+    from backend.services.analytics.api import timeseries, write_buffer
+
+    coll = FakeBucketCollection()
+    attempts = []
+
+    async def flaky_bulk_write(ops, ordered=True):
+        attempts.append(len(ops))
+        if len(attempts) == 1:
+            raise ConnectionError("mongo unavailable")
+        await FakeBucketCollection.bulk_write(coll, ops, ordered)
+
+    coll.bulk_write = flaky_bulk_write
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return {timeseries.BUCKET_COLLECTION: coll, timeseries.ROLLUP_COLLECTION: FakeBucketCollection()}
+
+    monkeypatch.setattr(write_buffer, "analytics_db", FakeAnalyticsDB())
+    buf = write_buffer.WriteBehindBuffer(flush_size=100, flush_interval=60, max_pending=100, max_retries=1)
+    await buf.add("r1", np.array(["rain", "rain"]), np.array([0, 1000], dtype=np.int64), np.array([1.0, 2.0]))
+    assert await buf.flush() == 0
+    assert buf.pending == 2 and buf.stats["retried"] == 2, "Failed writes stay pending"
+    assert await buf.flush() == 2
+    assert buf.pending == 0 and coll.docs[0]["values"] == [1.0, 2.0]
+
+    async def applied_then_disconnected(ops, ordered=True):
+        await FakeBucketCollection.bulk_write(coll, ops[:1], ordered)
+        raise ConnectionError("connection reset")
+
+    coll.bulk_write = applied_then_disconnected
+    await buf.add("r1", np.array(["rain", "snow"]), np.array([7000, 7000], dtype=np.int64), np.array([4.0, 5.0]))
+    await buf.flush()
+    assert buf.pending == 2, "Writes of unknown outcome stay pending"
+    coll.bulk_write = lambda ops, ordered=True: FakeBucketCollection.bulk_write(coll, ops, ordered)
+    assert await buf.flush() == 2
+    assert sorted(v for doc in coll.docs for v in doc["values"]) == [1.0, 2.0, 4.0, 5.0], "Applied upserts are not re-sent"
+
+    coll.bulk_write = lambda ops, ordered=True: (_ for _ in ()).throw(ConnectionError("down"))
+    await buf.add("r1", np.array(["rain"]), np.array([5000], dtype=np.int64), np.array([3.0]))
+    await buf.flush()
+    await buf.flush()
+    await buf.close()
+    assert buf.stats["dropped"] == 1 and buf.pending == 0, "Readings are dropped only after max_retries"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_write_behind_buffer_bounds_the_rollup_backlog(monkeypatch):
+    from backend.services.analytics.api import timeseries, write_buffer
+
+    rollups = FakeBucketCollection()
+    rollups.bulk_write = lambda ops, ordered=True: (_ for _ in ()).throw(ConnectionError("down"))
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return {timeseries.BUCKET_COLLECTION: FakeBucketCollection(), timeseries.ROLLUP_COLLECTION: rollups}
+
+    monkeypatch.setattr(write_buffer, "analytics_db", FakeAnalyticsDB())
+    buf = write_buffer.WriteBehindBuffer(flush_size=100, flush_interval=60, max_pending=100, max_rollup_backlog=3)
+    hours = np.arange(4, dtype=np.int64) * 3600 * 1000
+    await buf.add("r1", np.array(["rain"] * 4), hours, np.ones(4))
+    assert await buf.flush() == 4, "Bucket writes succeed although rollups fail"
+    assert len(buf._rollup_backlog) == 3 and buf.stats["rollups_dropped"] == 5, "hourly + daily per bucket, capped at 3"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_timeseries_buckets_roll_over_when_full_and_reject_bad_numbers(monkeypatch):
+    from backend.services.analytics.api import history, timeseries, update, write_buffer
+
+    coll = FakeBucketCollection()
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return {timeseries.BUCKET_COLLECTION: coll, timeseries.ROLLUP_COLLECTION: FakeBucketCollection()}
+
+    monkeypatch.setattr(timeseries, "BUCKET_MAX_READINGS", 3)
+    monkeypatch.setattr(write_buffer, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(write_buffer, "buffer", write_buffer.WriteBehindBuffer())
+    monkeypatch.setattr(history, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(history.config, "TIMESERIES_RAW_RETENTION_DAYS", 0)
+
+    base = 1714557600
+    await update.ingest("cap1", [{"property": "rain", "times": [base + i for i in range(5)], "values": [1] * 5}], flush=True)
+    await update.ingest("cap1", [{"property": "rain", "time": base + 10, "value": 2}], flush=True)
+    counts = sorted(d["count"] for d in coll.docs)
+    assert counts == [3, 3], "Full buckets roll over to a new bucket for the same window"
+
+    result = await update.ingest("cap1", b'[{"property": "rain", "values": [{"time": 1714557600, "value": NaN},'
+                                         b' {"time": 1e300, "value": 1}, {"time": "inf", "value": 1}]}]', flush=True)
+    assert result["accepted"] == 0
+    assert result["rejected_reasons"]["invalid_value"] == 1 and result["rejected_reasons"]["invalid_time"] == 2
+    with pytest.raises(ValueError):
+        timeseries.to_millis(1e300)
+    with pytest.raises(ValueError):
+        await history.get_history("cap1", ["rain"], "99999-01-01T00:00:00")
+
+    hist = await history.get_history("cap1", ["rain"])
+    assert len(hist["properties"]["rain"]["values"]) == 6
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_timeseries_rollups_are_incremental_and_history_picks_tier(monkeypatch):
+    from backend.services.analytics.api import history, timeseries, update, write_buffer
+
+    buckets, rollups = FakeBucketCollection(), FakeBucketCollection()
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return {timeseries.BUCKET_COLLECTION: buckets, timeseries.ROLLUP_COLLECTION: rollups}
+
+    monkeypatch.setattr(write_buffer, "analytics_db", FakeAnalyticsDB())
+    monkeypatch.setattr(write_buffer, "buffer", write_buffer.WriteBehindBuffer())
+    monkeypatch.setattr(history, "analytics_db", FakeAnalyticsDB())
+
+    day = 1714521600  # 2024-05-01T00:00:00Z
+    await update.ingest("ru1", [{"property": "temp", "times": [day + 60, day + 120, day + 3700], "values": [10, 14, 20]}], flush=True)
+    await update.ingest("ru1", [{"property": "temp", "time": day + 180, "value": 6}], flush=True)
+    hourly = sorted((d for d in rollups.docs if d["tier"] == "hour"), key=lambda d: d["period_start"])
+    daily = [d for d in rollups.docs if d["tier"] == "day"]
+    assert [d["count"] for d in hourly] == [3, 1], "Later flushes fold into the existing hourly rollup"
+    assert hourly[0]["min"] == 6 and hourly[0]["max"] == 14 and hourly[0]["sum"] == 30
+    assert len(daily) == 1 and daily[0]["count"] == 4 and daily[0]["max"] == 20
+    assert daily[0]["period_end"] == timeseries.from_millis((day + 86400) * 1000)
+
+    start, end = "2024-05-01T00:00:00Z", "2024-05-01T23:59:59Z"
+    raw = await history.get_history("ru1", ["temp"], start, end, resolution="raw")
+    assert raw["tier"] == "raw" and raw["properties"]["temp"]["values"] == [10, 14, 6, 20]
+    hour = await history.get_history("ru1", ["temp"], start, end, resolution=5400)
+    assert hour["tier"] == "hour"
+    assert hour["properties"]["temp"]["values"] == [10, 20] and hour["properties"]["temp"]["count"] == [3, 1]
+    assert hour["properties"]["temp"]["times"] == ["2024-05-01T00:00:00Z", "2024-05-01T01:00:00Z"]
+    assert (await history.get_history("ru1", ["temp"], start, end, max_points=2))["tier"] == "hour"
+    assert (await history.get_history("ru1", ["temp"], start, end, max_points=1))["tier"] == "day"
+    assert (await history.get_history("ru1", ["temp"], start, end))["tier"] == "hour", \
+        "Frames older than raw retention are served from hourly rollups"
+    with pytest.raises(ValueError):
+        await history.get_history("ru1", ["temp"], start, end, resolution="weekly")
+
+    ttl = {opts["name"]: opts for coll in timeseries.INDEXES.values() for _, opts in coll}
+    assert ttl["raw_retention"]["expireAfterSeconds"] == 90 * 86400
+    assert ttl["hourly_retention"]["partialFilterExpression"] == {"tier": "hour"}
+    assert "expireAfterSeconds" not in ttl["project_property_period"], "Daily rollups are kept"
+
+
+# --- Observation interpolation ---
+def test_interpolate_points_idw_nearest_and_linear():
+    from backend.services.analytics.api import interpolate
+
+    transform = [1.0, 0.0, 0.0, 0.0, -1.0, 4.0]
+    xs, ys, values = [0.5, 3.5, 0.5, 3.5], [3.5, 3.5, 0.5, 0.5], [0.0, 10.0, 20.0, 30.0]
+    idw = interpolate.interpolate_points(xs, ys, values, transform, 4, 4)
+    assert idw[0, 0] == 0.0 and idw[0, 3] == 10.0 and idw[3, 3] == 30.0, "Cells on a point take its value"
+    assert 0.0 < idw[1, 1] < 30.0 and not np.isnan(idw).any()
+    nearest = interpolate.interpolate_points(xs, ys, values, transform, 4, 4, method="nearest")
+    assert nearest[1, 0] == 0.0 and nearest[2, 3] == 30.0
+    linear = interpolate.interpolate_points(xs[:3], ys[:3], values[:3], transform, 4, 4, method="linear")
+    assert linear[0, 0] == pytest.approx(0.0) and np.isnan(linear[3, 3]), "Cells outside the hull stay empty"
+    mask = np.zeros((4, 4), dtype=bool)
+    mask[0, :2] = True
+    sparse = interpolate.interpolate_points([0.5], [3.5], [5.0], transform, 4, 4, max_distance=1.5, mask=mask)
+    assert sparse[0, 0] == 5.0 and sparse[0, 1] == 5.0 and np.isnan(sparse[1, 0])
+    with pytest.raises(ValueError):
+        interpolate.interpolate_points(xs, ys, values, transform, 4, 4, method="kriging")
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_interpolate_observations_updates_touched_windows(monkeypatch):
+    from pymongo.errors import DuplicateKeyError
+    from backend.services.analytics.api import interpolate
+
+    class FakeLayers:
+        def __init__(self):
+            self.docs = {}
+
+        async def find_one(self, filt, projection=None, sort=None):
+            if "window_start" in filt and isinstance(filt["window_start"], dict):
+                docs = [d for k, d in self.docs.items()
+                        if k[:2] == (filt["project_id"], filt["property"]) and k[2] <= filt["window_start"]["$lte"]]
+                return max(docs, key=lambda d: d["window_start"], default=None)
+            return self.docs.get((filt["project_id"], filt["property"], filt["window_start"]))
+
+        async def update_one(self, filt, update, upsert=False):
+            key = (filt["project_id"], filt["property"], filt["window_start"])
+            if self.docs.get(key, {}).get("point_count", 0) > filt["point_count"]["$not"]["$gt"]:
+                raise DuplicateKeyError("project_property_window")
+            self.docs.setdefault(key, {"project_id": key[0], "property": key[1], "window_start": key[2]})
+            self.docs[key].update(update["$set"])
+
+    class FakePoints:
+        def __init__(self):
+            self.docs = []
+
+        async def insert_one(self, doc):
+            self.docs.append(dict(doc))
+
+        async def find(self, filt, projection=None):
+            for doc in self.docs:
+                if all(doc[k] == v for k, v in filt.items()):
+                    yield doc
+
+    class FakeTerrain:
+        async def find_one(self, filt, projection=None):
+            return {"elevation_data": {"transform": [1.0, 0.0, 0.0, 0.0, -1.0, 3.0],
+                                       "bounds": {"left": 0, "right": 3, "bottom": 0, "top": 3}}}
+
+    layers = FakeLayers()
+    points = FakePoints()
+
+    class FakeDB(dict):
+        terrain = FakeTerrain()
+
+    class FakeAnalyticsDB:
+        client = True
+        def get_db(self):
+            return FakeDB({interpolate.OBSERVATION_COLLECTION: layers, interpolate.POINT_COLLECTION: points})
+
+    monkeypatch.setattr(interpolate, "analytics_db", FakeAnalyticsDB())
+    first = await interpolate.interpolate_observations("io1", [
+        {"property": "moisture", "time": "2024-05-01T10:05:00Z", "lon": 0.5, "lat": 2.5, "value": 0.2},
+        {"property": "moisture", "time": "2024-05-01T11:05:00Z", "lon": 0.5, "lat": 2.5, "value": 0.9},
+        {"property": "moisture", "time": "2024-05-01T10:05:00Z", "lon": "east", "lat": 2.5, "value": 0.2},
+    ])
+    assert first["accepted"] == 2 and first["rejected"] == 1 and len(first["layers"]) == 2
+    second = await interpolate.interpolate_observations("io1", [
+        {"property": "moisture", "time": "2024-05-01T10:30:00Z", "lon": 2.5, "lat": 0.5, "value": 0.6},
+    ])
+    assert [layer["points"] for layer in second["layers"]] == [2], "Only the touched window is re-interpolated"
+    assert second["layers"][0]["version"] != first["layers"][0]["version"]
+    layer = await interpolate.get_observation_layer("io1", "moisture", "2024-05-01T10:59:00Z")
+    layer_start = next(key[2] for key in layers.docs if key[2].hour == 10)
+    assert layer["grid"][0][0] == pytest.approx(0.2) and layer["grid"][2][2] == pytest.approx(0.6)
+    assert layer["window_start"] == "2024-05-01T10:00:00Z"
+    assert len(points.docs) == 3, "Each batch appends its own point document"
+
+    # A batch that read fewer points than the stored raster does not overwrite it.
+    async def stale_find(filt, projection=None):
+        yield {"x": [0.5], "y": [2.5], "values": [0.2]}
+
+    points.find = stale_find
+    await interpolate.interpolate_observations("io1", [
+        {"property": "moisture", "time": "2024-05-01T10:45:00Z", "lon": 1.5, "lat": 1.5, "value": 0.4},
+    ])
+    assert layers.docs[("io1", "moisture", layer_start)]["point_count"] == 2
+    with pytest.raises(ValueError):
+        await interpolate.interpolate_observations("io1", [], method="spline")
+
+
+# --- Project summaries ---
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_project_summary_tracks_layer_stats_and_status():
+    from backend.services.analytics.api import summaries
+
+    class FakeSummaries:
+        def __init__(self):
+            self.doc = {}
+
+        async def update_one(self, filt, update, upsert=False):
+            for key, value in update["$set"].items():
+                target = self.doc
+                *path, leaf = key.split(".")
+                for part in path:
+                    target = target.setdefault(part, {})
+                target[leaf] = value
+
+    coll = FakeSummaries()
+    db = {summaries.SUMMARY_COLLECTION: coll}
+    heightmap = [[float(r * 40 + c) for c in range(40)] for r in range(40)]
+    heightmap[0][0] = float("nan")
+    dem = {"heightmap": heightmap, "bounds": {"left": -98.0, "bottom": 32.9, "right": -97.9, "top": 33.0}}
+    await summaries.update_summary(db, "s1", "dem", dem, {"version": "v1"}, {"status": "ok"})
+    land_cover = {"grid": [[1, 1, 5], [5, 5, 0]], "index_map": {"1": "Corn", "5": "Soybeans"}, "units": {}}
+    await summaries.update_summary(db, "s1", "land_cover", land_cover, {"version": "v2"}, {"status": "ok"})
+    await summaries.update_summary(db, "s1", "soil", status={"status": "failed"})
+
+    layers = coll.doc["layers"]
+    assert layers["dem"]["min"] == 1.0 and layers["dem"]["max"] == 1599.0 and layers["dem"]["version"] == "v1"
+    assert layers["land_cover"]["dominant"] == "Soybeans"
+    assert [c["share"] for c in layers["land_cover"]["classes"]] == [0.6, 0.4], "Nodata (0) is left out"
+    assert layers["soil"]["status"] == "failed" and "dominant" not in layers["soil"]
+    assert coll.doc["bbox"] == [-98.0, 32.9, -97.9, 33.0]
+    assert len(coll.doc["thumbnail"]) == 20 and len(coll.doc["thumbnail"][0]) == 20
+    assert summaries.thumbnail([[float("nan")] * 2] * 2, size=1) == [[None]]
+
+
+# --- ETL tracing ---
+
+
+@pytest.mark.anyio
+async def test_etl_trace_stores_timings_and_exports_otlp(monkeypatch, tmp_path):
+    from backend.services.analytics import config
+    from backend.services.analytics.api import tracing
+
+    sink = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(config, "ETL_TRACE_SINK", str(sink))
+
+    class FakeTerrain:
+        def __init__(self):
+            self.updates = []
+        async def update_one(self, filt, update, upsert=False):
+            self.updates.append((filt, update))
+
+    class FakeDB:
+        terrain = FakeTerrain()
+
+    with tracing.span("outside") as attrs:
+        attrs["ignored"] = True  # no active trace: a no-op
+    status = {"status": "ok"}
+    with tracing.trace("soil", "p1") as active:
+        with tracing.span("sdm_query", attempt=1):
+            pass
+        with tracing.span("sdm_query", attempt=2) as span:
+            span["bytes"] = 10
+        with tracing.span("fetch", bytes=5):
+            tracing.annotate(cache="hit")
+        await tracing.store_timings(FakeDB(), "p1", active, status)
+
+    stages = status["timings"]["stages"]
+    assert set(stages) == {"sdm_query", "fetch"}, "Spans outside a trace are not recorded"
+    assert stages["sdm_query"]["attempt"] == 2 and stages["sdm_query"]["bytes"] == 10
+    assert stages["fetch"] == {"ms": stages["fetch"]["ms"], "bytes": 5, "cache": "hit"}
+    filt, update = FakeDB.terrain.updates[0]
+    assert filt == {"project_id": "p1"} and update == {"$set": {"etl_layers.soil.timings": status["timings"]}}
+
+    with pytest.raises(RuntimeError):
+        with tracing.trace("land_cover", "p1"):
+            with tracing.span("fetch_cdl"):
+                raise RuntimeError("CDL down")
+    exported = [json.loads(line) for line in sink.read_text().splitlines()]
+    assert len(exported) == 2, "Every finished trace is exported, failed ones included"
+    spans = exported[1]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, child = spans
+    assert root["name"] == "etl.land_cover" and root["status"] == {"code": 2, "message": "CDL down"}
+    assert child["parentSpanId"] == root["spanId"] and child["traceId"] == root["traceId"]
+    assert tracing.current() is None
+
+    with tracing.trace("dem", "p1") as active:
+        first, second = tracing.span("fetch_dem"), tracing.span("coverage_mask")
+        first.__enter__()
+        second.__enter__()
+        first.__exit__(None, None, None)  # overlapping stages finish out of order
+        assert [record["name"] for record in active._open] == ["coverage_mask"]
+        second.__exit__(None, None, None)
+    assert [record["name"] for record in active.spans] == ["fetch_dem", "coverage_mask"]
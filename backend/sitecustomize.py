@@ -12,6 +12,9 @@ def _load_stdlib_platform():
     stdlib_path = sysconfig.get_paths().get("stdlib")
     if not stdlib_path:
         return
+    # Already the stdlib module (imported before us): executing it again only costs startup time.
+    if getattr(sys.modules.get("platform"), "__file__", None) == f"{stdlib_path}/platform.py":
+        return
     spec = importlib.util.spec_from_file_location("platform", f"{stdlib_path}/platform.py")
     if spec and spec.loader:
         module = importlib.util.module_from_spec(spec)
@@ -6,6 +6,8 @@ health, and core collection initialization. Additional journeys will be added
 as endpoints are implemented.
 """
 
+import asyncio
+import dataclasses
 import json
 from pathlib import Path
 
@@ -182,7 +184,8 @@ async def test_login_success_returns_ok(platform_config):
 @pytest.mark.anyio
 async def test_engine_initializers_run_before_serving(platform_config):
     """
-    Engine initializers must complete during startup before serving requests.
+    Engine initializers must complete during startup before serving requests; the
+    reference datasets load in the background and /health/ready reports when they are in.
     """
     cfg = platform_config
     db = PlatformDatabase(cfg)
@@ -190,10 +193,17 @@ async def test_engine_initializers_run_before_serving(platform_config):
 
     transport = ASGITransport(app=app)
     async with app.router.lifespan_context(app):
-        assert getattr(app.state, "engines_ready", False) is True, "Engines should be marked ready after init"
+        steps = app.state.startup
+        assert steps["analytics.initialize"]["status"] == "ok", "Engine initializers complete during startup"
+        assert steps["analytics.load_datasets"]["background"] is True
         async with AsyncClient(transport=transport, base_url="http://test") as client:
             resp = await client.get("/health")
             assert resp.status_code == 200
+            await asyncio.gather(*app.state.startup_tasks)
+            assert app.state.engines_ready is True, "Engines should be marked ready once datasets are loaded"
+            resp = await client.get("/health/ready")
+            assert resp.status_code == 200
+            assert resp.json()["steps"]["analytics.load_datasets"]["status"] == "ok"
 
     cleanup_client = AsyncIOMotorClient(cfg.mongo_url)
     await cleanup_client.drop_database(cfg.mongo_db)
@@ -320,6 +330,89 @@ async def test_project_listing_returns_user_projects(platform_config):
     assert {"p1", "p2"} <= ids, "Response should include all user projects"
 
 
+@pytest.mark.integration
+@pytest.mark.anyio
+async def test_project_listing_serves_summary_cards(platform_config):
+    """
+    Listings should return project cards with the materialized summary instead of raw documents.
+    """
+    cfg = platform_config
+    db = PlatformDatabase(cfg)
+    app = create_app(config=cfg, db=db)
+
+    db.connect()
+    await db.get_db().users.insert_one({"username": "carol", "password": "pw123"})
+    await db.get_db().projects.insert_many(
+        [
+            {"project_id": "c1", "username": "carol", "name": "One", "etl_error": "boom"},
+            {"project_id": "c2", "username": "carol", "name": "Two"},
+        ]
+    )
+    db.close()
+    analytics_client = AsyncIOMotorClient("mongodb://localhost:27017")
+    await analytics_client.analytics.project_summaries.insert_one(
+        {"project_id": "c1", "bbox": [0, 0, 1, 1], "layers": {"dem": {"status": "ok", "min": 1.0, "max": 9.0}}}
+    )
+    analytics_client.close()
+
+    transport = ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/api/platform/projects", json={"username": "carol"})
+            assert resp.status_code == 200
+            cards = {p["project_id"]: p for p in resp.json()}
+    assert cards["c1"]["summary"]["layers"]["dem"]["max"] == 9.0
+    assert cards["c2"]["summary"] is None, "Projects without ETL output have no summary yet"
+    assert "etl_error" not in cards["c1"], "Only card fields are served"
+
+
+@pytest.mark.integration
+@pytest.mark.anyio
+async def test_project_listing_pages_projects_and_streams_ndjson(platform_config):
+    """
+    Listings should page with a keyset cursor, honour fields= and stream NDJSON rows.
+    """
+    cfg = platform_config
+    db = PlatformDatabase(cfg)
+    app = create_app(config=cfg, db=db)
+
+    db.connect()
+    await db.get_db().projects.insert_many(
+        [
+            {"project_id": f"d{i}", "username": "dave", "name": f"P{i}", "geometry": {"type": "Polygon"},
+             "created": f"2024-05-0{i}T00:00:00+00:00"}
+            for i in range(1, 6)
+        ]
+    )
+    db.close()
+
+    transport = ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            seen, cursor = [], None
+            while True:
+                payload = {"username": "dave", "limit": 2, "fields": "name,bbox"}
+                if cursor:
+                    payload["cursor"] = cursor
+                resp = await client.post("/api/platform/projects", json=payload)
+                assert resp.status_code == 200
+                page = resp.json()
+                seen.extend(page["projects"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            assert [p["project_id"] for p in seen] == ["d1", "d2", "d3", "d4", "d5"]
+            assert set(seen[0]) == {"project_id", "name", "bbox"}, "fields= drops the geometry"
+
+            resp = await client.post("/api/platform/projects", json={"username": "dave", "format": "ndjson"})
+            assert resp.headers["content-type"].startswith("application/x-ndjson")
+            rows = [json.loads(line) for line in resp.text.splitlines()]
+            assert len(rows) == 5 and rows[0]["geometry"] == {"type": "Polygon"}
+
+            resp = await client.post("/api/platform/projects", json={"username": "dave", "cursor": "bogus"})
+            assert resp.status_code == 400
+
+
 @pytest.mark.integration
 @pytest.mark.anyio
 async def test_grid_endpoint_returns_layers(platform_config, vhs):
@@ -584,6 +677,9 @@ async def test_logout_invalidates_session(platform_config):
             # Assume login issues a token (placeholder until implemented)
             resp = await client.post("/api/platform/login", json={"username": "alice", "password": "pw123"})
             token = resp.json().get("token") if resp.status_code == 200 else None
+            assert resp.json().get("expires_at"), "Sessions carry a server-side expiry"
+            resp = await client.get("/api/platform/projects", headers={"Authorization": f"Bearer {token}"})
+            assert resp.status_code == 200
 
             # Call logout
             resp = await client.post("/api/platform/logout", headers={"Authorization": f"Bearer {token}"})
@@ -592,5 +688,132 @@ async def test_logout_invalidates_session(platform_config):
             # Subsequent protected call should fail
             resp = await client.get("/api/platform/projects")
             assert resp.status_code in (401, 403), "Protected route should reject after logout"
+            resp = await client.get("/api/platform/projects", headers={"Authorization": f"Bearer {token}"})
+            assert resp.status_code == 401, "Revoked token must not be served from the session cache"
 
     # DB cleanup handled by fixture
+
+
+@pytest.mark.integration
+@pytest.mark.anyio
+async def test_grid_endpoint_serves_overview_levels(platform_config):
+    """
+    Grid endpoint should serve a coarser pyramid level when level/max_cells is requested.
+    """
+    import numpy as np
+    from backend.services.analytics.api import coverage, overviews
+
+    cfg = platform_config
+    db = PlatformDatabase(cfg)
+    app = create_app(config=cfg, db=db)
+
+    heightmap = [[float(r * 64 + c) for c in range(64)] for r in range(64)]
+    elevation = {
+        "heightmap": heightmap,
+        "transform": [0.001, 0, -98.0, 0, -0.001, 33.0, 0, 0, 1],
+        "bounds": {"left": -98.0, "right": -97.936, "bottom": 32.936, "top": 33.0},
+    }
+    analytics_client = AsyncIOMotorClient("mongodb://localhost:27017")
+    levels = await overviews.store_pyramid(
+        analytics_client.analytics, "pyr1", "dem", overviews.build_layer_pyramid("dem", elevation)
+    )
+    await analytics_client.analytics.terrain.insert_one(
+        {
+            "project_id": "pyr1",
+            "elevation_data": elevation,
+            "coverage_mask": coverage.pack_mask(np.ones((64, 64), dtype=bool)),
+            "overview_levels": {"dem": levels},
+            "etl_layers": {"dem": {"status": "ok"}},
+        }
+    )
+    analytics_client.close()
+
+    transport = ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get("/api/platform/projects/pyr1/grid", params={"layer": "dem", "max_cells": 1024})
+            assert resp.status_code == 200
+            data = resp.json().get("data") or {}
+            assert data.get("level") == 1, "32x32 is the finest level that fits 1024 cells"
+            assert len(data.get("heightmap") or []) == 32
+            assert data.get("transform")[0] == pytest.approx(0.002)
+            assert resp.json()["coverage_mask"]["shape"] == [32, 32], "Mask should match the served level"
+
+            resp = await client.get("/api/platform/projects/pyr1/grid", params={"layer": "dem", "level": 2})
+            assert len(resp.json()["data"]["heightmap"]) == 16
+
+            resp = await client.get("/api/platform/projects/pyr1/grid", params={"layer": "dem"})
+            assert len(resp.json()["data"]["heightmap"]) == 64, "Full resolution should remain the default"
+
+
+@pytest.mark.integration
+@pytest.mark.anyio
+async def test_admin_mongo_command_stats_require_admin(platform_config):
+    """
+    The Mongo command debug route lists per-namespace aggregates for admins only.
+    """
+    cfg = platform_config
+    db = PlatformDatabase(cfg)
+    app = create_app(config=cfg, db=db)
+
+    db.connect()
+    await db.get_db().users.insert_many([
+        {"username": "alice", "password": "pw123", "projects": []},
+        {"username": "root", "password": "pw123", "projects": [], "admin": True},
+    ])
+    db.close()
+
+    transport = ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            tokens = {}
+            for name in ("alice", "root"):
+                resp = await client.post("/api/platform/login", json={"username": name, "password": "pw123"})
+                tokens[name] = resp.json()["token"]
+
+            resp = await client.get("/api/platform/admin/mongo/commands")
+            assert resp.status_code == 401
+            resp = await client.get(
+                "/api/platform/admin/mongo/commands", headers={"Authorization": f"Bearer {tokens['alice']}"}
+            )
+            assert resp.status_code == 403, "Regular users must not see command stats"
+
+            resp = await client.get(
+                "/api/platform/admin/mongo/commands", headers={"Authorization": f"Bearer {tokens['root']}"}
+            )
+            assert resp.status_code == 200
+            namespaces = {row["namespace"] for row in resp.json()["commands"]}
+            assert f"{cfg.mongo_db}.users" in namespaces, "Login lookups should be recorded"
+
+
+@pytest.mark.integration
+@pytest.mark.anyio
+async def test_admin_can_profile_a_request_and_fetch_it(platform_config):
+    """
+    With profiling enabled, an admin's X-Profile request is stored and served as folded stacks.
+    """
+    cfg = dataclasses.replace(platform_config, profiling=True)
+    db = PlatformDatabase(cfg)
+    app = create_app(config=cfg, db=db)
+
+    db.connect()
+    await db.get_db().users.insert_one({"username": "root", "password": "pw123", "projects": [], "admin": True})
+    db.close()
+
+    transport = ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/api/platform/login", json={"username": "root", "password": "pw123"})
+            auth = {"Authorization": f"Bearer {resp.json()['token']}"}
+
+            resp = await client.get("/api/platform/projects", headers={**auth, "X-Profile": "1"})
+            assert resp.status_code == 200
+            profile_id = resp.headers["X-Profile-Id"]
+
+            resp = await client.get("/api/platform/admin/profiles", headers=auth)
+            assert [p["profile_id"] for p in resp.json()] == [profile_id]
+            resp = await client.get(f"/api/platform/admin/profiles/{profile_id}", headers=auth)
+            assert resp.json()["path"] == "/api/platform/projects"
+            assert resp.json()["memory"]["peak_bytes"] > 0
+            resp = await client.get(f"/api/platform/admin/profiles/{profile_id}", params={"format": "folded"}, headers=auth)
+            assert resp.headers["content-type"].startswith("text/plain")
@@ -1,9 +1,12 @@
 """Platform unit tests: config, DB wrapper, and startup helpers."""
 
+import asyncio
+import time
+
 import pytest
 
 from backend import ensure_platform_collections, REQUIRED_COLLECTIONS
-from backend.platform import db_connection
+from backend.platform import db_connection, mongo_clients
 from backend.platform.config import PlatformConfig
 
 
@@ -48,6 +51,12 @@ class FakeMotorClient:
         self.closed = True
 
 
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    """Each test starts without shared Mongo clients left over from another test."""
+    monkeypatch.setattr(mongo_clients, "_pools", {})
+
+
 @pytest.fixture
 def config():
     return PlatformConfig(
@@ -67,7 +76,7 @@ def test_connect_and_get_db(monkeypatch, config):
         created["client"] = FakeMotorClient(url, **kwargs)
         return created["client"]
 
-    monkeypatch.setattr(db_connection, "AsyncIOMotorClient", fake_client)
+    monkeypatch.setattr(mongo_clients, "AsyncIOMotorClient", fake_client)
 
     db = db_connection.PlatformDatabase(config)
     db.connect()
@@ -97,7 +106,7 @@ def test_close_closes_client(monkeypatch, config):
         created["client"] = FakeMotorClient(url, **kwargs)
         return created["client"]
 
-    monkeypatch.setattr(db_connection, "AsyncIOMotorClient", fake_client)
+    monkeypatch.setattr(mongo_clients, "AsyncIOMotorClient", fake_client)
 
     db = db_connection.PlatformDatabase(config)
     db.connect()
@@ -109,10 +118,23 @@ def test_close_closes_client(monkeypatch, config):
 # --- Startup helpers ---
 
 
+class FakeIndexedCollection:
+    def __init__(self):
+        self.indexes = []
+
+    async def create_index(self, keys, **options):
+        self.indexes.append((keys, options))
+        return options.get("name")
+
+
 class FakeDB:
     def __init__(self, existing=None):
         self.collections = set(existing or [])
         self.created = []
+        self.indexed = {}
+
+    def __getitem__(self, name):
+        return self.indexed.setdefault(name, FakeIndexedCollection())
 
     async def list_collection_names(self):
         return list(self.collections)
@@ -123,6 +145,7 @@ class FakeDB:
 
 
 @pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
 async def test_ensure_platform_collections_creates_missing():
     """
     When collections are missing, they should be created.
@@ -133,9 +156,18 @@ async def test_ensure_platform_collections_creates_missing():
 
     assert set(db.collections) == set(REQUIRED_COLLECTIONS), "all required collections should exist"
     assert set(db.created) == set(REQUIRED_COLLECTIONS), "missing collections should be created"
+    names = {name: sorted(opts.get("name") for _, opts in coll.indexes) for name, coll in db.indexed.items()}
+    assert names == {
+        "users": ["username"],
+        "sessions": ["session_expiry", "token"],
+        "session_revocations": ["revocation_expiry"],
+        "projects": ["project_id", "username_created_project"],
+        "profiles": ["profile_expiry", "profile_id"],
+    }, "declared platform indexes should be ensured"
 
 
 @pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
 async def test_ensure_platform_collections_skips_existing():
     """
     Existing collections should not be recreated.
@@ -148,6 +180,70 @@ async def test_ensure_platform_collections_skips_existing():
     assert set(db.created) == {"projects", "sessions"}, "only missing collections should be created"
 
 
+class FakePlatformDatabase:
+    def __init__(self):
+        self.db = FakeDB()
+        self.closed = False
+
+    def connect(self):
+        return self.db
+
+    def get_db(self):
+        return self.db
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_lifespan_runs_initializers_concurrently_and_loads_datasets_in_background():
+    """
+    Initializers overlap, each step is timed, and engines_ready waits for the background steps.
+    """
+    from fastapi import FastAPI
+    from backend import _create_lifespan, _step_name
+
+    loaded = asyncio.Event()
+
+    async def engine_a():
+        await asyncio.sleep(0.2)
+
+    async def engine_b():
+        await asyncio.sleep(0.2)
+
+    async def load_datasets():
+        await loaded.wait()
+
+    async def broken_load():
+        raise RuntimeError("download failed")
+
+    app = FastAPI()
+    started = time.perf_counter()
+    async with _create_lifespan(FakePlatformDatabase(), [engine_a, engine_b], background=[load_datasets])(app):
+        assert time.perf_counter() - started < 0.35, "initializers should run concurrently"
+        steps = app.state.startup
+        assert steps["platform_collections"]["status"] == "ok"
+        assert steps[_step_name(engine_a)]["status"] == "ok" and steps[_step_name(engine_a)]["ms"] >= 150
+        assert steps[_step_name(load_datasets)] == {"status": "pending", "ms": None, "background": True}
+        assert app.state.engines_ready is False, "serving starts before the background load finishes"
+        loaded.set()
+        await asyncio.gather(*app.state.startup_tasks)
+        assert app.state.engines_ready is True
+        assert steps[_step_name(load_datasets)]["status"] == "ok"
+
+    app = FastAPI()
+    async with _create_lifespan(FakePlatformDatabase(), [], background=[broken_load])(app):
+        await asyncio.gather(*app.state.startup_tasks)
+        assert app.state.engines_ready is False
+        assert app.state.startup[_step_name(broken_load)]["status"] == "failed"
+
+    app = FastAPI()
+    with pytest.raises(RuntimeError):
+        async with _create_lifespan(FakePlatformDatabase(), [engine_a, broken_load])(app):
+            pass
+
+
 # --- Signup validation ---
 
 
@@ -308,3 +404,569 @@ def test_ownership_check_rejects_non_owner(monkeypatch):
     project = {"project_id": "p1", "username": "alice"}
     with pytest.raises(PermissionError):
         validators.require_project_ownership(project, "bob")
+
+
+# --- Project listings ---
+
+
+def test_listing_cursor_round_trip_and_keyset_filter():
+    from backend.platform import utils
+
+    token = utils.encode_cursor({"created": "2024-05-01T00:00:00+00:00", "project_id": "p9"})
+    assert utils.decode_cursor(token) == ("2024-05-01T00:00:00+00:00", "p9")
+    filt = utils.listing_filter("alice", token)
+    assert filt["username"] == "alice"
+    assert filt["$or"][1] == {"created": "2024-05-01T00:00:00+00:00", "project_id": {"$gt": "p9"}}
+    assert utils.listing_filter("alice") == {"username": "alice"}
+    with pytest.raises(ValueError):
+        utils.decode_cursor("not-a-cursor")
+
+
+def test_listing_fields_projection_and_limit():
+    from backend.platform import utils
+
+    projection, requested = utils.parse_listing_fields("name,bbox")
+    assert projection == {"_id": 0, "project_id": 1, "created": 1, "name": 1}, "bbox comes from the summary"
+    assert requested == {"name", "bbox"}
+    projection, requested = utils.parse_listing_fields(None)
+    assert projection["geometry"] == 1 and "summary" in requested
+    with pytest.raises(ValueError):
+        utils.parse_listing_fields("name,password")
+    assert utils.parse_listing_fields(["name", " bbox"])[1] == {"name", "bbox"}, "JSON bodies may send a list"
+    with pytest.raises(ValueError):
+        utils.parse_listing_fields(["name", 3])
+    with pytest.raises(ValueError):
+        utils.parse_listing_fields({"name": 1})
+    assert utils.validate_listing_limit(50) == 50
+    with pytest.raises(ValueError):
+        utils.validate_listing_limit(utils.LISTING_MAX_LIMIT + 1)
+
+
+# --- Index registry ---
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_index_registry_ensures_concurrently_and_reports(monkeypatch):
+    from pymongo.errors import OperationFailure
+    from backend.platform import indexes
+
+    monkeypatch.setattr(indexes, "REGISTRY", {})
+    monkeypatch.setattr(indexes, "PROBES", {})
+    indexes.declare("demo", {
+        "things": [([("a", 1)], {"name": "a", "unique": True}), ([("b", 1)], {})],
+        "other": [([("c", 1)], {"expireAfterSeconds": 60})],
+        "dirty": [([("e", 1)], {"unique": True})],
+    }, probes=[("things", {"a": 1}), ("other", {"d": 1})])
+    indexes.declare("demo", {"things": [([("a", 1)], {"name": "a", "unique": True})]})
+    assert len(indexes.REGISTRY["demo"]["things"]) == 2, "Re-declaring an index is a no-op"
+
+    class Coll:
+        def __init__(self, name, present):
+            self.name, self.present, self.dropped = name, present, []
+
+        async def create_index(self, keys, **options):
+            if self.name == "other" and not self.dropped:
+                raise OperationFailure("IndexOptionsConflict", code=85)
+            if self.name == "dirty":
+                raise OperationFailure("E11000 duplicate key error", code=11000)
+            self.present.add(indexes.index_name(keys, options))
+
+        async def drop_index(self, keys):
+            self.dropped.append(keys)
+
+        async def list_indexes(self):
+            for name in ["_id_", *sorted(self.present)]:
+                yield {"name": name}
+
+        async def aggregate(self, pipeline):
+            for name in sorted(self.present):
+                yield {"name": name, "accesses": {"ops": 1 if name == "a" else 0}}
+
+    class DB:
+        def __init__(self):
+            self.colls = {"things": Coll("things", {"legacy_1"}), "other": Coll("other", set()),
+                          "dirty": Coll("dirty", {"e_1"})}
+
+        def __getitem__(self, name):
+            return self.colls[name]
+
+        async def command(self, cmd):
+            stage = "IXSCAN" if cmd["explain"]["filter"] == {"a": 1} else "COLLSCAN"
+            return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": stage}}}}
+
+    db = DB()
+    report = await indexes.ensure(db, "demo")
+    assert sorted(report["ok"]) == ["things.a", "things.b_1"] and report["replaced"] == ["other.c_1"]
+    assert list(report["failed"]) == ["dirty.e_1"] and db["dirty"].dropped == [], "only option conflicts replace"
+    report = await indexes.verify(db, "demo")
+    assert report["collections"]["things"] == {"missing": [], "undeclared": ["legacy_1"], "unused": ["b_1", "legacy_1"]}
+    assert [plan["filter"] for plan in report["collscans"]] == [["d"]]
+
+
+# --- Session cache ---
+
+
+def test_session_cache_expires_and_evicts_least_recent(monkeypatch):
+    from backend.platform import sessions
+
+    clock = [100.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: clock[0])
+    cache = sessions.SessionCache(max_size=2, ttl=30)
+    cache.put({"token": "a"}, remaining=3600)
+    cache.put({"token": "b"}, remaining=10)
+    assert cache.get("a") == {"token": "a"}
+    cache.put({"token": "c"}, remaining=3600)
+    assert cache.get("b") is None, "Least recently used entry is evicted"
+    clock[0] += 31
+    assert cache.get("a") is None, "Entries are dropped after the cache TTL"
+    assert cache.stats["hits"] == 1 and cache.stats["evictions"] == 1
+
+
+def test_session_store_rejects_cache_ttl_outliving_revocations(config):
+    from dataclasses import replace
+    from backend.platform import sessions
+
+    sessions.SessionStore(None, replace(config, session_cache_ttl=sessions.REVOCATION_RETENTION / 2))
+    with pytest.raises(ValueError):
+        sessions.SessionStore(None, replace(config, session_cache_ttl=sessions.REVOCATION_RETENTION))
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_session_store_skips_db_when_cached_and_honours_revocations():
+    from datetime import datetime, timedelta
+    from backend.platform import sessions
+
+    class Coll:
+        def __init__(self):
+            self.docs, self.finds = [], 0
+
+        async def insert_one(self, doc):
+            self.docs.append(doc)
+
+        async def find_one(self, filt, projection=None):
+            self.finds += 1
+            return next((dict(d) for d in self.docs if d["token"] == filt["token"]), None)
+
+        async def delete_one(self, filt):
+            self.docs = [d for d in self.docs if d["token"] != filt["token"]]
+
+        def find(self, filt, projection=None):
+            since = filt.get("revoked_at", {}).get("$gte", datetime.min)
+            docs = [d for d in self.docs if d["revoked_at"] >= since]
+
+            class Cursor:
+                def sort(self, key, direction):
+                    return self
+
+                async def __aiter__(self):
+                    for doc in docs:
+                        yield doc
+
+            return Cursor()
+
+    colls = {sessions.SESSION_COLLECTION: Coll(), sessions.REVOCATION_COLLECTION: Coll()}
+
+    class Database:
+        def get_db(self):
+            return colls
+
+    cfg = PlatformConfig(mongo_url="", mongo_db="", auth_secret="")
+    worker_a, worker_b = sessions.SessionStore(Database(), cfg), sessions.SessionStore(Database(), cfg)
+    session = await worker_a.create("alice")
+    assert session["expires_at"] > datetime.utcnow() + timedelta(days=6)
+    for _ in range(3):
+        assert (await worker_b.get(session["token"]))["username"] == "alice"
+    assert colls[sessions.SESSION_COLLECTION].finds == 1, "Repeated lookups are served from the cache"
+
+    await worker_a.revoke(session["token"])
+    assert await worker_a.get(session["token"]) is None
+    assert await worker_b.sync_revocations() == 1
+    assert await worker_b.get(session["token"]) is None, "Revocation reaches the other worker's cache"
+
+    colls[sessions.SESSION_COLLECTION].docs.append(
+        {"token": "old", "username": "bob", "expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    assert await worker_b.get("old") is None, "Expired sessions are rejected before the TTL monitor runs"
+
+
+# --- Shared Mongo clients ---
+
+
+def test_engines_share_one_pool_per_url(monkeypatch, config):
+    """
+    Platform and analytics engines on the same server reuse one client; it closes with its last holder.
+    """
+    from backend.services.analytics.analytics_db_connection import AnalyticsDatabase
+
+    built = []
+
+    def fake_client(url, **kwargs):
+        built.append(FakeMotorClient(url, **kwargs))
+        return built[-1]
+
+    monkeypatch.setattr(mongo_clients, "AsyncIOMotorClient", fake_client)
+    platform = db_connection.PlatformDatabase(config)
+    analytics = AnalyticsDatabase("mongodb://example:27017", "analytics_test")
+    platform.connect()
+    analytics.connect()
+    analytics.connect()  # lazy callers connecting again must not take another reference
+
+    assert len(built) == 1, "Both engines should share a single client for one URL"
+    assert mongo_clients.stats()[0]["engines"] == ["analytics", "platform"]
+    assert mongo_clients.stats()[0]["refs"] == 2
+    platform.close()
+    assert built[0].closed is False, "Client stays open while another engine holds it"
+    analytics.close()
+    assert built[0].closed is True, "Client closes when the last engine releases it"
+    assert mongo_clients.stats() == []
+
+
+def test_engine_pool_settings_from_env(monkeypatch):
+    """
+    MONGO_* applies to every engine and <ENGINE>_MONGO_* overrides it for one engine.
+    """
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "50")
+    monkeypatch.setenv("ANALYTICS_MONGO_MAX_POOL_SIZE", "200")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zstd,zlib")
+    monkeypatch.setenv("ANALYTICS_MONGO_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setenv("PLATFORM_MONGO_WRITE_CONCERN", "majority")
+
+    assert mongo_clients.pool_options("platform") == {"maxPoolSize": 50, "compressors": "zstd,zlib"}
+    assert mongo_clients.pool_options("analytics")["maxPoolSize"] == 200
+    assert mongo_clients.database_options("analytics")["read_preference"].mongos_mode == "secondaryPreferred"
+    assert mongo_clients.database_options("platform")["write_concern"].document == {"w": "majority"}
+    monkeypatch.setenv("PLATFORM_MONGO_READ_PREFERENCE", "fastest")
+    with pytest.raises(ValueError):
+        mongo_clients.database_options("platform")
+
+
+def test_pool_stats_record_checkout_waits():
+    """
+    Checkout events accumulate count, wait times and failures.
+    """
+    from types import SimpleNamespace
+
+    stats = mongo_clients.PoolStats()
+    stats.connection_checked_out(SimpleNamespace(duration=0.002))
+    stats.connection_checked_out(SimpleNamespace(duration=0.010))
+    stats.connection_checked_in(SimpleNamespace())
+    stats.connection_check_out_failed(SimpleNamespace())
+
+    snapshot = stats.snapshot()
+    assert snapshot["checkouts"] == 2 and snapshot["checkout_failures"] == 1 and snapshot["in_use"] == 1
+    assert snapshot["wait_ms_max"] == 10.0 and snapshot["wait_ms_mean"] == 6.0
+
+
+# --- Metrics ---
+
+
+def _sample(name, **labels):
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_metrics_middleware_labels_route_templates():
+    """
+    Requests are recorded under their route template; unknown paths share one label.
+    """
+    import httpx
+    from fastapi import FastAPI
+    from backend.platform import metrics
+
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/things/{thing_id}")
+    async def thing(thing_id: str):
+        return {"id": thing_id}
+
+    count = "landos_http_request_duration_seconds_count"
+    before = _sample(count, method="GET", route="/things/{thing_id}", status="200")
+    unmatched = _sample(count, method="GET", route=metrics.UNMATCHED_ROUTE, status="404")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/things/a")
+        await client.get("/things/b")
+        await client.get("/scan/me")
+
+    assert _sample(count, method="GET", route="/things/{thing_id}", status="200") == before + 2
+    assert _sample(count, method="GET", route=metrics.UNMATCHED_ROUTE, status="404") == unmatched + 1
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_etl_run_counts_outcomes():
+    """
+    etl_run counts the returned outcome, and "error" when the ETL raises.
+    """
+    from backend.platform import metrics
+
+    @metrics.etl_run("test_layer")
+    async def run(outcome=None, fail=False):
+        if fail:
+            raise RuntimeError("boom")
+        return {"ok": True, "outcome": outcome} if outcome else {"ok": True}
+
+    await run()
+    await run("failed")
+    with pytest.raises(RuntimeError):
+        await run(fail=True)
+
+    for outcome in ("ok", "failed", "error"):
+        assert _sample("landos_etl_runs_total", layer="test_layer", outcome=outcome) == 1
+    assert _sample("landos_etl_duration_seconds_count", layer="test_layer") == 3
+
+
+# --- Benchmarks ---
+
+
+def test_benchmark_percentiles_and_baseline_comparison():
+    """
+    Nearest-rank percentiles and the baseline comparison used by the benchmark suites.
+    """
+    from backend import benchmarks
+
+    assert benchmarks.percentiles(range(1, 101)) == {"p50": 50, "p95": 95, "p99": 99}
+    assert benchmarks.percentiles([]) == {"p50": None, "p95": None, "p99": None}
+    baseline = {"results": {"fast": {"median": 1.0}, "slow": {"median": 1.0}, "gone": {"median": 1.0}}}
+    report = benchmarks.compare({"fast": {"median": 1.1}, "slow": {"median": 1.5}, "new": {"median": 2.0}}, baseline)
+    assert set(report) == {"fast", "slow"}, "Only cases present in both runs are compared"
+    assert not report["fast"]["regressed"] and report["slow"]["regressed"]
+    throughput = benchmarks.compare({"fast": {"rate": 70.0}}, {"results": {"fast": {"rate": 100.0}}},
+                                    key="rate", higher_is_better=True)
+    assert throughput["fast"]["regressed"], "A throughput drop beyond the tolerance is a regression"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_replay_cassette_serves_recordings_repeatedly(monkeypatch, tmp_path):
+    """
+    The throughput benchmark's cassette answers every matching request, not just the first.
+    """
+    import base64
+    import json
+    import httpx
+    from backend.benchmarks.etl_throughput import ReplayCassette
+
+    path = tmp_path / "bench.json"
+    record = {
+        "request": {"method": "GET", "url": "https://example.org/dem?x=1"},
+        "response": {"status": 200, "headers": {}, "body_b64": base64.b64encode(b"tiff").decode()},
+    }
+    path.write_text(json.dumps({"interactions": [record]}))
+
+    async with ReplayCassette([path], latency=0.0, jitter=0.0, monkeypatch=monkeypatch) as cassette:
+        async with httpx.AsyncClient() as client:
+            bodies = [(await client.get("https://example.org/dem?x=1")).content for _ in range(3)]
+            with pytest.raises(RuntimeError):
+                await client.get("https://example.org/other")
+
+    assert bodies == [b"tiff"] * 3
+    assert cassette.replayed == {"GET https://example.org/dem": 3}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_load_harness_runs_mix_and_reports_per_endpoint():
+    """
+    The load harness drives the weighted mix open-loop and summarises each endpoint.
+    """
+    import httpx
+    from fastapi import FastAPI, Header, HTTPException
+    from backend.benchmarks import loadtest
+
+    app = FastAPI()
+
+    @app.post("/api/platform/signup", status_code=201)
+    async def signup(payload: dict):
+        return {"ok": True}
+
+    @app.post("/api/platform/login")
+    async def login(payload: dict):
+        return {"ok": True, "token": payload["username"]}
+
+    @app.get("/api/platform/projects")
+    async def listing(authorization: str = Header(None)):
+        if not authorization:
+            raise HTTPException(status_code=401)
+        return []
+
+    @app.post("/api/platform/projects", status_code=201)
+    async def create(payload: dict):
+        return {"ok": True, "project_id": payload["name"]}
+
+    @app.get("/api/platform/projects/{project_id}/grid")
+    async def grid(project_id: str, layer: str | None = None):
+        if layer == "soil":
+            raise HTTPException(status_code=404)
+        return {"project_id": project_id}
+
+    with pytest.raises(ValueError):
+        loadtest.parse_mix("list=1,teleport=2")
+    mix = loadtest.parse_mix("list=2,grid=1,grid_layer=1,login=1")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        workload = loadtest.Workload(client, {"type": "Polygon"}, layer="soil")
+        await loadtest.prepare(workload, users=2, seed_projects=1)
+        elapsed = await loadtest.drive(workload, mix, duration=0.3, rate=200, users=2)
+
+    report = loadtest.summarize(workload.samples, elapsed)
+    assert "signup" not in report and "create_project" not in report
+    assert set(report) <= {"list_projects", "grid", "grid_layer", "login"}
+    assert report["list_projects"]["requests"] > 0 and report["list_projects"]["errors"] == 0
+    assert report["grid_layer"]["errors"] == report["grid_layer"]["requests"]
+    assert report["list_projects"]["p50"] <= report["list_projects"]["p99"]
+    assert report["list_projects"]["rps"] == round(report["list_projects"]["requests"] / elapsed, 2)
+
+
+# --- Event-loop block monitor ---
+
+def _block_loop(seconds: float):
+    time.sleep(seconds)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_loop_monitor_names_the_blocking_call_site(caplog):
+    """
+    A synchronous call holding the loop past the threshold is counted against its function.
+    """
+    from backend.platform.loop_monitor import LoopMonitor
+
+    monitor = LoopMonitor(0.05)
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        with caplog.at_level("WARNING", logger="landos.platform"):
+            _block_loop(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["stalls"] == 1
+    site = stats["sites"][0]
+    assert site["site"] == "backend/tests/unit.py:_block_loop"
+    assert site["count"] == 1 and 0.2 < site["total_s"] < 1.0
+    assert any("Event loop blocked" in r.getMessage() and "_block_loop" in r.getMessage() for r in caplog.records)
+    assert LoopMonitor(0).stats()["enabled"] is False
+
+
+# --- Mongo command monitoring ---
+
+def test_command_stats_aggregate_and_flag_slow_commands(caplog):
+    """
+    Commands are aggregated per namespace; slow ones are logged with their filter shape and reply size.
+    """
+    from types import SimpleNamespace
+    from backend.platform import mongo_commands
+
+    stats = mongo_commands.CommandStats(slow_ms=50, size_sample=0.0)
+
+    def run(request_id, name, command, micros, reply=None, database="analytics"):
+        base = {"connection_id": ("db", 27017), "request_id": request_id, "command_name": name}
+        stats.started(SimpleNamespace(**base, command=command, database_name=database))
+        if reply is None:
+            stats.failed(SimpleNamespace(**base, duration_micros=micros))
+        else:
+            stats.succeeded(SimpleNamespace(**base, duration_micros=micros, reply=reply))
+
+    run(1, "find", {"find": "terrain", "filter": {"project_id": "p1"}}, 2_000, {"ok": 1})
+    run(2, "find", {"find": "terrain", "filter": {"project_id": "p2"}}, 4_000, {"ok": 1})
+    subdivision = {"geometry": {"$geoIntersects": {"$geometry": {"type": "Point", "coordinates": [1, 2]}}}}
+    with caplog.at_level("WARNING", logger="landos.platform"):
+        run(3, "find", {"find": "subdivisions", "filter": subdivision}, 120_000, {"ok": 1, "cursor": {"firstBatch": []}})
+    run(4, "update", {"update": "terrain", "updates": [{"q": {"project_id": "p1"}, "u": {"$set": {"soil_data": {}}}}]},
+        9_000, None)
+    run(5, "hello", {"hello": 1}, 1_000, {"ok": 1})
+
+    snapshot = stats.snapshot()
+    rows = {(row["command"], row["namespace"]): row for row in snapshot["commands"]}
+    assert set(rows) == {("find", "analytics.terrain"), ("find", "analytics.subdivisions"), ("update", "analytics.terrain")}
+    assert rows[("find", "analytics.terrain")]["count"] == 2 and rows[("find", "analytics.terrain")]["ms_mean"] == 3.0
+    assert rows[("find", "analytics.terrain")]["reply_bytes_max"] is None, "Fast replies outside the sample are not sized"
+    assert rows[("update", "analytics.terrain")]["failures"] == 1
+    assert snapshot["commands"][0]["namespace"] == "analytics.subdivisions", "Slowest total first"
+
+    [slow] = snapshot["recent_slow"]
+    assert slow["filter"] == {"geometry": {"$geoIntersects": {"$geometry": {"type": "?", "coordinates": "?"}}}}
+    assert slow["reply_bytes"] > 0
+    assert any("Slow Mongo find on analytics.subdivisions" in r.getMessage() for r in caplog.records)
+    assert mongo_commands.filter_shape("update", {"updates": [{"q": {"a": 1}, "u": {"$set": {"x": 1, "b": 2}}}]}) == {
+        "q": {"a": "?"}, "n": 1, "u": {"$set": ["b", "x"]}
+    }
+
+
+# --- Request profiling ---
+
+def _busy_handler_work():
+    deadline = time.perf_counter() + 0.1
+    chunks = []
+    while time.perf_counter() < deadline:
+        chunks.append(bytearray(64 * 1024))
+    return len(chunks)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_profiling_middleware_profiles_admin_requests_only():
+    """
+    Only an admin's X-Profile request is sampled; the stored profile names the handler and its allocations.
+    """
+    import httpx
+    from fastapi import FastAPI
+    from backend.platform import profiling
+
+    inner = FastAPI()
+
+    @inner.get("/work")
+    async def work():
+        return {"chunks": _busy_handler_work()}
+
+    stored = []
+
+    async def admin_user(authorization):
+        return "root" if authorization == "Bearer admin" else None
+
+    async def store(doc):
+        stored.append(doc)
+
+    app = profiling.ProfilingMiddleware(inner, admin_user=admin_user, store=store)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        plain = await client.get("/work", headers={"Authorization": "Bearer admin"})
+        denied = await client.get("/work", headers={"X-Profile": "1", "Authorization": "Bearer user"})
+        profiled = await client.get("/work", params={"profile": "1"}, headers={"Authorization": "Bearer admin"})
+
+    assert "x-profile-id" not in plain.headers and "x-profile-id" not in denied.headers
+    assert profiled.status_code == 200 and profiled.json()["chunks"] > 0
+    [doc] = stored
+    assert doc["profile_id"] == profiled.headers["x-profile-id"]
+    assert doc["path"] == "/work" and doc["status"] == 200 and doc["username"] == "root"
+    assert doc["samples"] > 0
+    assert any("_busy_handler_work (backend/tests/unit.py" in stack for stack, _ in doc["stacks"])
+    assert doc["memory"]["peak_bytes"] >= 64 * 1024
+    assert profiling.folded(doc).splitlines()[0].rsplit(" ", 1)[1].isdigit()
+    assert not __import__("tracemalloc").is_tracing(), "tracemalloc is stopped again afterwards"
+
+
+# --- Startup imports ---
+
+def test_importing_the_app_defers_geo_stacks_and_country_modules():
+    """
+    Importing backend must not load rasterio / pyproj / pyshp or the country ETL modules.
+    """
+    import json
+    import subprocess
+    import sys
+    from pathlib import Path
+    from backend.benchmarks.startup import LAZY_MODULES
+
+    code = f"import backend, json, sys; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    done = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).resolve().parents[2], capture_output=True, text=True, check=True
+    )
+    assert json.loads(done.stdout.strip().splitlines()[-1]) == []